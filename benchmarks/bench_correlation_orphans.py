@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Plafond des orphelins du moteur de corrélation sous une rafale d'événements.
+
+Injecte d'un trait (par défaut 200 000) requêtes, fermetures et erreurs sans
+correspondance, thread de corrélation démarré comme dans tftp-monitor, et
+relève le nombre d'orphelins vivants après chaque événement. Le plafond
+`max_orphans` doit tenir à tout instant, sans attendre l'expiration du TTL :
+le script se termine en erreur si le pic le dépasse.
+
+Affiche le coût moyen par événement, le pic d'orphelins vivants et le nombre
+d'évictions au plafond remises au thread de corrélation.
+
+Usage : python3 benchmarks/bench_correlation_orphans.py [--events N] [--max-orphans N]
+"""
+
+import argparse
+import os
+import sys
+import threading
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tftpmon.correlation import CorrelationEngine
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--events", type=int, default=200_000)
+    parser.add_argument("--max-orphans", type=int, default=1000)
+    parser.add_argument("--files", type=int, default=50, help="fichiers demandés")
+    parser.add_argument("--orphan-ttl", type=float, default=300)
+    args = parser.parse_args()
+
+    engine = CorrelationEngine(0.5, args.orphan_ttl, args.max_orphans)
+    delivered = []
+    threading.Thread(target=engine.run, args=(delivered.append,), daemon=True).start()
+
+    peak = 0
+    elapsed = 0.0
+    now = time.time()
+    for i in range(args.events):
+        pid = str(100000 + i)
+        started = time.perf_counter()
+        if i % 4 == 3:
+            engine.add_close(f"backup/dump{i}.bin", "CLOSE_WRITE", now)
+        elif i % 8 == 2:
+            engine.add_error(pid, "NAK", now)
+        else:
+            engine.add_request(pid, "RRQ", "10.0.0.1", f"configs/sw{i % args.files}.cfg", now)
+        elapsed += time.perf_counter() - started
+        # Lecture directe : stats() prendrait le verrou à chaque événement
+        peak = max(peak, engine._live_orphans)
+
+    deadline = time.time() + 5
+    while len(delivered) < engine.counters["overflow"] and time.time() < deadline:
+        time.sleep(0.05)
+
+    print(f"{args.events:,} événements sans correspondance, plafond {args.max_orphans:,}, "
+          f"TTL {args.orphan_ttl:g} s")
+    print(f"  coût        : {elapsed / args.events * 1e6:.2f} µs/événement")
+    print(f"  orphelins   : pic {peak:,} | en fin de rafale {engine.stats()['orphans']:,}")
+    print(f"  évictions   : {engine.counters['overflow']:,} au plafond, "
+          f"{len(delivered):,} remises au thread de corrélation")
+    if peak > args.max_orphans:
+        sys.exit(f"❌ Plafond dépassé : {peak:,} orphelins vivants (max_orphans={args.max_orphans:,})")
+
+
+if __name__ == "__main__":
+    main()
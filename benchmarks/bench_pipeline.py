@@ -0,0 +1,645 @@
+#!/usr/bin/env python3
+"""
+Charge de bout en bout du moniteur TFTP : combien de transferts par seconde
+avant que la corrélation ne prenne du retard.
+
+Le code de scripts/tftp-monitor.py est chargé tel quel (lecture du journal,
+inotify, corrélation, écriture par lots, syslog, canal d'alertes), avec :
+  - une racine TFTP temporaire surveillée par le vrai backend inotify ;
+  - un journal tftpd synthétique : un processus générateur (hors du GIL du
+    moniteur) déroule des milliers de sessions RRQ/WRQ simultanées, dont des
+    NAK, des erreurs en cours de transfert et des sessions abandonnées, en
+    lisant et écrivant réellement les fichiers de la racine ;
+  - une base SQLite à la place de MySQL (même pool tftpmon.db, mêmes requêtes
+    d'insertion et d'agrégats), ou une base MySQL de test (--mysql) ;
+  - un puits syslog UDP et un récepteur du canal d'alertes, en local.
+
+Avec --processes, chaque session est un vrai processus (fork du générateur),
+fichier ouvert pendant toute la session, dont le PID figure dans les lignes du
+journal : la corrélation par PID (fanotify, ou /proc avec --session-tracking
+proc) est alors mesurée. Un fork coûte environ 1 ms : à réserver aux débits
+modérés. Sans --processes, les PID du journal sont fictifs et les fermetures
+sont associées par nom de fichier (session_tracking "off").
+
+Pour chaque palier de débit : sessions injectées et écrites par seconde,
+retard de corrélation (validation en base - échéance attendue) et latence de
+bout en bout en percentiles, taux d'attributions erronées (statut, fichier,
+taille ou horodatage différents de la session réelle ; lignes manquantes ou
+en double) et
+croissance de la mémoire (RSS) du moniteur. Les paliers s'arrêtent au premier
+dont le p99 du retard dépasse --max-lag.
+
+Usage : python3 benchmarks/bench_pipeline.py [--rates 250,500,1000,2000]
+        [--duration S] [--session-time S] [--processes] [--session-tracking MODE]
+        [--mysql BASE] [--verbose] [--keep]
+"""
+
+import argparse
+import gc
+import importlib.util
+import multiprocessing
+import os
+import random
+import re
+import shutil
+import signal
+import socket
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from datetime import date, datetime
+from functools import lru_cache
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT_DIR)
+
+from tftpmon import inotify_reader, log
+from tftpmon.alert_channel import bind_datagram
+from tftpmon.db import Database, _PooledConnection
+from tftpmon.db_writer import TransferWriter
+
+MONITOR_SCRIPT = os.path.join(ROOT_DIR, "scripts", "tftp-monitor.py")
+
+KINDS = ("read", "write", "nak", "refused", "abort")
+DEFAULT_MIX = "read=70,write=12,nak=8,refused=8,abort=2"
+# Statut attendu en base pour chaque type de session
+EXPECTED_STATUS = {"read": "success", "write": "success", "nak": "failed",
+                   "refused": "failed", "abort": "timeout"}
+
+
+# ==============================
+# BASE SQLITE (À LA PLACE DE MYSQL)
+# ==============================
+SQLITE_SCHEMA = """
+CREATE TABLE file_transfers (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    filename TEXT NOT NULL, client_ip TEXT NOT NULL, file_size INTEGER,
+    transfer_type TEXT NOT NULL, status TEXT NOT NULL, timestamp TEXT NOT NULL
+);
+CREATE TABLE transfer_stats_minute (bucket TEXT, transfer_type TEXT, status TEXT,
+    transfers INTEGER, bytes INTEGER, PRIMARY KEY (bucket, transfer_type, status));
+CREATE TABLE transfer_stats_hourly (bucket TEXT, transfer_type TEXT, status TEXT,
+    transfers INTEGER, bytes INTEGER, PRIMARY KEY (bucket, transfer_type, status));
+CREATE TABLE transfer_stats_daily (bucket TEXT, transfer_type TEXT, status TEXT,
+    transfers INTEGER, bytes INTEGER, PRIMARY KEY (bucket, transfer_type, status));
+CREATE TABLE client_stats_daily (day TEXT, client_ip TEXT, transfers INTEGER,
+    success INTEGER, failed INTEGER, last_seen TEXT, PRIMARY KEY (day, client_ip));
+CREATE TABLE file_stats_daily (day TEXT, filename TEXT, transfers INTEGER, bytes INTEGER,
+    PRIMARY KEY (day, filename));
+CREATE TABLE file_stats_total (filename TEXT PRIMARY KEY, transfers INTEGER, bytes INTEGER,
+    last_seen TEXT);
+"""
+
+sqlite3.register_adapter(datetime, lambda value: value.isoformat(" "))
+sqlite3.register_adapter(date, lambda value: value.isoformat())
+
+
+@lru_cache(maxsize=None)
+def sqlite_sql(sql):
+    """Requête MySQL de tftpmon (INSERT ... ON DUPLICATE KEY UPDATE) en dialecte SQLite"""
+    sql = sql.replace("%s", "?").replace("GREATEST(", "MAX(")
+    head, sep, update = sql.partition("ON DUPLICATE KEY UPDATE")
+    if sep:
+        sql = head + "ON CONFLICT DO UPDATE SET" + re.sub(r"VALUES\((\w+)\)", r"excluded.\1", update)
+    return sql
+
+
+class _SqliteCursor:
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    @property
+    def rowcount(self):
+        return self._cursor.rowcount
+
+    def execute(self, sql, params=None):
+        self._cursor.execute(sqlite_sql(sql), params or ())
+
+    def executemany(self, sql, rows):
+        self._cursor.executemany(sqlite_sql(sql), rows)
+
+    def fetchall(self):
+        return self._cursor.fetchall()
+
+    def close(self):
+        self._cursor.close()
+
+
+class _SqliteConnection:
+    """Sous-ensemble de l'interface mysql.connector utilisé par tftpmon.db"""
+
+    def __init__(self, path):
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+
+    def cursor(self, dictionary=False, prepared=False):
+        return _SqliteCursor(self._conn.cursor())
+
+    def commit(self):
+        self._conn.commit()
+
+    def rollback(self):
+        self._conn.rollback()
+
+    def ping(self):
+        pass
+
+    def close(self):
+        self._conn.close()
+
+
+class SqliteDatabase(Database):
+    """Pool tftpmon.db dont les connexions ouvrent une base SQLite locale"""
+
+    def __init__(self, path, **kwargs):
+        super().__init__({}, **kwargs)
+        self.path = path
+        conn = sqlite3.connect(path)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(SQLITE_SCHEMA)
+        conn.close()
+
+    def _connect(self):
+        self.counters["connections"] += 1
+        return _PooledConnection(_SqliteConnection(self.path))
+
+
+# ==============================
+# ENVIRONNEMENT LOCAL
+# ==============================
+class Sink(threading.Thread):
+    """Puits local : compte les datagrammes reçus (syslog UDP, canal d'alertes)"""
+
+    def __init__(self, sock):
+        super().__init__(daemon=True)
+        self.sock = sock
+        self.received = 0
+        self.start()
+
+    def run(self):
+        while True:
+            try:
+                self.sock.recv(65536)
+            except OSError:
+                return
+            self.received += 1
+
+
+class PipeJournal:
+    """Remplace tftpmon.journal_reader : entrées tftpd envoyées par le générateur"""
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def follow(self, unit, backend="native", cursor=None, on_caught_up=None):
+        if on_caught_up is not None:
+            on_caught_up()
+        while True:
+            try:
+                entries = self.conn.recv()
+            except (EOFError, OSError):
+                return
+            for pid, message, ts in entries:
+                yield pid, message, ts, None
+
+
+def load_module(name, path):
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+def load_monitor(tmp, root, syslog_port, alert_path, args):
+    """Charge scripts/tftp-monitor.py avec une configuration tournée vers l'environnement de test"""
+    config_path = os.path.join(ROOT_DIR, "config.py")
+    if not os.path.exists(config_path):
+        config_path = os.path.join(ROOT_DIR, "config_example.py")
+    config = load_module("config", config_path)
+    config.TFTP_CONFIG.update({
+        "root_directory": root,
+        "wait_after_close": args.wait_after_close,
+        "orphan_ttl_seconds": args.orphan_ttl,
+        "inotify_backend": "native",
+        "file_hash": None,
+        "db_spool_file": os.path.join(tmp, "spool.jsonl"),
+        "db_dead_letter_file": os.path.join(tmp, "rejected.jsonl"),
+        "checkpoint_file": None,
+        "session_tracking": args.session_tracking,
+    })
+    if args.flush_interval is not None:
+        config.TFTP_CONFIG["db_flush_interval"] = args.flush_interval
+    config.SYSLOG_CONFIG.update({"host": "127.0.0.1", "port": syslog_port, "protocol": "udp"})
+    config.ALERT_CONFIG["socket_path"] = alert_path
+    config.METRICS_CONFIG = {"tftp_monitor_port": None}
+    return config, load_module("tftp_monitor", MONITOR_SCRIPT)
+
+
+def create_files(root, count, rng):
+    """Fichiers servis en lecture ; renvoie {nom relatif: taille}"""
+    sizes = {}
+    os.makedirs(os.path.join(root, "configs"))
+    os.makedirs(os.path.join(root, "backup"))
+    for i in range(count):
+        name = f"configs/sw{i:04d}.cfg"
+        size = rng.randint(256, 65536)
+        with open(os.path.join(root, name), "wb") as f:
+            f.write(b"!" * size)
+        sizes[name] = size
+    return sizes
+
+
+def rss_mb():
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+# ==============================
+# GÉNÉRATEUR DE SESSIONS
+# ==============================
+def parse_mix(text):
+    weights = dict.fromkeys(KINDS, 0)
+    for part in text.split(","):
+        kind, _, weight = part.partition("=")
+        if kind.strip() not in weights:
+            raise ValueError(f"type de session inconnu '{kind}' ({', '.join(KINDS)})")
+        weights[kind.strip()] = float(weight)
+    return [weights[kind] for kind in KINDS]
+
+
+def make_plan(first, rate, duration, session_time, weights, files, rng):
+    """Sessions d'un palier : (n°, type, pid, ip, fichier, début, durée, taille écrite)"""
+    count = int(rate * duration)
+    kinds = rng.choices(KINDS, weights, k=count)
+    sessions = []
+    for i, kind in enumerate(kinds):
+        n = first + i
+        # Une adresse par session : la ligne en base désigne sans ambiguïté la session réelle
+        ip = f"10.{n >> 16 & 255}.{n >> 8 & 255}.{n & 255}"
+        size = None
+        if kind == "write":
+            filename = f"backup/{ip}.cfg"
+            size = rng.randint(256, 16384)
+        elif kind == "nak":
+            filename = f"absent/{n}.cfg"
+        else:
+            # Lectures concurrentes des mêmes fichiers : cas difficile pour la corrélation
+            filename = rng.choice(files)
+        start = (i + rng.random()) / rate
+        length = session_time * rng.uniform(0.5, 1.5)
+        sessions.append((n, kind, 100000 + n, ip, filename, start, length, size))
+    return sessions
+
+
+def session_process(kind, path, close_at, size, payload):
+    """Fils tftpd simulé : fichier ouvert dès la requête, transfert et fermeture à close_at"""
+    try:
+        if kind in ("read", "refused", "write"):
+            f = open(path, "wb" if kind == "write" else "rb")
+            time.sleep(max(0.0, close_at - time.time()))
+            if kind == "write":
+                f.write(payload[:size])
+            else:
+                f.read()
+            f.close()
+    finally:
+        os._exit(0)
+
+
+def drive(sessions, root, journal, processes=False):
+    """
+    Déroule les sessions aux instants prévus : lignes tftpd vers le journal,
+    lecture / écriture réelle des fichiers (par un processus par session avec
+    processes, dont le PID remplace celui du plan). Renvoie (heures des
+    requêtes, heures des fermetures, plus grand retard du générateur sur son plan).
+    """
+    actions = []
+    for index, session in enumerate(sessions):
+        kind, start, length = session[1], session[5], session[6]
+        actions.append((start, 0, index))
+        if kind == "nak":
+            actions.append((start + 0.001, 1, index))
+        elif kind != "abort":
+            actions.append((start + length, 1, index))
+    actions.sort()
+
+    requested = [None] * len(sessions)
+    closed = [None] * len(sessions)
+    pids = {}
+    payload = b"#" * 16384
+    lateness = 0.0
+    started = time.time()
+    i = 0
+    while i < len(actions):
+        now = time.time() - started
+        if actions[i][0] > now:
+            time.sleep(min(actions[i][0] - now, 0.005))
+            continue
+        lateness = max(lateness, now - actions[i][0])
+        entries = []
+        while i < len(actions) and actions[i][0] <= now:
+            _, phase, index = actions[i]
+            i += 1
+            _, kind, pid, ip, filename, start, length, size = sessions[index]
+            path = os.path.join(root, filename)
+            if phase == 0 and processes:
+                pid = os.fork()
+                if pid == 0:
+                    session_process(kind, path, started + start + length, size, payload)
+                pids[index] = pid
+            pid = str(pids.get(index, pid))
+            if phase == 0:
+                typ = "WRQ" if kind == "write" else "RRQ"
+                requested[index] = time.time()
+                entries.append((pid, f"{typ} from {ip} filename {filename}", requested[index]))
+            elif kind == "nak":
+                entries.append((pid, f"sending NAK (1, File not found) to {ip}", time.time()))
+            else:
+                if kind == "refused":
+                    entries.append((pid, "tftpd: read: Connection refused", time.time()))
+                if processes:
+                    # Fermeture faite par le fils, à la même échéance
+                    closed[index] = time.time()
+                    continue
+                if kind == "write":
+                    with open(path, "wb") as f:
+                        f.write(payload[:size])
+                else:
+                    with open(path, "rb") as f:
+                        f.read()
+                closed[index] = time.time()
+        if entries:
+            journal.send(entries)
+    return requested, closed, lateness
+
+
+def generator(control, journal, results):
+    """Processus générateur : un plan par palier, jusqu'à réception de None"""
+    # Fils de session récoltés automatiquement
+    signal.signal(signal.SIGCHLD, signal.SIG_IGN)
+    while True:
+        job = control.recv()
+        if job is None:
+            return
+        sessions, root, processes = job
+        results.send(drive(sessions, root, journal, processes))
+
+
+# ==============================
+# MESURES
+# ==============================
+def record_commits(writer, commits):
+    """Heure de validation de chaque ligne, par IP client (une IP par session)"""
+    insert = writer._insert
+
+    def timed_insert(rows):
+        inserted, rest = insert(rows)
+        now = time.time()
+        for row in inserted:
+            commits.setdefault(row[1], []).append((now, row))
+        return inserted, rest
+
+    writer._insert = timed_insert
+
+
+def percentiles(values, points=(50, 95, 99)):
+    if not values:
+        return [float("nan")] * (len(points) + 1)
+    values = sorted(values)
+    return [values[min(len(values) - 1, int(p / 100 * len(values)))] for p in points] + [values[-1]]
+
+
+def evaluate(sessions, requested, closed, commits, file_sizes, args):
+    """Retards, latences et attributions erronées d'un palier (après drainage)"""
+    result = {"lags": [], "e2e": [], "commits": [], "missing": 0, "duplicates": 0,
+              "wrong": Counter()}
+    for index, (_, kind, _, ip, filename, _, _, size) in enumerate(sessions):
+        rows = commits.get(ip)
+        if not rows:
+            result["missing"] += 1
+            continue
+        if len(rows) > 1:
+            result["duplicates"] += 1
+        committed_at, row = rows[0]
+        result["commits"].append(committed_at)
+
+        if kind == "write":
+            expected_size = size
+        elif kind in ("read", "refused"):
+            expected_size = file_sizes[filename]
+        else:
+            expected_size = None
+        # Horodatage en base : fermeture du fichier, ou requête pour un orphelin expiré
+        expected_at = requested[index] if kind in ("nak", "abort") else closed[index]
+        if (row[0], row[2], row[4]) != (filename, expected_size, EXPECTED_STATUS[kind]) or \
+                abs(row[5].timestamp() - expected_at) > args.wait_after_close:
+            # Ligne (ou fermeture) d'une autre session : son échéance n'est pas celle de la session réelle
+            result["wrong"][kind] += 1
+            continue
+
+        # Échéance : fin de la stabilisation après fermeture, ou expiration de l'orphelin
+        if kind in ("nak", "abort"):
+            due = requested[index] + args.orphan_ttl
+        else:
+            due = closed[index] + args.wait_after_close
+            result["e2e"].append(committed_at - requested[index])
+        result["lags"].append(committed_at - due)
+    return result
+
+
+def peak_concurrency(sessions, args):
+    edges = []
+    for _, kind, _, _, _, start, length, _ in sessions:
+        end = start + (args.orphan_ttl if kind in ("nak", "abort") else length)
+        edges += [(start, 1), (end, -1)]
+    peak = current = 0
+    for _, delta in sorted(edges):
+        current += delta
+        peak = max(peak, current)
+    return peak
+
+
+# ==============================
+# POINT D'ENTRÉE
+# ==============================
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rates", default="250,500,1000,2000",
+                        help="paliers de débit, en sessions par seconde")
+    parser.add_argument("--duration", type=float, default=15, help="durée d'un palier (s)")
+    parser.add_argument("--session-time", type=float, default=2.0,
+                        help="durée moyenne d'une session, requête -> fermeture (s)")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help=f"répartition des sessions ({DEFAULT_MIX})")
+    parser.add_argument("--files", type=int, default=200, help="fichiers servis en lecture")
+    parser.add_argument("--wait-after-close", type=float, default=0.5)
+    parser.add_argument("--orphan-ttl", type=float, default=5)
+    parser.add_argument("--flush-interval", type=float, default=None,
+                        help="intervalle d'écriture DB (défaut : celui de la configuration)")
+    parser.add_argument("--max-lag", type=float, default=2.0,
+                        help="p99 du retard (s) au-delà duquel le palier est saturé")
+    parser.add_argument("--processes", action="store_true",
+                        help="un processus par session (PID réels, corrélation par PID)")
+    parser.add_argument("--session-tracking", choices=("fanotify", "proc", "off"),
+                        help="TFTP_CONFIG[\"session_tracking\"] du moniteur "
+                             "(défaut : fanotify avec --processes, off sinon)")
+    parser.add_argument("--mysql", metavar="BASE",
+                        help="base MySQL de test (schéma créé, identifiants de config.DB_CONFIG) "
+                             "au lieu de SQLite")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--verbose", action="store_true", help="affiche la sortie du moniteur")
+    parser.add_argument("--keep", action="store_true", help="conserve le répertoire de test")
+    args = parser.parse_args()
+    if args.session_tracking is None:
+        args.session_tracking = "fanotify" if args.processes else "off"
+
+    if not inotify_reader.native_available():
+        sys.exit("inotify natif indisponible (Linux requis)")
+    weights = parse_mix(args.mix)
+    rates = [float(rate) for rate in args.rates.split(",")]
+    rng = random.Random(args.seed)
+
+    tmp = tempfile.mkdtemp(prefix="tftp-pipeline-")
+    root = os.path.join(tmp, "root")
+    file_sizes = create_files(root, args.files, rng)
+    files = sorted(file_sizes)
+
+    # Générateur créé avant tout thread du moniteur (fork sans verrou pris)
+    ctx = multiprocessing.get_context("fork")
+    control_r, control_w = ctx.Pipe(duplex=False)
+    journal_r, journal_w = ctx.Pipe(duplex=False)
+    results_r, results_w = ctx.Pipe(duplex=False)
+    worker = ctx.Process(target=generator, args=(control_r, journal_w, results_w), daemon=True)
+    worker.start()
+
+    syslog_sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    syslog_sock.bind(("127.0.0.1", 0))
+    syslog_sink = Sink(syslog_sock)
+    alert_path = os.path.join(tmp, "alerts.sock")
+    alert_sink = Sink(bind_datagram(alert_path))
+
+    config, monitor = load_monitor(tmp, root, syslog_sock.getsockname()[1], alert_path, args)
+    if args.mysql:
+        db = Database(dict(config.DB_CONFIG, database=args.mysql), pool_size=1)
+    else:
+        db = SqliteDatabase(os.path.join(tmp, "transfers.sqlite"), pool_size=1)
+    monitor.db = db
+    monitor.writer = writer = TransferWriter(db, monitor.DB_BATCH_SIZE, monitor.DB_FLUSH_INTERVAL,
+                                             monitor.DB_SPOOL_FILE,
+                                             dead_letter_file=monitor.DB_DEAD_LETTER_FILE)
+    commits = {}
+    record_commits(writer, commits)
+    monitor.journal_reader = PipeJournal(journal_r)
+
+    out = sys.stdout
+    if args.verbose:
+        log.setup(monitor.LOG_CONFIG)
+    else:
+        sys.stdout = open(os.devnull, "w")
+
+    def report(*parts):
+        print(*parts, file=out, flush=True)
+
+    try:
+        # Démarrage identique à celui de tftp-monitor.py
+        monitor.file_index.build()
+        inotify_events = inotify_reader.watch_events(
+            root, "native", close_pids=monitor.SESSION_TRACKING == "fanotify")
+        monitor.file_index.watching = True
+        writer.start()
+        monitor.syslog.start()
+        threading.Thread(target=monitor.watch_inotify, args=(inotify_events,), daemon=True).start()
+        threading.Thread(target=monitor.watch_logs, daemon=True).start()
+        time.sleep(0.5)
+
+        baseline = rss_mb()
+        report(f"Base : {'MySQL ' + args.mysql if args.mysql else 'SQLite'} | "
+               f"stabilisation {args.wait_after_close} s | TTL orphelins {args.orphan_ttl} s | "
+               f"lot DB {monitor.DB_BATCH_SIZE} / {monitor.DB_FLUSH_INTERVAL} s | "
+               f"sessions {'processus' if args.processes else 'simulées'}, "
+               f"session_tracking {args.session_tracking} | "
+               f"RSS initial {baseline:.1f} Mo\n")
+
+        first = 0
+        for rate in rates:
+            sessions = make_plan(first, rate, args.duration, args.session_time, weights, files, rng)
+            first += len(sessions)
+            started = time.time()
+            control_w.send((sessions, root, args.processes))
+            requested, closed, lateness = results_r.recv()
+            injected = time.time() - started
+
+            # Drainage : toutes les sessions en base, ou abandon après l'échéance la plus tardive
+            deadline = time.time() + args.orphan_ttl + args.wait_after_close + 30
+            while time.time() < deadline:
+                if all(session[3] in commits for session in sessions):
+                    break
+                time.sleep(0.2)
+
+            res = evaluate(sessions, requested, closed, commits, file_sizes, args)
+            count = len(sessions)
+            peak = peak_concurrency(sessions, args)
+            arrivals = max(requested) - min(requested)
+            # Débit d'écriture en régime établi : après le remplissage du pipeline
+            # (session la plus longue, stabilisation, lot DB), jusqu'à la fin des requêtes
+            warmup = args.session_time * 1.5 + args.wait_after_close + monitor.DB_FLUSH_INTERVAL
+            window = args.duration - warmup
+            steady = sum(1 for t in res["commits"] if warmup <= t - started < args.duration)
+            write_rate = f"{steady / window:,.0f}/s en régime établi" if window > 0 \
+                else "palier trop court pour le régime établi"
+            lag = percentiles(res["lags"])
+            e2e = percentiles(res["e2e"])
+            wrong = sum(res["wrong"].values())
+
+            # Suivi du palier libéré avant la mesure : la croissance du RSS
+            # d'un palier à l'autre est celle du moniteur
+            for session in sessions:
+                commits.pop(session[3], None)
+            del sessions, requested, closed
+            gc.collect()
+            rss = rss_mb()
+            stats = monitor.engine.stats()
+            residual = {k: stats[k] for k in ("requests", "closes", "errors", "pending") if stats[k]}
+
+            report(f"Palier {rate:,.0f} sessions/s ({args.duration:g} s, "
+                   f"jusqu'à {peak:,} sessions simultanées)")
+            report(f"  injectées   : {count:,} ({count / arrivals:,.0f} requêtes/s, "
+                   f"plan déroulé en {injected:.1f} s, retard max du générateur "
+                   f"{lateness * 1000:.0f} ms)")
+            report(f"  écrites     : {count - res['missing']:,} ({write_rate}) | syslog reçus "
+                   f"{syslog_sink.received:,} | canal d'alertes {alert_sink.received:,}")
+            report("  retard      : p50 {:.3f} s  p95 {:.3f} s  p99 {:.3f} s  max {:.3f} s "
+                   "(validation en base - échéance, lignes correctes)".format(*lag))
+            report("  bout en bout: p50 {:.3f} s  p95 {:.3f} s  p99 {:.3f} s  max {:.3f} s "
+                   "(RRQ/WRQ -> ligne, sessions terminées correctes)".format(*e2e))
+            report(f"  attributions erronées : {wrong / count:.3%} "
+                   f"({', '.join(f'{k} {v}' for k, v in res['wrong'].most_common()) or 'aucune'}) "
+                   f"| manquantes {res['missing']} | doublons {res['duplicates']}")
+            report(f"  mémoire     : RSS {rss:.1f} Mo ({rss - baseline:+.1f} Mo) | "
+                   f"orphelins en attente de TTL {residual or 'aucun'} | file DB {writer.queue_depth()}\n")
+
+            if lateness > 1:
+                report("  ⚠️ Générateur en retard sur son plan : débit injecté inférieur au palier\n")
+            if lag[2] > args.max_lag or res["missing"]:
+                report(f"Saturation à {rate:,.0f} sessions/s (p99 du retard {lag[2]:.2f} s, "
+                       f"seuil {args.max_lag} s, {res['missing']} ligne(s) manquante(s))")
+                break
+        report(f"DB : {db.summary()}")
+    finally:
+        # La sortie du moniteur reste redirigée : ses threads tournent jusqu'à la fin du processus
+        control_w.send(None)
+        worker.join(5)
+        if args.keep:
+            report(f"Répertoire de test conservé : {tmp}")
+        else:
+            shutil.rmtree(tmp, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
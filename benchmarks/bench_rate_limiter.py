@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Coût par événement du limiteur de débit d'alert-monitor.
+
+Rejoue des événements synthétiques (par défaut 1 000 000 sur 100 000 IP
+distinctes, répartis sur une heure) à travers :
+  - l'ancienne implémentation (defaultdict(list) reconstruite à chaque requête)
+  - RateLimiter (liste triée bornée à limit + 1 horodatages, oubli des IP
+    inactives), par IP et par /24
+
+Affiche le coût moyen par événement, le nombre de clés suivies en fin de rejeu
+et le pic de mémoire allouée (tracemalloc, mesuré sur un second passage).
+
+Usage : python3 benchmarks/bench_rate_limiter.py [--events N] [--ips N] [--hot-share F]
+"""
+
+import argparse
+import gc
+import os
+import random
+import sys
+import time
+import tracemalloc
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tftpmon.rate_limiter import RateLimiter, subnet_of
+
+WINDOW = 60
+LIMIT = 15
+
+
+def generate(events, ips, hot_share, duration, seed):
+    """Événements (ip, horodatage) triés ; une part `hot_share` vient de 10 IP très actives"""
+    rng = random.Random(seed)
+    pool = [f"10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}" for i in range(ips)]
+    hot = pool[:10]
+    start = 1_700_000_000.0
+    step = duration / events
+    return [
+        (rng.choice(hot) if rng.random() < hot_share else rng.choice(pool), start + i * step)
+        for i in range(events)
+    ]
+
+
+def legacy(events):
+    """Ancienne logique de verifier_rate_limit (datetime de l'événement comme horloge)"""
+    tracker = defaultdict(list)
+    window = timedelta(seconds=WINDOW)
+    alerts = 0
+    for ip, ts in events:
+        now = datetime.fromtimestamp(ts)
+        tracker[ip].append(now)
+        tracker[ip] = [t for t in tracker[ip] if now - t < window]
+        if len(tracker[ip]) > LIMIT:
+            alerts += 1
+            tracker[ip] = []
+    return alerts, len(tracker)
+
+
+def limiter_ip(events):
+    per_ip = RateLimiter(WINDOW, LIMIT)
+    alerts = 0
+    for ip, ts in events:
+        if per_ip.hit(ip, ts):
+            alerts += 1
+    return alerts, len(per_ip)
+
+
+def limiter(events):
+    per_ip = RateLimiter(WINDOW, LIMIT)
+    per_subnet = RateLimiter(WINDOW, LIMIT * 10)
+    alerts = 0
+    for ip, ts in events:
+        if per_ip.hit(ip, ts):
+            alerts += 1
+        if per_subnet.hit(subnet_of(ip), ts):
+            alerts += 1
+    return alerts, len(per_ip) + len(per_subnet)
+
+
+def measure(name, func, events):
+    gc.collect()
+    started = time.perf_counter()
+    alerts, keys = func(events)
+    elapsed = time.perf_counter() - started
+
+    # Second passage pour la mémoire (tracemalloc fausserait la mesure de temps)
+    gc.collect()
+    tracemalloc.start()
+    func(events)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{name:<24} {elapsed / len(events) * 1e6:8.2f} µs/événement  "
+          f"alertes={alerts:>7,}  clés suivies={keys:>8,}  pic mémoire={peak / 1e6:7.1f} Mo")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--events", type=int, default=1_000_000)
+    parser.add_argument("--ips", type=int, default=100_000)
+    parser.add_argument("--hot-share", type=float, default=0.2,
+                        help="part des événements émis par 10 IP très actives")
+    parser.add_argument("--duration", type=float, default=3600, help="durée simulée (s)")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    events = generate(args.events, args.ips, args.hot_share, args.duration, args.seed)
+    print(f"{len(events):,} événements, {args.ips:,} IP, fenêtre {WINDOW} s, seuil {LIMIT}\n")
+    measure("ancien (liste par IP)", legacy, events)
+    measure("RateLimiter IP", limiter_ip, events)
+    measure("RateLimiter IP + /24", limiter, events)
+
+
+if __name__ == "__main__":
+    main()
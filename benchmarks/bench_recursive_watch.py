@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Temps de démarrage de la surveillance récursive sur une grande arborescence.
+
+Crée une arborescence temporaire (par défaut 20 000 répertoires répartis sur
+deux niveaux, deux fichiers chacun), puis mesure :
+  - l'indexation initiale des fichiers (FileIndex.build)
+  - la pose des watches inotify (RecursiveWatcher.add_tree)
+  - la prise en compte d'un répertoire créé après le démarrage
+
+Usage : python3 benchmarks/bench_recursive_watch.py [--dirs N] [--files F] [--keep DIR]
+"""
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tftpmon.file_index import FileIndex
+from tftpmon.inotify_reader import RecursiveWatcher, native_events, _max_user_watches
+
+
+def build_tree(root, dirs, files):
+    per_level = max(1, int(dirs ** 0.5))
+    created = 0
+    for i in range(per_level):
+        top = os.path.join(root, f"site{i:04d}")
+        os.mkdir(top)
+        created += 1
+        for j in range(per_level):
+            if created >= dirs:
+                break
+            sub = os.path.join(top, f"sw{j:04d}")
+            os.mkdir(sub)
+            created += 1
+            for k in range(files):
+                with open(os.path.join(sub, f"config{k}.cfg"), "w") as f:
+                    f.write("hostname sw\n")
+    return created
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--dirs", type=int, default=20000)
+    parser.add_argument("--files", type=int, default=2)
+    parser.add_argument("--keep", help="utilise ce répertoire au lieu d'un répertoire temporaire")
+    args = parser.parse_args()
+
+    root = args.keep or tempfile.mkdtemp(prefix="tftp-bench-")
+    try:
+        if not os.listdir(root):
+            started = time.perf_counter()
+            created = build_tree(root, args.dirs, args.files)
+            print(f"Arborescence : {created:,} répertoires créés en {time.perf_counter() - started:.1f} s")
+
+        index = FileIndex(root)
+        started = time.perf_counter()
+        indexed = index.build()
+        elapsed = time.perf_counter() - started
+        print(f"Index        : {indexed:,} fichiers en {elapsed:.2f} s")
+
+        watcher = RecursiveWatcher(root)
+        started = time.perf_counter()
+        count = watcher.add_tree()
+        elapsed = time.perf_counter() - started
+        print(f"Watches      : {count:,} en {elapsed:.2f} s "
+              f"({count / elapsed:,.0f}/s, échecs={watcher.watch_failures}, "
+              f"max_user_watches={_max_user_watches()})")
+
+        # Répertoire ajouté à chaud : watch posé dynamiquement, fichier vu en chemin relatif
+        events = native_events(root, watcher=watcher)
+        os.makedirs(os.path.join(root, "hot", "nxos"))
+        for relpath, event, _, _ in events:
+            index.apply(relpath, event)
+            if relpath == "hot" and "CREATE" in event:
+                break
+        print(f"À chaud      : {relpath} ({event}) -> "
+              f"{'hot/nxos' in watcher.wds and 'watch posé' or 'watch absent'} sur hot/nxos")
+
+        started = time.perf_counter()
+        with open(os.path.join(root, "hot", "nxos", "n9k.bin"), "w") as f:
+            f.write("x")
+        for relpath, event, _, _ in events:
+            index.apply(relpath, event)
+            if relpath == "hot/nxos/n9k.bin" and "CLOSE_WRITE" in event:
+                break
+        print(f"               hot/nxos/n9k.bin vu en {(time.perf_counter() - started) * 1000:.1f} ms, "
+              f"taille indexée={index.size('hot/nxos/n9k.bin')}")
+        watcher.close()
+    finally:
+        if not args.keep:
+            shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
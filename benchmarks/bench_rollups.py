@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""
+Requêtes du tableau de bord : historique complet contre tables d'agrégats.
+
+Crée une base de test (par défaut `tftp_bench`, avec les identifiants de
+config.DB_CONFIG), y génère plusieurs millions de transferts répartis sur un
+an en alimentant les agrégats comme le fait tftp-monitor, puis chronomètre
+les requêtes d'origine de dashboard/app.py et leurs équivalents sur les
+agrégats. Nécessite un serveur MySQL et le droit CREATE DATABASE.
+
+Usage : python3 benchmarks/bench_rollups.py [--rows N] [--database NOM] [--keep]
+"""
+
+import argparse
+import os
+import random
+import re
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import mysql.connector
+
+from config import DB_CONFIG
+from tftpmon import rollups
+from tftpmon.db_writer import INSERT_SQL
+
+SCHEMA = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                      "database", "shema.sql")
+
+OLD_QUERIES = {
+    "stats": [
+        "SELECT COUNT(*) FROM file_transfers WHERE DATE(timestamp) = CURDATE()",
+        "SELECT COUNT(*) FROM file_transfers WHERE DATE(timestamp) = CURDATE() AND status = 'success'",
+        "SELECT COUNT(*) FROM file_transfers WHERE DATE(timestamp) = CURDATE() AND status = 'failed'",
+        "SELECT COUNT(DISTINCT client_ip) FROM file_transfers WHERE DATE(timestamp) = CURDATE()",
+        "SELECT COUNT(*) FROM file_transfers",
+    ],
+    "hourly": ["""
+        SELECT HOUR(timestamp), COUNT(*),
+               SUM(CASE WHEN status = 'success' THEN 1 ELSE 0 END),
+               SUM(CASE WHEN status = 'failed' THEN 1 ELSE 0 END)
+        FROM file_transfers
+        WHERE timestamp >= NOW() - INTERVAL 24 HOUR
+        GROUP BY HOUR(timestamp)
+    """],
+    "top-files": [
+        "SELECT filename, COUNT(*) as count FROM file_transfers "
+        "GROUP BY filename ORDER BY count DESC LIMIT 5"
+    ],
+}
+
+NEW_QUERIES = {
+    "stats": ["""
+        SELECT
+            COALESCE(SUM(CASE WHEN bucket = CURDATE() THEN transfers END), 0),
+            COALESCE(SUM(CASE WHEN bucket = CURDATE() AND status = 'success' THEN transfers END), 0),
+            COALESCE(SUM(CASE WHEN bucket = CURDATE() AND status = 'failed' THEN transfers END), 0),
+            COALESCE(SUM(transfers), 0),
+            (SELECT COUNT(*) FROM client_stats_daily WHERE day = CURDATE())
+        FROM transfer_stats_daily
+    """],
+    "hourly": ["""
+        SELECT HOUR(bucket), SUM(transfers),
+               SUM(CASE WHEN status = 'success' THEN transfers ELSE 0 END),
+               SUM(CASE WHEN status = 'failed' THEN transfers ELSE 0 END)
+        FROM transfer_stats_hourly
+        WHERE bucket >= DATE_FORMAT(NOW() - INTERVAL 23 HOUR, '%Y-%m-%d %H:00:00')
+        GROUP BY HOUR(bucket)
+    """],
+    "top-files": [
+        "SELECT filename, transfers FROM file_stats_total ORDER BY transfers DESC LIMIT 5"
+    ],
+}
+
+
+def create_schema(cursor, database):
+    cursor.execute(f"DROP DATABASE IF EXISTS {database}")
+    cursor.execute(f"CREATE DATABASE {database}")
+    cursor.execute(f"USE {database}")
+    with open(SCHEMA, encoding="utf-8") as f:
+        sql = re.sub(r"--[^\n]*", "", f.read())
+    for statement in sql.split(";"):
+        statement = statement.strip()
+        if statement.upper().startswith("CREATE TABLE"):
+            cursor.execute(statement)
+
+
+def generate(conn, count, seed, batch_size=10000):
+    """Insère `count` transferts sur les 365 derniers jours ; renvoie (s insertion, s agrégats)"""
+    rng = random.Random(seed)
+    files = [f"site{i % 200}/config-{i}.cfg" for i in range(20000)]
+    ips = [f"10.{i >> 8 & 255}.{i & 255}.{rng.randrange(1, 255)}" for i in range(5000)]
+    now = datetime.now()
+    span = 365 * 86400
+    cursor = conn.cursor()
+    insert_time = rollup_time = 0
+    for start in range(0, count, batch_size):
+        rows = []
+        for _ in range(min(batch_size, count - start)):
+            # Activité plus dense sur les derniers jours
+            age = span * rng.random() ** 3
+            rows.append((
+                rng.choice(files), rng.choice(ips), rng.randrange(1000, 5_000_000),
+                "upload" if rng.random() < 0.3 else "download",
+                rng.choices(("success", "failed", "timeout"), (90, 8, 2))[0],
+                (now - timedelta(seconds=age)).replace(microsecond=0),
+            ))
+        started = time.perf_counter()
+        cursor.executemany(INSERT_SQL, rows)
+        insert_time += time.perf_counter() - started
+        started = time.perf_counter()
+        rollups.update(cursor, rows)
+        rollup_time += time.perf_counter() - started
+        conn.commit()
+        print(f"\r{start + len(rows):,} / {count:,} lignes", end="", flush=True)
+    print()
+    cursor.close()
+    return insert_time, rollup_time
+
+
+def timed(cursor, queries, repeat):
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for sql in queries:
+            cursor.execute(sql)
+            cursor.fetchall()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=5_000_000)
+    parser.add_argument("--database", default="tftp_bench")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--keep", action="store_true", help="conserve la base de test")
+    args = parser.parse_args()
+
+    config = {k: v for k, v in DB_CONFIG.items() if k != "database"}
+    conn = mysql.connector.connect(**config)
+    cursor = conn.cursor()
+    create_schema(cursor, args.database)
+
+    insert_time, rollup_time = generate(conn, args.rows, args.seed)
+    print(f"Insertion : {insert_time:.1f} s, agrégats : {rollup_time:.1f} s "
+          f"(+{rollup_time / insert_time * 100:.0f} %)\n")
+
+    print(f"{'requête':<12} {'historique':>12} {'agrégats':>12}")
+    for name in OLD_QUERIES:
+        old = timed(cursor, OLD_QUERIES[name], args.repeat)
+        new = timed(cursor, NEW_QUERIES[name], args.repeat)
+        print(f"{name:<12} {old * 1000:>10.1f} ms {new * 1000:>10.1f} ms  (x{old / new:,.0f})")
+
+    if not args.keep:
+        cursor.execute(f"DROP DATABASE {args.database}")
+    cursor.close()
+    conn.close()
+
+
+if __name__ == "__main__":
+    main()
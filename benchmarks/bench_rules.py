@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Coût d'évaluation des règles d'alerte par transfert.
+
+Génère une liste blanche de sous-réseaux et un jeu de règles de fichiers
+critiques (noms exacts, globs, regex), puis évalue un flux de transferts
+synthétiques avec :
+  - une évaluation naïve (boucle sur ipaddress.ip_network / fnmatch / re)
+  - RuleEngine (réseaux et règles de fichiers indexés par préfixe)
+
+Usage : python3 benchmarks/bench_rules.py [--subnets N] [--patterns N] [--transfers N]
+"""
+
+import argparse
+import fnmatch
+import ipaddress
+import os
+import random
+import re
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tftpmon.rules import RuleEngine
+
+
+def generate_rules(subnets, patterns, rng):
+    networks = set()
+    while len(networks) < subnets:
+        length = rng.choice((16, 20, 22, 24, 24, 24, 28, 32))
+        addr = ipaddress.ip_address(rng.getrandbits(32) & 0x0AFFFFFF | 0x0A000000)
+        networks.add(str(ipaddress.ip_network(f"{addr}/{length}", strict=False)))
+
+    rules = []
+    for i in range(patterns):
+        kind = i % 4
+        if kind == 0:
+            rules.append(f"core-{i}.cfg")
+        elif kind == 1:
+            rules.append(f"site{i}/*.cfg")
+        elif kind == 2:
+            rules.append(f"fw-{i}-*.conf")
+        else:
+            rules.append(f"re:^backup/sw-{i}-\\d+\\.tar$")
+    # Quelques règles sans préfixe littéral, évaluées pour chaque transfert
+    rules += ["*.key", "*.pem", "re:(?i)secret"]
+    return sorted(networks), rules
+
+
+def generate_transfers(count, rng, patterns):
+    transfers = []
+    for _ in range(count):
+        ip = str(ipaddress.ip_address(0x0A000000 | rng.getrandbits(24)))
+        n = rng.randrange(patterns * 2)
+        name = rng.choice((f"core-{n}.cfg", f"site{n}/sw.cfg", f"fw-{n}-a.conf",
+                           f"backup/sw-{n}-1.tar", f"ios/c{n}.bin"))
+        transfers.append((ip, name))
+    return transfers
+
+
+def naive(networks, rules):
+    nets = [ipaddress.ip_network(n) for n in networks]
+    matchers = []
+    for rule in rules:
+        if rule.startswith("re:"):
+            matchers.append((rule, re.compile(rule[3:]).search))
+        else:
+            matchers.append((rule, lambda name, rule=rule: fnmatch.fnmatch(name, rule)))
+
+    def evaluate(ip, name):
+        addr = ipaddress.ip_address(ip)
+        authorized = any(addr in net for net in nets)
+        critical = next((rule for rule, m in matchers if m(name)), None)
+        return authorized, critical
+    return evaluate
+
+
+def compiled(networks, rules):
+    with tempfile.TemporaryDirectory() as tmp:
+        ips_file = os.path.join(tmp, "ips.txt")
+        files_file = os.path.join(tmp, "files.txt")
+        with open(ips_file, "w") as f:
+            f.write("\n".join(networks))
+        with open(files_file, "w") as f:
+            f.write("\n".join(rules))
+        started = time.perf_counter()
+        engine = RuleEngine(authorized_ips_file=ips_file, critical_files_file=files_file)
+        print(f"Compilation : {(time.perf_counter() - started) * 1000:.0f} ms\n")
+
+    def evaluate(ip, name):
+        return engine.is_authorized(ip), engine.critical_match(name)
+    return evaluate
+
+
+def measure(name, evaluate, transfers):
+    started = time.perf_counter()
+    results = [evaluate(ip, fname) for ip, fname in transfers]
+    elapsed = time.perf_counter() - started
+    print(f"{name:<12} {elapsed / len(transfers) * 1e6:10.1f} µs/transfert  "
+          f"autorisés={sum(1 for a, _ in results if a):,}  "
+          f"critiques={sum(1 for _, c in results if c):,}")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--subnets", type=int, default=500)
+    parser.add_argument("--patterns", type=int, default=5000)
+    parser.add_argument("--transfers", type=int, default=20000)
+    parser.add_argument("--naive-transfers", type=int, default=500,
+                        help="transferts évalués par la méthode naïve (lente)")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    networks, rules = generate_rules(args.subnets, args.patterns, rng)
+    transfers = generate_transfers(args.transfers, rng, args.patterns)
+    print(f"{len(networks):,} sous-réseaux, {len(rules):,} règles de fichiers\n")
+
+    fast = compiled(networks, rules)
+    slow = naive(networks, rules)
+    sample = transfers[:args.naive_transfers]
+    if measure("naïf", slow, sample) != [fast(ip, name) for ip, name in sample]:
+        print("⚠️ résultats différents entre les deux méthodes")
+    measure("RuleEngine", fast, transfers)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark de l'analyse des lignes tftpd-hpa.
+
+Génère un journal synthétique (par défaut un million de lignes, dont une
+majorité de lignes d'autres démons) et compare :
+  - l'ancienne méthode (jusqu'à trois re.search non compilés par ligne)
+  - tftpmon.tftpd_parser.parse_line (préfixe + une regex compilée)
+
+Usage : python3 benchmarks/bench_tftpd_parser.py [--lines N] [--repeat R] [--seed S]
+"""
+
+import argparse
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tftpmon.tftpd_parser import parse_line
+
+
+def generate(n, seed):
+    rnd = random.Random(seed)
+    files = [f"sw{i}.cfg" for i in range(200)] + ["ios/c2960-lanbasek9.bin", "router-prod.cfg"]
+    lines = []
+    for i in range(n):
+        pid = 1000 + i
+        r = rnd.random()
+        head = f"Oct 17 10:{i % 60:02d}:{i % 60:02d} tftp-srv"
+        if r < 0.35:
+            ip = f"10.{rnd.randint(0, 255)}.{rnd.randint(0, 255)}.{rnd.randint(1, 254)}"
+            lines.append(f"{head} in.tftpd[{pid}]: RRQ from {ip} filename {rnd.choice(files)}")
+        elif r < 0.40:
+            lines.append(
+                f"{head} in.tftpd[{pid}]: RRQ from ::ffff:192.168.1.{rnd.randint(1, 254)} "
+                f"filename {rnd.choice(files)} blksize 1468 tsize 0"
+            )
+        elif r < 0.45:
+            lines.append(f"{head} in.tftpd[{pid}]: WRQ from 2001:db8::{rnd.randint(1, 9999):x} "
+                         f"filename {rnd.choice(files)}")
+        elif r < 0.48:
+            lines.append(f"{head} in.tftpd[{pid}]: sending NAK (1, File not found) to 10.0.0.1")
+        elif r < 0.50:
+            lines.append(f"{head} in.tftpd[{pid}]: tftpd: read: Connection refused")
+        elif r < 0.55:
+            lines.append(f"{head} in.tftpd[{pid}]: Client 10.0.0.1 finished {rnd.choice(files)}")
+        else:
+            lines.append(f"{head} sshd[{pid}]: Accepted publickey for admin from 10.9.9.9 port 51514")
+    return lines
+
+
+def legacy(line):
+    """Reproduction de l'ancien watch_logs()"""
+    m = re.search(
+        r"in\.tftpd\[(\d+)\]:\s+"
+        r"(WRQ|RRQ)\s+from\s+([\d\.]+).*filename\s+(\S+)",
+        line
+    )
+    if m:
+        return m.groups()
+    m_refused = re.search(r"in\.tftpd\[(\d+)\].*read:\s+Connection refused", line)
+    if m_refused:
+        return m_refused.group(1), "Connection refused"
+    m_nak = re.search(r"in\.tftpd\[(\d+)\].*NAK", line)
+    if m_nak:
+        return m_nak.group(1), "NAK"
+    return None
+
+
+def bench(name, func, lines, repeat):
+    elapsed = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        matched = 0
+        for line in lines:
+            if func(line) is not None:
+                matched += 1
+        run = time.perf_counter() - start
+        elapsed = run if elapsed is None else min(elapsed, run)
+    print(f"{name:<12} {len(lines) / elapsed:>12,.0f} lignes/s  "
+          f"({elapsed:.2f} s, {matched:,} lignes tftpd reconnues)")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--lines", type=int, default=1_000_000)
+    parser.add_argument("--repeat", type=int, default=3, help="meilleur temps sur R passes")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    print(f"Génération de {args.lines:,} lignes...")
+    lines = generate(args.lines, args.seed)
+
+    t_legacy = bench("legacy", legacy, lines, args.repeat)
+    t_parser = bench("tftpd_parser", parse_line, lines, args.repeat)
+    print(f"Gain : x{t_legacy / t_parser:.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -16,12 +16,47 @@ DB_CONFIG = {
 
 SYSLOG_CONFIG = {
     "host": "your_server_rsyslog_ip",
-    "port": 514
+    "port": 514,
+    # "udp" ou "tcp" (trames RFC 6587, reconnexion automatique)
+    "protocol": "udp",
+    # "legacy" (<PRI> script_tracabilite: ...) ou "rfc5424"
+    "format": "legacy",
+    "buffer_size": 10000
 }
 
 TFTP_CONFIG = {
     "root_directory": "/srv/tftp",
-    "wait_after_close": 1
+    "wait_after_close": 1,
+    # Lecteurs : "native" (inotify via ctypes, python3-systemd) ou
+    # "inotifywait" / "journalctl" (processus externes, solution de secours)
+    "inotify_backend": "native",
+    "journal_backend": "native",
+    "journal_unit": "tftpd-hpa",
+    # Empreinte des fichiers servis dans l'index en mémoire (None, "sha256"...)
+    "file_hash": None,
+    # Association fermeture -> session tftpd : "fanotify" (PID de chaque fermeture,
+    # backend natif et CAP_SYS_ADMIN, repli sur "proc" sinon), "proc" (sessions
+    # départagées par /proc/<pid>/fd) ou "off" (requête la plus ancienne du fichier)
+    "session_tracking": "fanotify",
+    # Événements sans correspondance : durée de vie (s) et nombre maximal conservé
+    "orphan_ttl_seconds": 300,
+    "max_orphans": 50000,
+    "stats_interval_seconds": 60,
+    # Écriture DB par lots ; tampon disque si MySQL est injoignable
+    "db_batch_size": 200,
+    "db_flush_interval": 1.0,
+    "db_spool_file": "/var/lib/tftp-monitor/spool.jsonl",
+    # Lignes refusées par MySQL pour une erreur non passagère (valeur invalide),
+    # avec l'erreur : à corriger puis réinjecter en les ajoutant au tampon disque
+    "db_dead_letter_file": "/var/lib/tftp-monitor/rejected.jsonl",
+    # Curseur du journal + corrélations en cours, pour reprise après redémarrage
+    # (None pour désactiver)
+    "checkpoint_file": "/var/lib/tftp-monitor/checkpoint.json",
+    "checkpoint_interval_seconds": 5,
+    # Backfill : écart maximal (s) entre une ligne reconstruite (heure de la
+    # requête) et la ligne déjà écrite par le moniteur (heure de fermeture),
+    # soit la durée du plus long transfert attendu
+    "backfill_match_seconds": 60
 }
 
 EMAIL_CONFIG = {
@@ -29,7 +64,16 @@ EMAIL_CONFIG = {
     "smtp_port": 587,
     "sender_email": "your_email@example.com",
     "sender_password": "your_email_password",
-    "recipient_email": "admin@example.com"
+    "recipient_email": "admin@example.com",
+    # False pour un serveur SMTP local sans TLS (ex. serveur de débogage)
+    "use_tls": True,
+    # Alertes répétées (même règle, même IP) regroupées sur cette durée
+    "coalesce_window_seconds": 300,
+    # Alertes détaillées par récapitulatif (les suivantes sont seulement comptées)
+    "max_digest_bodies": 50,
+    "max_emails_per_minute": 10,
+    # Tentatives d'envoi avant abandon (délai exponentiel entre deux essais)
+    "max_attempts": 5
 }
 
 ALERT_CONFIG = {
@@ -39,13 +83,92 @@ ALERT_CONFIG = {
         "switch-core.cfg",
     ],
 
+    # Adresses ou sous-réseaux CIDR (IPv4 / IPv6)
     "authorized_ips": [
         "192.168.1.X",
         "192.168.1.Y",
     ],
 
+    # Règles supplémentaires dans des fichiers texte (une par ligne, "#" pour
+    # commenter), rechargées à chaud dès modification ou sur SIGHUP.
+    # Fichiers critiques : nom exact, glob ("*.key", "core/*.cfg") ou "re:<regex>"
+    "authorized_ips_file": None,
+    "critical_files_file": None,
+
     "max_requests_per_minute": 15,
     "time_window_seconds": 60,
+    # Même fenêtre, agrégée par sous-réseau (/24 en IPv4, /64 en IPv6)
+    "max_requests_per_subnet": 100,
+    "subnet_prefix_v4": 24,
+    "subnet_prefix_v6": 64,
+    # Nombre maximal d'IP / sous-réseaux suivis (les moins récents sont oubliés)
+    "max_tracked_ips": 100000,
+
+    # Canal temps réel tftp-monitor -> alert-monitor (socket Unix)
+    "socket_path": "/run/tftp-monitor/alerts.sock",
+    # Alertes diffusées en direct au tableau de bord (socket Unix ouverte par le dashboard)
+    "events_socket_path": "/run/tftp-monitor/dashboard.sock",
+    # Délai avant relecture de la base après une perte de messages sur le canal
+    "check_interval_seconds": 10,
+    # Relecture de sécurité de la base, même sans perte détectée
+    "resync_interval_seconds": 300,
+    # Transferts reçus retenus (2 x resync_interval_seconds) pour ne pas les
+    # réanalyser à la resynchronisation ; ~350 octets par transfert
+    "max_remembered_transfers": 500000
+}
+
+DASHBOARD_CONFIG = {
+    # Services affichés et période (s) du relevé d'état en arrière-plan
+    "services": ["tftpd-hpa", "tftp-monitor", "tftp-alert", "tftp-dashboard", "mysql", "rsyslog"],
+    "sample_interval": 2,
+    # Connexions MySQL gardées ouvertes (requêtes, flux temps réel, exports)
+    "db_pool_size": 8,
+    # Flux temps réel /api/stream : relecture des nouveaux transferts (s) et
+    # nombre d'événements gardés pour la reprise après reconnexion
+    "stream_poll_interval": 1,
+    "stream_backlog": 1000,
+    # Durée de vie (s) des réponses /api en cache, partagées par tous les écrans ;
+    # les données issues de la base sont aussi invalidées dès qu'un transfert arrive
+    "cache_ttl": {
+        "stats": 5,
+        "server": 2,
+        "services": 2,
+        "transfers": 2,
+        "hourly": 30,
+        "top-files": 60
+    }
+}
+
+ARCHIVE_CONFIG = {
+    # Archives CSV.gz des mois supprimés de la base (toujours consultables par /api/history)
+    "archive_dir": "/var/lib/tftp-monitor/archive",
+    # Mois conservés dans file_transfers, mois en cours compris
+    "retention_months": 12,
+    # Partitions créées à l'avance
+    "premake_months": 3,
+    # Agrégats par minute conservés (jours)
+    "minute_rollup_retention_days": 30
+}
+
+METRICS_CONFIG = {
+    # Adresse d'écoute de /metrics (Prometheus) pour tftp-monitor et alert-monitor ;
+    # le tableau de bord sert /metrics sur son propre port. Port None : désactivé
+    "bind": "127.0.0.1",
+    "tftp_monitor_port": 9310,
+    "alert_monitor_port": 9311
+}
 
-    "check_interval_seconds": 10
+LOG_CONFIG = {
+    # Niveau par défaut : "DEBUG" ajoute une ligne par événement (inotify, journal,
+    # syslog, analyse d'alerte), à réserver aux composants voulus via "levels"
+    "level": "INFO",
+    # Niveau par composant (étiquette en minuscules), ex. {"inotify": "DEBUG", "journal": "DEBUG"}
+    "levels": {},
+    # "text" (sortie lisible, priorité syslog reconnue par journald) ou "json" (une ligne par événement)
+    "format": "text",
+    # Lignes en attente d'écriture ; au-delà (sortie bloquée), les lignes sont perdues et comptées
+    "queue_size": 10000,
+    # Lignes par seconde et par message sous WARNING (0 : illimité), après une rafale de "burst"
+    "rate_limit": 20,
+    "burst": 100
 }
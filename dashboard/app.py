@@ -4,249 +4,422 @@ Dashboard Web Flask pour la supervision du serveur TFTP
 Version CORRIGÉE avec bug fix
 """
 
-from flask import Flask, render_template, jsonify
-from datetime import datetime, timedelta
-import mysql.connector
-import subprocess
-import psutil
+from flask import Flask, g, jsonify, render_template, request
+from datetime import date, datetime, timedelta
+import hashlib
+import os
+import sys
+import threading
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
 from config import DB_CONFIG
+from tftpmon.alert_channel import EventListener, DEFAULT_EVENTS_PATH
+from tftpmon.archive import TransferArchive
+from tftpmon import history, log
+from tftpmon.db import Database, DatabaseUnavailable
+from tftpmon.live_feed import LiveFeed
+from tftpmon.metrics import CONTENT_TYPE, Histogram, Registry
+from tftpmon.status_sampler import StatusSampler
+
+try:
+    from config import DASHBOARD_CONFIG
+except ImportError:
+    DASHBOARD_CONFIG = {}
+
+try:
+    from config import ALERT_CONFIG
+except ImportError:
+    ALERT_CONFIG = {}
+
+try:
+    from config import ARCHIVE_CONFIG
+except ImportError:
+    ARCHIVE_CONFIG = {}
+
+try:
+    from config import LOG_CONFIG
+except ImportError:
+    LOG_CONFIG = {}
+
+# Avant le démarrage des threads de fond (relevés, flux en direct)
+log.setup(LOG_CONFIG)
+logger = log.get("stream")
+# Erreurs SQL des endpoints : la réponse reste du JSON (null / liste vide)
+api_logger = log.get("api")
 
 app = Flask(__name__)
 
-
-def get_db_connection():
-    try:
-        conn = mysql.connector.connect(**DB_CONFIG)
-        return conn
-    except Exception as e:
-        print(f"[DB ERROR] ❌ {e}")
-        return None
+# Durée de vie (s) des réponses en cache, par endpoint
+CACHE_TTL = {
+    'stats': 5,
+    'server': 2,
+    'server-history': 2,
+    'services': 2,
+    'transfers': 2,
+    'hourly': 30,
+    'top-files': 60,
+    # Jeton de version des transferts (MAX(id)), vérifié au plus une fois par seconde
+    'version': 1,
+}
+CACHE_TTL.update(DASHBOARD_CONFIG.get('cache_ttl', {}))
+
+
+# ==============================
+# CACHE DES RÉPONSES
+# ==============================
+class ResponseCache:
+    """
+    Cache partagé par tous les clients : une entrée par endpoint, valable
+    `ttl` secondes et tant que le jeton de version (nouveaux transferts) ne
+    change pas. Les requêtes concurrentes sur une entrée expirée attendent le
+    premier calcul au lieu de relancer chacune les requêtes SQL.
+    """
+
+    def __init__(self):
+        self._entries = {}
+        self._inflight = {}
+        self._lock = threading.Lock()
+
+    def get(self, key, ttl, compute, version=None):
+        """Renvoie l'entrée {'data', 'body', 'etag'} de key, calculée au besoin"""
+        while True:
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry and entry['expires'] > time.monotonic() and entry['version'] == version:
+                    return entry
+                event = self._inflight.get(key)
+                leader = event is None
+                if leader:
+                    event = self._inflight[key] = threading.Event()
+
+            if not leader:
+                # Calcul en cours par une autre requête : on attend son résultat
+                event.wait(30)
+                continue
+
+            try:
+                data = compute()
+                body = app.json.dumps(data).encode()
+                entry = {
+                    'data': data,
+                    'body': body,
+                    'etag': hashlib.sha1(body).hexdigest(),
+                    'version': version,
+                    'expires': time.monotonic() + ttl,
+                }
+                with self._lock:
+                    self._entries[key] = entry
+                return entry
+            finally:
+                with self._lock:
+                    del self._inflight[key]
+                event.set()
+
+
+cache = ResponseCache()
+
+
+# Pool partagé par les requêtes HTTP, le flux temps réel et les exports
+db = Database(DB_CONFIG, pool_size=DASHBOARD_CONFIG.get('db_pool_size', 8))
+
+
+# ==============================
+# ÉTAT DU SERVEUR ET DES SERVICES
+# ==============================
+SERVICES = DASHBOARD_CONFIG.get('services', [
+    'tftpd-hpa',
+    'tftp-monitor',
+    'tftp-alert',
+    'tftp-dashboard',
+    'mysql',
+    'rsyslog'
+])
+
+# Relevé en arrière-plan : les requêtes lisent le dernier instantané en mémoire
+sampler = StatusSampler(SERVICES, DASHBOARD_CONFIG.get('sample_interval', 2)).start()
 
 
 def get_server_status():
-    try:
-        # CPU
-        cpu_percent = psutil.cpu_percent(interval=1)
-
-        # RAM
-        memory = psutil.virtual_memory()
-        ram_percent = memory.percent
-        ram_used = round(memory.used / (1024**3), 2)  # GB
-        ram_total = round(memory.total / (1024**3), 2)  # GB
-
-        # Disque
-        disk = psutil.disk_usage('/')
-        disk_percent = disk.percent
-        disk_used = round(disk.used / (1024**3), 2)  # GB
-        disk_total = round(disk.total / (1024**3), 2)  # GB
-
-        # Uptime
-        boot_time = datetime.fromtimestamp(psutil.boot_time())
-        uptime = datetime.now() - boot_time
-        uptime_str = f"{uptime.days}j {uptime.seconds//3600}h {(uptime.seconds//60)%60}m"
-
-        return {
-            'cpu_percent': cpu_percent,
-            'ram_percent': ram_percent,
-            'ram_used': ram_used,
-            'ram_total': ram_total,
-            'disk_percent': disk_percent,
-            'disk_used': disk_used,
-            'disk_total': disk_total,
-            'uptime': uptime_str
-        }
-    except Exception as e:
-        print(f"[SERVER STATUS ERROR] ❌ {e}")
-        return None
+    return sampler.server
 
 
-def get_service_status(service_name):
-    try:
-        result = subprocess.run(
-            ['systemctl', 'is-active', service_name],
-            capture_output=True,
-            text=True
-        )
-        status = result.stdout.strip()
-
-        status_result = subprocess.run(
-            ['systemctl', 'status', service_name],
-            capture_output=True,
-            text=True
-        )
-
-        pid = None
-        for line in status_result.stdout.split('\n'):
-            if 'Main PID:' in line:
-                pid = line.split('Main PID:')[1].split()[0]
-                break
-
-        return {
-            'name': service_name,
-            'status': status,
-            'active': status == 'active',
-            'pid': pid
-        }
-    except Exception as e:
-        print(f"[SERVICE STATUS ERROR] ❌ {e}")
-        return {
-            'name': service_name,
-            'status': 'unknown',
-            'active': False,
-            'pid': None
-        }
+def get_server_history():
+    """Historique court (mini-graphiques) : listes parallèles horodatage / cpu / ram / disque"""
+    history = list(sampler.history)
+    return {
+        'timestamps': [round(h[0]) for h in history],
+        'cpu_percent': [h[1] for h in history],
+        'ram_percent': [h[2] for h in history],
+        'disk_percent': [h[3] for h in history],
+    }
 
-def get_all_services_status():
-    services = [
-        'tftpd-hpa',
-        'tftp-monitor',
-        'tftp-alert',
-        'tftp-dashboard',
-        'mysql',
-        'rsyslog'
-    ]
 
-    return [get_service_status(service) for service in services]
+def get_all_services_status():
+    return sampler.services
 
 
 def get_statistics():
-    """Récupère les statistiques générales"""
-    conn = get_db_connection()
-    if not conn:
+    """
+    Récupère les statistiques générales en une requête sur les tables
+    d'agrégats (quelques lignes par jour, au lieu d'un parcours de file_transfers)
+    """
+    try:
+        row = db.fetch_one('stats', """
+            SELECT
+                COALESCE(SUM(CASE WHEN bucket = CURDATE() THEN transfers END), 0) as today_total,
+                COALESCE(SUM(CASE WHEN bucket = CURDATE() AND status = 'success'
+                                  THEN transfers END), 0) as today_success,
+                COALESCE(SUM(CASE WHEN bucket = CURDATE() AND status = 'failed'
+                                  THEN transfers END), 0) as today_failed,
+                COALESCE(SUM(transfers), 0) as total_all_time,
+                (SELECT COUNT(*) FROM client_stats_daily WHERE day = CURDATE()) as active_ips
+            FROM transfer_stats_daily
+        """)
+    except DatabaseUnavailable:
         return None
-
-    cursor = conn.cursor(dictionary=True)
-    stats = {}
-
-    # ✅ FIX: Récupération correcte du total aujourd'hui
-    cursor.execute("""
-        SELECT COUNT(*) as total
-        FROM file_transfers
-        WHERE DATE(timestamp) = CURDATE()
-    """)
-    stats['today_total'] = cursor.fetchone()['total']  # ✅ LIGNE AJOUTÉE
-
-    cursor.execute("""
-        SELECT COUNT(*) as success
-        FROM file_transfers
-        WHERE DATE(timestamp) = CURDATE() AND status = 'success'
-    """)
-    stats['today_success'] = cursor.fetchone()['success']
-
-    cursor.execute("""
-        SELECT COUNT(*) as failed
-        FROM file_transfers
-        WHERE DATE(timestamp) = CURDATE() AND status = 'failed'
-    """)
-    stats['today_failed'] = cursor.fetchone()['failed']
+    except Exception as e:
+        api_logger.error("stats : %s", e)
+        return None
+    stats = {key: int(value) for key, value in row.items()}
 
     if stats['today_total'] > 0:
         stats['success_rate'] = round((stats['today_success'] / stats['today_total']) * 100, 1)
     else:
         stats['success_rate'] = 0
 
-    cursor.execute("""
-        SELECT COUNT(DISTINCT client_ip) as active_ips
-        FROM file_transfers
-        WHERE DATE(timestamp) = CURDATE()
-    """)
-    stats['active_ips'] = cursor.fetchone()['active_ips']
-
-    cursor.execute("SELECT COUNT(*) as total FROM file_transfers")
-    stats['total_all_time'] = cursor.fetchone()['total']
+    return stats
 
-    cursor.close()
-    conn.close()
 
-    return stats
+def format_transfer(transfer):
+    """Mise en forme d'une ligne de file_transfers pour l'affichage"""
+    transfer['timestamp'] = transfer['timestamp'].strftime('%Y-%m-%d %H:%M:%S')
+    transfer['file_size'] = f"{transfer['file_size']:,}" if transfer['file_size'] else "N/A"
+    return transfer
 
 
 def get_recent_transfers(limit=20):
-    conn = get_db_connection()
-    if not conn:
+    try:
+        rows = db.fetch_all('recent_transfers', """
+            SELECT id, filename, client_ip, file_size, transfer_type, status, timestamp
+            FROM file_transfers
+            ORDER BY id DESC
+            LIMIT %s
+        """, (limit,))
+    except DatabaseUnavailable:
+        return []
+    except Exception as e:
+        api_logger.error("transfers : %s", e)
         return []
 
-    cursor = conn.cursor(dictionary=True)
-
-    cursor.execute("""
-        SELECT id, filename, client_ip, file_size, transfer_type, status, timestamp
-        FROM file_transfers
-        ORDER BY id DESC
-        LIMIT %s
-    """, (limit,))
-
-    transfers = cursor.fetchall()
-
-    for transfer in transfers:
-        transfer['timestamp'] = transfer['timestamp'].strftime('%Y-%m-%d %H:%M:%S')
-        transfer['file_size'] = f"{transfer['file_size']:,}" if transfer['file_size'] else "N/A"
-
-    cursor.close()
-    conn.close()
-
-    return transfers
+    return [format_transfer(transfer) for transfer in rows]
 
 
 def get_hourly_stats():
     """Récupère les stats par heure pour les dernières 24h"""
-    conn = get_db_connection()
-    if not conn:
+    try:
+        # 24 dernières tranches horaires, heure en cours comprise
+        return db.fetch_all('hourly', """
+            SELECT
+                HOUR(bucket) as hour,
+                SUM(transfers) as total,
+                SUM(CASE WHEN status = 'success' THEN transfers ELSE 0 END) as success,
+                SUM(CASE WHEN status = 'failed' THEN transfers ELSE 0 END) as failed,
+                SUM(CASE WHEN status = 'timeout' THEN transfers ELSE 0 END) as timeout
+            FROM transfer_stats_hourly
+            WHERE bucket >= DATE_FORMAT(NOW() - INTERVAL 23 HOUR, '%Y-%m-%d %H:00:00')
+            GROUP BY HOUR(bucket)
+            ORDER BY hour
+        """)
+    except DatabaseUnavailable:
+        return []
+    except Exception as e:
+        api_logger.error("hourly : %s", e)
         return []
-
-    cursor = conn.cursor(dictionary=True)
-
-    cursor.execute("""
-        SELECT
-            HOUR(timestamp) as hour,
-            COUNT(*) as total,
-            SUM(CASE WHEN status = 'success' THEN 1 ELSE 0 END) as success,
-            SUM(CASE WHEN status = 'failed' THEN 1 ELSE 0 END) as failed
-        FROM file_transfers
-        WHERE timestamp >= NOW() - INTERVAL 24 HOUR
-        GROUP BY HOUR(timestamp)
-        ORDER BY hour
-    """)
-
-    stats = cursor.fetchall()
-
-    cursor.close()
-    conn.close()
-
-    return stats
 
 
 def get_top_files(limit=5):
     """Récupère les fichiers les plus transférés"""
-    conn = get_db_connection()
-    if not conn:
+    try:
+        # Compteurs cumulés par fichier, lus dans l'index idx_transfers
+        return db.fetch_all('top_files', """
+            SELECT filename, transfers as count
+            FROM file_stats_total
+            ORDER BY transfers DESC
+            LIMIT %s
+        """, (limit,))
+    except DatabaseUnavailable:
+        return []
+    except Exception as e:
+        api_logger.error("top-files : %s", e)
         return []
 
-    cursor = conn.cursor(dictionary=True)
-
-    cursor.execute("""
-        SELECT filename, COUNT(*) as count
-        FROM file_transfers
-        GROUP BY filename
-        ORDER BY count DESC
-        LIMIT %s
-    """, (limit,))
-
-    files = cursor.fetchall()
 
-    cursor.close()
-    conn.close()
+# Requêtes exécutées chaque seconde : préparées une fois par connexion du pool
+MAX_ID_SQL = "SELECT MAX(id) as max_id FROM file_transfers"
+NEW_TRANSFERS_SQL = """
+    SELECT id, filename, client_ip, file_size, transfer_type, status, timestamp
+    FROM file_transfers
+    WHERE id > %s
+    ORDER BY id
+    LIMIT %s
+"""
 
-    return files
 
+def transfers_version():
+    """Dernier ID de file_transfers : change dès qu'un transfert est inséré"""
+    def compute():
+        try:
+            return db.fetch_one('max_id', MAX_ID_SQL, prepared=True)['max_id']
+        except DatabaseUnavailable:
+            return None
+        except Exception as e:
+            api_logger.error("version : %s", e)
+            return None
+
+    return cache.get('version', CACHE_TTL['version'], compute)['data']
+
+
+# Endpoint -> (fonction de calcul, dépend des transferts en base)
+SOURCES = {
+    'stats': (get_statistics, True),
+    'server': (get_server_status, False),
+    'server-history': (get_server_history, False),
+    'services': (get_all_services_status, False),
+    'transfers': (lambda: get_recent_transfers(50), True),
+    'hourly': (get_hourly_stats, True),
+    'top-files': (get_top_files, True),
+}
+
+
+def cached(key):
+    compute, versioned = SOURCES[key]
+    version = transfers_version() if versioned else None
+    return cache.get(key, CACHE_TTL[key], compute, version)
+
+
+def cached_response(key):
+    """Réponse JSON depuis le cache, avec ETag (304 si le client a déjà ce contenu)"""
+    entry = cached(key)
+    response = app.response_class(entry['body'], mimetype='application/json')
+    response.set_etag(entry['etag'])
+    # Le navigateur garde la réponse mais revalide à chaque rafraîchissement
+    response.headers['Cache-Control'] = 'no-cache'
+    return response.make_conditional(request)
+
+
+# ==============================
+# FLUX TEMPS RÉEL (SSE)
+# ==============================
+STREAM_POLL_INTERVAL = DASHBOARD_CONFIG.get('stream_poll_interval', 1)
+STREAM_BATCH = 500
+
+feed = LiveFeed(DASHBOARD_CONFIG.get('stream_backlog', 1000))
+
+
+class StreamProducer:
+    """
+    Source unique du flux : relit file_transfers par ID croissant (clé
+    primaire) toutes les STREAM_POLL_INTERVAL secondes, en déduit les
+    variations des statistiques et relaie les relevés de l'échantillonneur.
+    Une requête par intervalle, quel que soit le nombre de navigateurs connectés.
+    """
+
+    def __init__(self):
+        self.last_id = None
+        self.server = None
+        self.services = None
+        # IP vues aujourd'hui (compteur "IPs actives")
+        self.day = None
+        self.today_ips = set()
+
+    def _load_today_ips(self, today):
+        rows = db.fetch_all('today_ips',
+                            "SELECT client_ip FROM client_stats_daily WHERE day = %s", (today,))
+        self.today_ips = {row['client_ip'] for row in rows}
+        self.day = today
+
+    def poll_transfers(self):
+        today = date.today()
+        if self.last_id is None:
+            self.last_id = db.fetch_one('max_id', MAX_ID_SQL, prepared=True)['max_id'] or 0
+            self._load_today_ips(today)
+            return
+        if self.day != today:
+            # Minuit : les compteurs du jour repartent de zéro, les navigateurs rechargent tout
+            self._load_today_ips(today)
+            feed.publish('resync', {})
+        rows = db.fetch_all('stream_poll', NEW_TRANSFERS_SQL, (self.last_id, STREAM_BATCH),
+                            prepared=True)
+        if not rows:
+            return
+        self.last_id = rows[-1]['id']
+
+        feed.publish('stats', self.stats_delta(rows, datetime.now()))
+        feed.publish('transfers', [format_transfer(row) for row in rows])
+
+    def stats_delta(self, rows, now):
+        """Variations des compteurs de get_statistics et du graphique horaire"""
+        delta = {'today_total': 0, 'today_success': 0, 'today_failed': 0,
+                 'total_all_time': len(rows), 'active_ips': 0, 'hourly': {}}
+        since = now - timedelta(hours=24)
+        for row in rows:
+            ts = row['timestamp']
+            if ts.date() == self.day:
+                delta['today_total'] += 1
+                if row['status'] == 'success':
+                    delta['today_success'] += 1
+                elif row['status'] == 'failed':
+                    delta['today_failed'] += 1
+                if row['client_ip'] not in self.today_ips:
+                    self.today_ips.add(row['client_ip'])
+                    delta['active_ips'] += 1
+            if ts > since:
+                # Mêmes colonnes que get_hourly_stats (total : tous statuts)
+                hour = delta['hourly'].setdefault(
+                    ts.hour, {'total': 0, 'success': 0, 'failed': 0, 'timeout': 0})
+                hour['total'] += 1
+                hour[row['status']] += 1
+        return delta
+
+    def poll_sampler(self):
+        server, services = sampler.server, sampler.services
+        if server is not None and server is not self.server:
+            feed.publish('server', server)
+        if services != self.services:
+            feed.publish('services', services)
+        self.server, self.services = server, services
+
+    def run(self):
+        while True:
+            try:
+                self.poll_sampler()
+                self.poll_transfers()
+            except DatabaseUnavailable:
+                pass
+            except Exception as e:
+                logger.error("%s", e)
+            time.sleep(STREAM_POLL_INTERVAL)
+
+
+threading.Thread(target=StreamProducer().run, daemon=True, name="live-feed").start()
+
+# Alertes levées par alert-monitor, relayées telles quelles aux navigateurs
+try:
+    EventListener(ALERT_CONFIG.get('events_socket_path', DEFAULT_EVENTS_PATH),
+                  lambda event: feed.publish('alert', event))
+except OSError as e:
+    logger.warning("Alertes en direct indisponibles : %s", e)
 
 
 @app.route('/')
 def index():
     """Page principale du dashboard"""
-    stats = get_statistics()
-    transfers = get_recent_transfers(20)
-    server_status = get_server_status()
-    services_status = get_all_services_status()
+    stats = cached('stats')['data']
+    transfers = cached('transfers')['data'][:20]
+    server_status = cached('server')['data']
+    services_status = cached('services')['data']
 
     return render_template('dashboard.html',
                          stats=stats,
@@ -257,34 +430,152 @@ def index():
 @app.route('/api/stats')
 def api_stats():
     """API JSON pour les statistiques"""
-    return jsonify(get_statistics())
+    return cached_response('stats')
 
 @app.route('/api/server')
 def api_server():
     """API JSON pour le statut du serveur"""
-    return jsonify(get_server_status())
+    return cached_response('server')
+
+@app.route('/api/server/history')
+def api_server_history():
+    """API JSON pour l'historique CPU / RAM / disque (mini-graphiques)"""
+    return cached_response('server-history')
 
 @app.route('/api/services')
 def api_services():
     """API JSON pour le statut des services"""
-    return jsonify(get_all_services_status())
+    return cached_response('services')
 
 @app.route('/api/transfers')
 def api_transfers():
     """API JSON pour les derniers transferts"""
-    return jsonify(get_recent_transfers(50))
+    return cached_response('transfers')
 
 @app.route('/api/hourly')
 def api_hourly():
     """API JSON pour les stats horaires"""
-    return jsonify(get_hourly_stats())
+    return cached_response('hourly')
 
 @app.route('/api/top-files')
 def api_top_files():
     """API JSON pour les fichiers les plus transférés"""
-    return jsonify(get_top_files())
+    return cached_response('top-files')
+
+@app.route('/api/stream')
+def api_stream():
+    """Flux SSE : nouveaux transferts, variations des statistiques, alertes, état du serveur"""
+    last_id = request.headers.get('Last-Event-ID', type=int)
+    response = app.response_class(feed.stream(last_id), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    # Pas de mise en tampon par un proxy nginx placé devant le dashboard
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+
+# ==============================
+# RECHERCHE DANS L'HISTORIQUE
+# ==============================
+# Mois archivés hors de la base par scripts/partition-maintenance.py
+archive = TransferArchive(ARCHIVE_CONFIG.get('archive_dir', '/var/lib/tftp-monitor/archive'))
+
+EXPORT_FORMATS = {
+    'csv': ('text/csv', history.csv_lines),
+    'ndjson': ('application/x-ndjson', history.ndjson_lines),
+}
+
+
+@app.route('/api/history')
+def api_history():
+    """
+    Recherche paginée : ?since=&until=&ip=&filename=&filename_prefix=&type=&status=
+    &limit=&cursor= ; la réponse donne next_cursor pour la page suivante
+    """
+    try:
+        filters = history.parse_filters(request.args)
+        before_id, limit = history.parse_page(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    try:
+        with db.cursor('history_search', dictionary=True) as cursor:
+            rows, next_cursor = history.search(cursor, filters, before_id, limit, archive)
+    except DatabaseUnavailable:
+        return jsonify({'error': 'base de données indisponible'}), 503
+
+    return jsonify({
+        'transfers': [history.as_json(row) for row in rows],
+        'next_cursor': next_cursor,
+    })
+
+
+@app.route('/api/history/export')
+def api_history_export():
+    """Export complet d'une recherche (?format=csv|ndjson), envoyé au fil de la lecture"""
+    export_format = request.args.get('format', 'csv')
+    if export_format not in EXPORT_FORMATS:
+        return jsonify({'error': f"format inconnu '{export_format}' (csv, ndjson)"}), 400
+    try:
+        filters = history.parse_filters(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    if not db.available():
+        return jsonify({'error': 'base de données indisponible'}), 503
+    mimetype, encode = EXPORT_FORMATS[export_format]
+
+    def generate():
+        # Une connexion du pool par lot, rendue avant l'envoi : un client lent
+        # n'immobilise pas le pool pendant tout le téléchargement
+        yield from encode(history.iter_rows(
+            lambda: db.cursor('history_export', dictionary=True), filters, archive=archive))
+
+    response = app.response_class(generate(), mimetype=mimetype)
+    filename = f"transfers-{datetime.now().strftime('%Y%m%d-%H%M%S')}.{export_format}"
+    response.headers['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
+# ==============================
+# MÉTRIQUES (PROMETHEUS)
+# ==============================
+# Durée de traitement par endpoint ; pour les flux (SSE, exports) : jusqu'à l'envoi des en-têtes
+http_latency = Histogram(label_names=('endpoint', 'status'))
+
+registry = Registry()
+registry.histogram('tftpmon_http_request_seconds', "Durée des requêtes HTTP du tableau de bord",
+                   http_latency)
+registry.database(db)
+registry.gauge('tftpmon_stream_listeners', "Navigateurs connectés au flux /api/stream",
+               lambda: feed.listeners)
+registry.counter('tftpmon_stream_events_total', "Événements publiés sur le flux, resynchronisations",
+                 lambda: dict(feed.counters), ('event',))
+registry.counter('tftpmon_log_records_total',
+                 "Lignes de journal écrites, omises (limitation de débit), perdues (file pleine)",
+                 lambda: dict(log.counters), ('outcome',))
+
+
+@app.before_request
+def start_timer():
+    g.started = time.perf_counter()
+
+
+@app.after_request
+def record_latency(response):
+    started = g.get('started')
+    if started is not None:
+        http_latency.observe(time.perf_counter() - started,
+                             request.endpoint or 'inconnu', response.status_code)
+    return response
+
+
+@app.route('/metrics')
+def metrics():
+    """Métriques au format texte Prometheus"""
+    return app.response_class(registry.render(), content_type=CONTENT_TYPE)
 
 
 if __name__ == '__main__':
-    print("🌐 Démarrage du dashboard web...")
-    app.run(host='0.0.0.0', port=5000, debug=False)
\ No newline at end of file
+    log.get("dashboard").info("🌐 Démarrage du dashboard web...")
+    # threaded : chaque flux SSE ouvert occupe un thread
+    app.run(host='0.0.0.0', port=5000, debug=False, threaded=True)
\ No newline at end of file
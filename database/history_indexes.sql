@@ -0,0 +1,13 @@
+-- Ajoute la colonne client_ip_bin et les index de recherche de l'historique
+-- (/api/history) à une base créée avant leur ajout dans shema.sql.
+-- La table est recopiée : sur un gros historique, prévoir une fenêtre de
+-- maintenance (ou un outil de migration en ligne) :
+--   mysql tftp_logs < database/history_indexes.sql
+
+USE tftp_logs;
+
+ALTER TABLE file_transfers
+    ADD COLUMN client_ip_bin VARBINARY(16) AS (INET6_ATON(client_ip)) STORED,
+    ADD INDEX idx_filename_id (filename, id),
+    ADD INDEX idx_client_bin_id (client_ip_bin, id),
+    ADD INDEX idx_status_timestamp (status, timestamp);
@@ -0,0 +1,46 @@
+-- Recalcule les tables d'agrégats à partir de l'historique de file_transfers.
+-- À exécuter une fois après la création des tables (installation existante),
+-- ou après une correction manuelle de file_transfers, tftp-monitor arrêté :
+--   mysql tftp_logs < database/rollups_rebuild.sql
+
+USE tftp_logs;
+
+TRUNCATE TABLE transfer_stats_minute;
+TRUNCATE TABLE transfer_stats_hourly;
+TRUNCATE TABLE transfer_stats_daily;
+TRUNCATE TABLE client_stats_daily;
+TRUNCATE TABLE file_stats_daily;
+TRUNCATE TABLE file_stats_total;
+
+INSERT INTO transfer_stats_minute (bucket, transfer_type, status, transfers, bytes)
+SELECT DATE_FORMAT(timestamp, '%Y-%m-%d %H:%i:00'), transfer_type, status,
+       COUNT(*), COALESCE(SUM(file_size), 0)
+FROM file_transfers
+GROUP BY 1, transfer_type, status;
+
+INSERT INTO transfer_stats_hourly (bucket, transfer_type, status, transfers, bytes)
+SELECT bucket - INTERVAL MINUTE(bucket) MINUTE, transfer_type, status,
+       SUM(transfers), SUM(bytes)
+FROM transfer_stats_minute
+GROUP BY 1, transfer_type, status;
+
+INSERT INTO transfer_stats_daily (bucket, transfer_type, status, transfers, bytes)
+SELECT DATE(bucket), transfer_type, status, SUM(transfers), SUM(bytes)
+FROM transfer_stats_hourly
+GROUP BY 1, transfer_type, status;
+
+INSERT INTO client_stats_daily (day, client_ip, transfers, success, failed, last_seen)
+SELECT DATE(timestamp), client_ip, COUNT(*),
+       SUM(status = 'success'), SUM(status = 'failed'), MAX(timestamp)
+FROM file_transfers
+GROUP BY 1, client_ip;
+
+INSERT INTO file_stats_daily (day, filename, transfers, bytes)
+SELECT DATE(timestamp), filename, COUNT(*), COALESCE(SUM(file_size), 0)
+FROM file_transfers
+GROUP BY 1, filename;
+
+INSERT INTO file_stats_total (filename, transfers, bytes, last_seen)
+SELECT filename, COUNT(*), COALESCE(SUM(file_size), 0), MAX(timestamp)
+FROM file_transfers
+GROUP BY filename;
@@ -2,14 +2,91 @@ CREATE DATABASE tftp_logs;
 
 USE tftp_logs;
 CREATE TABLE file_transfers (
-    id INT AUTO_INCREMENT PRIMARY KEY,
+    id INT AUTO_INCREMENT,
     filename VARCHAR(255) NOT NULL,
     client_ip VARCHAR(45) NOT NULL,
     file_size BIGINT,
     transfer_type ENUM('upload', 'download') NOT NULL,
-    timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
-    status VARCHAR(50) ENUM('success', 'failed') NOT NULL,
+    timestamp DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    status ENUM('success', 'failed', 'timeout') NOT NULL,
+    -- Forme binaire de client_ip (4 ou 16 octets) : filtres par sous-réseau CIDR
+    client_ip_bin VARBINARY(16) AS (INET6_ATON(client_ip)) STORED,
     
     INDEX idx_timestamp (timestamp),
-    INDEX idx_client (client_ip)
+    INDEX idx_client (client_ip),
+    -- Recherche dans l'historique (tftpmon/history.py), pagination par ID décroissant
+    INDEX idx_filename_id (filename, id),
+    INDEX idx_client_bin_id (client_ip_bin, id),
+    INDEX idx_status_timestamp (status, timestamp),
+
+    -- La colonne de partitionnement doit faire partie de la clé primaire
+    PRIMARY KEY (id, timestamp)
+)
+-- Une partition par mois (pAAAAMM), créées à l'avance et archivées puis
+-- supprimées après la rétention par scripts/partition-maintenance.py
+PARTITION BY RANGE COLUMNS(timestamp) (
+    PARTITION pmax VALUES LESS THAN (MAXVALUE)
+);
+
+
+-- ==============================
+-- AGRÉGATS (tenus à jour à l'insertion par tftp-monitor, cf. tftpmon/rollups.py)
+-- ==============================
+CREATE TABLE transfer_stats_minute (
+    bucket DATETIME NOT NULL,
+    transfer_type ENUM('upload', 'download') NOT NULL,
+    status ENUM('success', 'failed', 'timeout') NOT NULL,
+    transfers INT UNSIGNED NOT NULL DEFAULT 0,
+    bytes BIGINT UNSIGNED NOT NULL DEFAULT 0,
+
+    PRIMARY KEY (bucket, transfer_type, status)
+);
+
+CREATE TABLE transfer_stats_hourly (
+    bucket DATETIME NOT NULL,
+    transfer_type ENUM('upload', 'download') NOT NULL,
+    status ENUM('success', 'failed', 'timeout') NOT NULL,
+    transfers INT UNSIGNED NOT NULL DEFAULT 0,
+    bytes BIGINT UNSIGNED NOT NULL DEFAULT 0,
+
+    PRIMARY KEY (bucket, transfer_type, status)
+);
+
+CREATE TABLE transfer_stats_daily (
+    bucket DATE NOT NULL,
+    transfer_type ENUM('upload', 'download') NOT NULL,
+    status ENUM('success', 'failed', 'timeout') NOT NULL,
+    transfers INT UNSIGNED NOT NULL DEFAULT 0,
+    bytes BIGINT UNSIGNED NOT NULL DEFAULT 0,
+
+    PRIMARY KEY (bucket, transfer_type, status)
+);
+
+CREATE TABLE client_stats_daily (
+    day DATE NOT NULL,
+    client_ip VARCHAR(45) NOT NULL,
+    transfers INT UNSIGNED NOT NULL DEFAULT 0,
+    success INT UNSIGNED NOT NULL DEFAULT 0,
+    failed INT UNSIGNED NOT NULL DEFAULT 0,
+    last_seen DATETIME,
+
+    PRIMARY KEY (day, client_ip)
+);
+
+CREATE TABLE file_stats_daily (
+    day DATE NOT NULL,
+    filename VARCHAR(255) NOT NULL,
+    transfers INT UNSIGNED NOT NULL DEFAULT 0,
+    bytes BIGINT UNSIGNED NOT NULL DEFAULT 0,
+
+    PRIMARY KEY (day, filename)
+);
+
+CREATE TABLE file_stats_total (
+    filename VARCHAR(255) NOT NULL PRIMARY KEY,
+    transfers INT UNSIGNED NOT NULL DEFAULT 0,
+    bytes BIGINT UNSIGNED NOT NULL DEFAULT 0,
+    last_seen DATETIME,
+
+    INDEX idx_transfers (transfers)
 );
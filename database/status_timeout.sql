@@ -0,0 +1,19 @@
+-- Ajoute le statut 'timeout' (requête RRQ/WRQ sans fermeture, expirée par le
+-- moteur de corrélation) à une base créée avant son ajout dans shema.sql.
+-- Sans cette migration, les lignes 'timeout' sont rejetées ("Data truncated
+-- for column 'status'"). Valeur ajoutée en fin d'ENUM : modification des
+-- métadonnées seulement, sans recopie de la table :
+--   mysql tftp_logs < database/status_timeout.sql
+
+USE tftp_logs;
+
+ALTER TABLE file_transfers
+    MODIFY status ENUM('success', 'failed', 'timeout') NOT NULL;
+
+-- Tables d'agrégats (cf. rollups_rebuild.sql), si elles existent déjà
+ALTER TABLE transfer_stats_minute
+    MODIFY status ENUM('success', 'failed', 'timeout') NOT NULL;
+ALTER TABLE transfer_stats_hourly
+    MODIFY status ENUM('success', 'failed', 'timeout') NOT NULL;
+ALTER TABLE transfer_stats_daily
+    MODIFY status ENUM('success', 'failed', 'timeout') NOT NULL;
@@ -1,210 +1,386 @@
 #!/usr/bin/env python3
+import os
+import signal
+import sys
 import time
-import smtplib
-import mysql.connector
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
-from datetime import datetime, timedelta
-from collections import defaultdict
+from datetime import datetime
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from config import DB_CONFIG, EMAIL_CONFIG, ALERT_CONFIG
+from tftpmon import log
+from tftpmon.alert_channel import (AlertSubscriber, EventPublisher, DEFAULT_SOCKET_PATH,
+                                   DEFAULT_EVENTS_PATH)
+from tftpmon.db import Database, DatabaseUnavailable
+from tftpmon.email_dispatcher import EmailDispatcher
+from tftpmon.metrics import Registry, serve as serve_metrics
+from tftpmon.rate_limiter import RateLimiter, subnet_of
+from tftpmon.rules import RuleEngine
+
+try:
+    from config import METRICS_CONFIG
+except ImportError:
+    METRICS_CONFIG = {}
+
+try:
+    from config import LOG_CONFIG
+except ImportError:
+    LOG_CONFIG = {}
+
+# Avant le chargement des règles, qui signale les entrées invalides
+log.setup(LOG_CONFIG)
+
+SOCKET_PATH = ALERT_CONFIG.get("socket_path", DEFAULT_SOCKET_PATH)
+# Alertes diffusées en direct au tableau de bord
+EVENTS_PATH = ALERT_CONFIG.get("events_socket_path", DEFAULT_EVENTS_PATH)
+# Délai avant resynchronisation sur la base après une perte de messages
+# (laisse au moniteur le temps d'insérer les lignes manquantes)
+RESYNC_DELAY = ALERT_CONFIG.get("check_interval_seconds", 10)
+# Resynchronisation de sécurité, même sans perte détectée
+RESYNC_INTERVAL = ALERT_CONFIG.get("resync_interval_seconds", 300)
+# Transferts reçus retenus pour la resynchronisation : deux intervalles (une
+# ligne insérée juste après une resynchronisation est lue à la suivante)
+RESYNC_RETENTION = 2 * RESYNC_INTERVAL
+MAX_REMEMBERED_TRANSFERS = ALERT_CONFIG.get("max_remembered_transfers", 500000)
+# Agrégation par sous-réseau (balayage depuis de nombreuses adresses voisines)
+SUBNET_PREFIX_V4 = ALERT_CONFIG.get("subnet_prefix_v4", 24)
+SUBNET_PREFIX_V6 = ALERT_CONFIG.get("subnet_prefix_v6", 64)
+MAX_REQUESTS_PER_SUBNET = ALERT_CONFIG.get("max_requests_per_subnet", 100)
+MAX_TRACKED_IPS = ALERT_CONFIG.get("max_tracked_ips", 100000)
+METRICS_BIND = METRICS_CONFIG.get("bind", "127.0.0.1")
+METRICS_PORT = METRICS_CONFIG.get("alert_monitor_port", 9311)
 
 last_checked_id = 0
-request_tracker = defaultdict(list)
-
-def connecter_db():
-    try:
-        conn = mysql.connector.connect(**DB_CONFIG)
-        return conn
-    except Exception as e:
-        print(f"[DB CONNECTION ERROR] ❌ {e}")
-        return None
-
-def envoyer_email(sujet, corps):
-    """Envoie une alerte par email"""
-    try:
-        msg = MIMEMultipart()
-        msg['From'] = EMAIL_CONFIG["sender_email"]
-        msg['To'] = EMAIL_CONFIG["recipient_email"]
-        msg['Subject'] = sujet
-
-        msg.attach(MIMEText(corps, 'plain'))
-
-        server = smtplib.SMTP(EMAIL_CONFIG["smtp_server"], EMAIL_CONFIG["smtp_port"])
-        server.starttls()
-        server.login(EMAIL_CONFIG["sender_email"], EMAIL_CONFIG["sender_password"])
-
-        server.send_message(msg)
-        server.quit()
-
-        print(f"[EMAIL] ✅ Alerte envoyée : {sujet}")
-    except Exception as e:
-        print(f"[EMAIL ERROR] ❌ {e}")
+# Liste blanche et fichiers critiques : config.py + fichiers de règles (rechargés à chaud)
+rules = RuleEngine(
+    ALERT_CONFIG["authorized_ips"],
+    ALERT_CONFIG["critical_files"],
+    ALERT_CONFIG.get("authorized_ips_file"),
+    ALERT_CONFIG.get("critical_files_file")
+)
+ip_limiter = RateLimiter(ALERT_CONFIG["time_window_seconds"],
+                         ALERT_CONFIG["max_requests_per_minute"], MAX_TRACKED_IPS)
+subnet_limiter = RateLimiter(ALERT_CONFIG["time_window_seconds"],
+                             MAX_REQUESTS_PER_SUBNET, MAX_TRACKED_IPS)
+dispatcher = EmailDispatcher(
+    EMAIL_CONFIG,
+    coalesce_window=EMAIL_CONFIG.get("coalesce_window_seconds", 300),
+    max_per_minute=EMAIL_CONFIG.get("max_emails_per_minute", 10),
+    max_attempts=EMAIL_CONFIG.get("max_attempts", 5),
+    max_digest_bodies=EMAIL_CONFIG.get("max_digest_bodies", 50)
+)
+events = EventPublisher(EVENTS_PATH)
+# La base n'est lue qu'aux resynchronisations : une connexion suffit
+db = Database(DB_CONFIG, pool_size=1)
+
+logger = log.get("alert")
+anomaly_log = log.get("anomalie")
+# Une ligne par transfert analysé : DEBUG (LOG_CONFIG["levels"])
+check_log = log.get("check")
+
+# Transferts analysés par origine et alertes levées par règle (/metrics)
+analyzed = {"realtime": 0, "resync": 0}
+alerts_raised = {}
+
+# Requête préparée une fois par connexion (même chaîne à chaque appel)
+RESYNC_SQL = """
+    SELECT id, filename, client_ip, timestamp
+    FROM file_transfers
+    WHERE id > %s
+    ORDER BY id ASC
+"""
+
+def envoyer_email(sujet, corps, cle=None):
+    """
+    Dépose une alerte pour le thread d'envoi (la détection n'attend pas le SMTP) ;
+    les alertes de même clé (règle, IP) sont regroupées en un récapitulatif.
+    Chaque alerte est aussi diffusée au tableau de bord, sans regroupement.
+    """
+    dispatcher.send(sujet, corps, cle)
+    log.get("email").info("Alerte en file : %s", sujet)
+    rule = cle[0] if cle else "autre"
+    alerts_raised[rule] = alerts_raised.get(rule, 0) + 1
+    events.publish({
+        "rule": cle[0] if cle else None,
+        "key": list(cle[1:]) if cle else [],
+        "subject": sujet,
+        "body": corps,
+        "timestamp": time.time(),
+    })
 
 # ==============================
 # DÉTECTION D'ANOMALIES
 # ==============================
+def ligne_id_transfert(transfer_id):
+    """
+    Ligne "ID transfert" d'une alerte (ID de file_transfers) ; absente pour un
+    transfert reçu en temps réel, dont la ligne n'est pas encore insérée
+    """
+    return f"ID transfert : {transfer_id}\n" if transfer_id is not None else ""
+
 def verifier_ip_non_autorisee(client_ip, filename, transfer_id):
-    """Vérifie si l'IP est dans la liste blanche"""
-    if client_ip not in ALERT_CONFIG["authorized_ips"]:
+    """Vérifie si l'IP appartient à un réseau de la liste blanche"""
+    if not rules.is_authorized(client_ip):
         message = (
             f" ALERTE : IP NON AUTORISÉE\n"
             f"IP source : {client_ip}\n"
             f"Fichier : {filename}\n"
-            f"ID transfert : {transfer_id}\n"
+            f"{ligne_id_transfert(transfer_id)}"
             f"Date : {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}"
         )
 
-        print(f"\n[ANOMALIE] ⚠️ IP non autorisée détectée : {client_ip}\n")
+        anomaly_log.warning("IP non autorisée détectée : %s", client_ip,
+                            extra={"rule": "ip_non_autorisee", "client_ip": client_ip,
+                                   "file": filename})
 
         envoyer_email(
             f" ALERTE SÉCURITÉ - IP Non Autorisée : {client_ip}",
-            message
+            message,
+            ("ip_non_autorisee", client_ip)
         )
 
         return True
     return False
 
 def verifier_fichier_critique(filename, client_ip, transfer_id):
-    """Vérifie si un fichier critique a été accédé"""
-    if filename in ALERT_CONFIG["critical_files"]:
+    """Vérifie si un fichier critique (nom, glob ou regex) a été accédé"""
+    rule = rules.critical_match(filename)
+    if rule is not None:
         message = (
             f"⚠ ALERTE : ACCÈS À UN FICHIER CRITIQUE\n"
             f"Fichier : {filename}\n"
+            f"Règle : {rule}\n"
             f"IP source : {client_ip}\n"
-            f"ID transfert : {transfer_id}\n"
+            f"{ligne_id_transfert(transfer_id)}"
             f"Date : {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}"
         )
 
-        print(f"\n[ANOMALIE]  Fichier critique accédé : {filename} par {client_ip}\n")
+        anomaly_log.warning("Fichier critique accédé : %s par %s", filename, client_ip,
+                            extra={"rule": "fichier_critique", "client_ip": client_ip,
+                                   "file": filename})
 
         envoyer_email(
             f"⚠️ALERTE - Accès Fichier Critique : {filename}",
-            message
+            message,
+            ("fichier_critique", filename, client_ip)
         )
 
         return True
     return False
 
 def verifier_rate_limit(client_ip, filename, transfer_id, timestamp):
-    """Vérifie si une IP fait trop de requêtes dans un court laps de temps"""
-    global request_tracker
-
-    now = datetime.now()
-    time_window = timedelta(seconds=ALERT_CONFIG["time_window_seconds"])
-
-    # Ajouter la requête actuelle
-    request_tracker[client_ip].append(timestamp)
-
-    # Nettoyer les anciennes requêtes (hors de la fenêtre de temps)
-    request_tracker[client_ip] = [
-        ts for ts in request_tracker[client_ip]
-        if now - ts < time_window
-    ]
-
-    # Compter les requêtes dans la fenêtre
-    count = len(request_tracker[client_ip])
-
-    if count > ALERT_CONFIG["max_requests_per_minute"]:
+    """
+    Vérifie si une IP (ou son sous-réseau) fait trop de requêtes dans la fenêtre ;
+    la fenêtre est mesurée sur l'heure des transferts, pas sur l'heure courante
+    """
+    ts = timestamp.timestamp()
+    window = ALERT_CONFIG["time_window_seconds"]
+    detected = False
+
+    count = ip_limiter.hit(client_ip, ts)
+    if count:
         message = (
             f" ALERTE : TROP DE REQUÊTES\n"
             f"IP source : {client_ip}\n"
-            f"Nombre de requêtes : {count} requêtes en {ALERT_CONFIG['time_window_seconds']} secondes\n"
+            f"Nombre de requêtes : {count} requêtes en {window} secondes\n"
             f"Seuil autorisé : {ALERT_CONFIG['max_requests_per_minute']} requêtes/minute\n"
             f"Dernier fichier accédé : {filename}\n"
-            f"ID transfert : {transfer_id}\n"
-            f"Date : {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}"
+            f"{ligne_id_transfert(transfer_id)}"
+            f"Date : {timestamp.strftime('%Y-%m-%d %H:%M:%S')}"
         )
 
-        print(f"\n[ANOMALIE]  Trop de requêtes détectées depuis {client_ip} : {count} requêtes\n")
+        anomaly_log.warning("Trop de requêtes détectées depuis %s : %s requêtes", client_ip, count,
+                            extra={"rule": "rate_limit", "client_ip": client_ip,
+                                   "count": count})
 
         envoyer_email(
             f" ALERTE - Rate Limit Dépassé : {client_ip}",
-            message
+            message,
+            ("rate_limit", client_ip)
+        )
+        detected = True
+
+    subnet = subnet_of(client_ip, SUBNET_PREFIX_V4, SUBNET_PREFIX_V6)
+    count = subnet_limiter.hit(subnet, ts)
+    if count:
+        message = (
+            f" ALERTE : TROP DE REQUÊTES DEPUIS UN SOUS-RÉSEAU\n"
+            f"Sous-réseau : {subnet}\n"
+            f"Nombre de requêtes : {count} requêtes en {window} secondes\n"
+            f"Seuil autorisé : {MAX_REQUESTS_PER_SUBNET} requêtes/minute\n"
+            f"Dernière IP : {client_ip} | Dernier fichier accédé : {filename}\n"
+            f"{ligne_id_transfert(transfer_id)}"
+            f"Date : {timestamp.strftime('%Y-%m-%d %H:%M:%S')}"
         )
 
-        # Réinitialiser le compteur pour éviter le spam d'alertes
-        request_tracker[client_ip] = []
+        anomaly_log.warning("Trop de requêtes détectées depuis %s : %s requêtes", subnet, count,
+                            extra={"rule": "rate_limit_subnet", "subnet": subnet,
+                                   "count": count})
 
-        return True
+        envoyer_email(
+            f" ALERTE - Rate Limit Sous-réseau Dépassé : {subnet}",
+            message,
+            ("rate_limit_subnet", subnet)
+        )
+        detected = True
 
-    return False
+    return detected
+
+# ==============================
+# MÉTRIQUES
+# ==============================
+def exposer_metriques(subscriber):
+    """Sert /metrics : détection, canal temps réel, envoi SMTP et base"""
+    registry = Registry()
+    registry.counter("tftpmon_alert_transfers_analyzed_total",
+                     "Transferts analysés (canal temps réel, resynchronisation sur la base)",
+                     lambda: dict(analyzed), ("source",))
+    registry.counter("tftpmon_alerts_total", "Alertes levées par règle",
+                     lambda: dict(alerts_raised), ("rule",))
+    registry.counter("tftpmon_alert_channel_events_total",
+                     "Messages reçus du moniteur TFTP, pertes détectées, "
+                     "transferts oubliés avant la resynchronisation",
+                     lambda: dict(subscriber.counters), ("event",))
+    registry.gauge("tftpmon_queue_depth", "Éléments en file",
+                   lambda: {"alert_channel": subscriber.queue_depth(),
+                            "email": dispatcher.queue_depth()}, ("queue",))
+    registry.counter("tftpmon_email_events_total",
+                     "E-mails envoyés, regroupés, retentés, abandonnés ; sessions SMTP ouvertes",
+                     lambda: dict(dispatcher.counters), ("event",))
+    registry.histogram("tftpmon_smtp_send_seconds", "Envoi d'un e-mail d'alerte",
+                       dispatcher.latency)
+    registry.counter("tftpmon_dashboard_events_total",
+                     "Alertes diffusées au tableau de bord, non remises",
+                     lambda: dict(events.counters), ("outcome",))
+    registry.database(db)
+    registry.counter("tftpmon_log_records_total",
+                     "Lignes de journal écrites, omises (limitation de débit), perdues (file pleine)",
+                     lambda: dict(log.counters), ("outcome",))
+
+    serve_metrics(registry, METRICS_PORT, METRICS_BIND)
+    logger.info("Métriques : http://%s:%s/metrics", METRICS_BIND, METRICS_PORT)
 
 # ==============================
 # BOUCLE PRINCIPALE
 # ==============================
+def analyser_transfert(transfer_id, filename, client_ip, transfer_time):
+    """transfer_id : ID de file_transfers, None pour un transfert reçu en temps réel"""
+    check_log.debug("Analyse transfert #%s : %s depuis %s",
+                    transfer_id if transfer_id is not None else "(temps réel)",
+                    filename, client_ip,
+                    extra={"transfer_id": transfer_id, "file": filename, "client_ip": client_ip})
+
+    # Vérifier les 3 types d'anomalies
+    verifier_ip_non_autorisee(client_ip, filename, transfer_id)
+    verifier_fichier_critique(filename, client_ip, transfer_id)
+    verifier_rate_limit(client_ip, filename, transfer_id, transfer_time)
+
+def resynchroniser(subscriber):
+    """
+    Rattrapage sur la base : analyse les transferts insérés depuis le dernier ID
+    vérifié qui n'ont pas été reçus par le canal. Renvoie False si la base est injoignable.
+    """
+    global last_checked_id
+
+    try:
+        # Récupérer les nouveaux transferts depuis le dernier ID vérifié
+        transfers = db.fetch_all("resync", RESYNC_SQL, (last_checked_id,), prepared=True)
+    except DatabaseUnavailable:
+        logger.error("Impossible de se connecter à la base de données")
+        return False
+    except Exception as e:
+        logger.error("Erreur lors de la resynchronisation : %s", e)
+        return False
+
+    try:
+        missed = 0
+        for transfer in transfers:
+            # Mettre à jour le dernier ID vérifié
+            last_checked_id = transfer['id']
+            if subscriber.already_seen(transfer['filename'], transfer['client_ip'],
+                                       transfer['timestamp'].timestamp()):
+                continue
+            missed += 1
+            analyzed["resync"] += 1
+            analyser_transfert(transfer['id'], transfer['filename'],
+                               transfer['client_ip'], transfer['timestamp'])
+
+        if missed:
+            log.get("resync").info("✅ %s transfert(s) manqué(s) analysé(s) depuis la base",
+                                   missed)
+        return True
+    except Exception as e:
+        logger.error("Erreur lors de la resynchronisation : %s", e)
+        return False
+
 def surveiller_anomalies():
-    """Boucle principale de détection d'anomalies"""
+    """
+    Boucle principale : les transferts sont poussés par tftp-monitor sur la
+    socket Unix et analysés dès leur réception ; la base n'est relue qu'en cas
+    de perte de messages et toutes les RESYNC_INTERVAL secondes.
+    """
     global last_checked_id
 
-    print(" Démarrage de la surveillance des anomalies...")
+    logger.info("Démarrage de la surveillance des anomalies...")
 
     # Initialiser last_checked_id au dernier ID existant pour éviter de traiter l'historique
     try:
-        conn = connecter_db()
-        if conn:
-            cursor = conn.cursor()
-            cursor.execute("SELECT MAX(id) as max_id FROM file_transfers")
-            result = cursor.fetchone()
-            last_checked_id = result[0] if result[0] is not None else 0
-            cursor.close()
-            conn.close()
-            print(f" Démarrage à partir de l'ID : {last_checked_id}")
+        result = db.fetch_one("max_id", "SELECT MAX(id) as max_id FROM file_transfers")
+        last_checked_id = result['max_id'] if result['max_id'] is not None else 0
+        logger.info("Démarrage à partir de l'ID : %s", last_checked_id)
     except Exception as e:
-        print(f"[WARN] ⚠️Impossible de récupérer le dernier ID : {e}")
+        logger.warning("Impossible de récupérer le dernier ID : %s", e)
         last_checked_id = 0
 
-    print(f" IPs autorisées : {', '.join(ALERT_CONFIG['authorized_ips'])}")
-    print(f" Fichiers critiques : {', '.join(ALERT_CONFIG['critical_files'])}")
-    print(f" Rate limit : {ALERT_CONFIG['max_requests_per_minute']} requêtes par minute\n")
-
+    subscriber = AlertSubscriber(SOCKET_PATH, RESYNC_RETENTION, MAX_REMEMBERED_TRANSFERS)
+    subscriber.gap = False
+    dispatcher.start()
+    if METRICS_PORT:
+        try:
+            exposer_metriques(subscriber)
+        except OSError as e:
+            log.get("metrics").error("%s", e)
+    # kill -HUP : rechargement immédiat des règles
+    signal.signal(signal.SIGHUP, lambda signum, frame: rules.reload())
+
+    logger.info("Canal temps réel : %s", SOCKET_PATH)
+    logger.info("IPs autorisées : %s réseau(x)", rules.allowlist.size)
+    logger.info("Fichiers critiques : %s règle(s)", rules.critical.size)
+    logger.info("Rate limit : %s requêtes par minute par IP, %s par sous-réseau",
+                ALERT_CONFIG['max_requests_per_minute'], MAX_REQUESTS_PER_SUBNET)
+
+    next_resync = time.time() + RESYNC_INTERVAL
     while True:
         try:
-            conn = connecter_db()
-            if not conn:
-                print("[ERROR]  Impossible de se connecter à la base de données")
-                time.sleep(ALERT_CONFIG["check_interval_seconds"])
-                continue
-
-            cursor = conn.cursor(dictionary=True)
-
-            # Récupérer les nouveaux transferts depuis le dernier ID vérifié
-            query = """
-                SELECT id, filename, client_ip, timestamp
-                FROM file_transfers
-                WHERE id > %s
-                ORDER BY id ASC
-            """
-            cursor.execute(query, (last_checked_id,))
-            transfers = cursor.fetchall()
-
+            rules.reload_if_changed()
+            transfers = subscriber.receive(
+                min(max(0, next_resync - time.time()), rules.check_interval))
             for transfer in transfers:
-                transfer_id = transfer['id']
-                filename = transfer['filename']
-                client_ip = transfer['client_ip']
-                transfer_time = transfer['timestamp']
-
-                print(f"[CHECK]  Analyse transfert #{transfer_id} : {filename} depuis {client_ip}")
-
-                # Vérifier les 3 types d'anomalies
-                verifier_ip_non_autorisee(client_ip, filename, transfer_id)
-                verifier_fichier_critique(filename, client_ip, transfer_id)
-                verifier_rate_limit(client_ip, filename, transfer_id, transfer_time)
-
-                # Mettre à jour le dernier ID vérifié
-                last_checked_id = transfer_id
-
-            cursor.close()
-            conn.close()
+                analyzed["realtime"] += 1
+                # Pas d'ID : le numéro de séquence du canal n'est pas un ID de file_transfers
+                analyser_transfert(
+                    None,
+                    transfer['filename'],
+                    transfer['client_ip'],
+                    datetime.fromtimestamp(transfer['timestamp'])
+                )
+
+            now = time.time()
+            if subscriber.gap:
+                next_resync = min(next_resync, now + RESYNC_DELAY)
+            if now < next_resync:
+                continue
 
-            if transfers:
-                print(f"✅ {len(transfers)} transfert(s) analysé(s)\n")
+            subscriber.gap = False
+            if resynchroniser(subscriber):
+                next_resync = now + RESYNC_INTERVAL
+            else:
+                subscriber.gap = True
+                next_resync = now + RESYNC_DELAY
 
         except Exception as e:
-            print(f"[ERROR] ❌ Erreur lors de la surveillance : {e}")
-
-        # Attendre avant la prochaine vérification
-        time.sleep(ALERT_CONFIG["check_interval_seconds"])
+            logger.error("Erreur lors de la surveillance : %s", e)
+            time.sleep(1)
 
 # ==============================
 # POINT D'ENTRÉE
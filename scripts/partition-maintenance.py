@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+Rotation des partitions mensuelles de file_transfers (à lancer une fois par
+jour : cron ou timer systemd).
+
+  - crée les partitions des mois à venir ;
+  - exporte chaque partition sortie de la rétention dans une archive CSV.gz
+    indexée par bloc, vérifie qu'aucune ligne n'y a été ajoutée entre-temps,
+    l'enregistre dans le manifeste puis supprime la partition ;
+  - purge les agrégats par minute les plus anciens.
+
+Usage : python3 scripts/partition-maintenance.py [--dry-run] [--init]
+"""
+
+import argparse
+import os
+import sys
+from datetime import date
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import DB_CONFIG
+from tftpmon import log, partitions
+from tftpmon.archive import TransferArchive
+from tftpmon.db import Database
+
+try:
+    from config import ARCHIVE_CONFIG
+except ImportError:
+    ARCHIVE_CONFIG = {}
+
+try:
+    from config import LOG_CONFIG
+except ImportError:
+    LOG_CONFIG = {}
+
+ARCHIVE_DIR = ARCHIVE_CONFIG.get("archive_dir", "/var/lib/tftp-monitor/archive")
+RETENTION_MONTHS = ARCHIVE_CONFIG.get("retention_months", 12)
+PREMAKE_MONTHS = ARCHIVE_CONFIG.get("premake_months", 3)
+MINUTE_ROLLUP_DAYS = ARCHIVE_CONFIG.get("minute_rollup_retention_days", 30)
+
+db = Database(DB_CONFIG, pool_size=1)
+logger = log.get("partitions")
+
+
+def initialiser(dry_run):
+    """Conversion d'une table existante non partitionnée"""
+    if partitions.list_partitions(db):
+        logger.info("✅ file_transfers est déjà partitionnée")
+        return
+    row = db.fetch_one("init", """
+        SELECT MIN(timestamp) as first, SUM(timestamp IS NULL) as missing FROM file_transfers
+    """)
+    if row["missing"]:
+        logger.error("%s ligne(s) sans timestamp : à corriger avant la conversion",
+                     row["missing"])
+        return
+    first = row["first"].date() if row["first"] else date.today()
+    for sql in partitions.init_sql(first, PREMAKE_MONTHS):
+        logger.info("%s", sql)
+        if not dry_run:
+            with db.cursor("partition_ddl") as cursor:
+                cursor.execute(sql)
+    logger.info("✅ Table convertie" if not dry_run else "(simulation)")
+
+
+def archiver(name, dry_run):
+    month = partitions.partition_month(name)
+    if dry_run:
+        logger.info("(simulation) archivage puis suppression de %s", name)
+        return
+    archive = TransferArchive(ARCHIVE_DIR)
+    entry = archive.write_partition(db, name, month)
+
+    # Lignes insérées dans la partition après l'export (backfill d'anciens journaux) :
+    # la suppression est reportée, l'archive sera refaite au prochain passage
+    check = db.fetch_one("archive_check",
+                         f"SELECT COUNT(*) as n, MAX(id) as max_id "
+                         f"FROM file_transfers PARTITION ({name})")
+    if check["n"] != entry["rows"] or check["max_id"] != entry["max_id"]:
+        logger.warning("%s modifiée pendant l'export, suppression reportée", name)
+        return
+
+    # Enregistrée avant la suppression : un arrêt entre les deux ne rend pas
+    # l'archive invisible (l'API écarte les lignes encore en base)
+    archive.register(entry)
+    partitions.drop(db, name)
+    archive.mark_dropped(entry["month"])
+    logger.info("✅ %s archivée (%s ligne(s) -> %s) et supprimée",
+                name, entry["rows"], entry["file"])
+
+
+def purger_agregats_minute(dry_run):
+    if dry_run:
+        return
+    with db.cursor("rollup_purge") as cursor:
+        cursor.execute("DELETE FROM transfer_stats_minute WHERE bucket < NOW() - INTERVAL %s DAY",
+                       (MINUTE_ROLLUP_DAYS,))
+        if cursor.rowcount:
+            logger.info("✅ %s agrégat(s) par minute purgé(s)", cursor.rowcount)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rotation des partitions de file_transfers")
+    parser.add_argument("--dry-run", action="store_true", help="affiche les actions sans les exécuter")
+    parser.add_argument("--init", action="store_true",
+                        help="partitionne une table existante (une seule fois)")
+    args = parser.parse_args()
+    log.setup(LOG_CONFIG)
+
+    if args.init:
+        initialiser(args.dry_run)
+        return
+
+    created = partitions.ensure_future(db, PREMAKE_MONTHS, dry_run=args.dry_run)
+    if created:
+        logger.info("✅ Partition(s) créée(s) : %s", ", ".join(created))
+
+    existing = partitions.list_partitions(db)
+    if not args.dry_run:
+        # Archives dont la suppression de partition a été interrompue après coup
+        archive = TransferArchive(ARCHIVE_DIR)
+        names = {name for name, _ in existing}
+        for month, entry in archive.manifest().items():
+            if not entry.get("partition_dropped", True) and entry["partition"] not in names:
+                archive.mark_dropped(month)
+
+    for name in partitions.expired(existing, RETENTION_MONTHS):
+        try:
+            archiver(name, args.dry_run)
+        except Exception as e:
+            logger.error("%s : %s", name, e)
+            break
+
+    purger_agregats_minute(args.dry_run)
+    logger.info("%s", db.summary())
+
+
+if __name__ == "__main__":
+    main()
@@ -1,222 +1,375 @@
 #!/usr/bin/env python3
-import subprocess
+import argparse
 import threading
 import time
-import re
 import os
-import socket
-import mysql.connector
-
-from config import DB_CONFIG, SYSLOG_CONFIG, TFTP_CONFIG
+import signal
+import sys
+from datetime import datetime
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import ALERT_CONFIG, DB_CONFIG, SYSLOG_CONFIG, TFTP_CONFIG
+from tftpmon import (backfill, checkpoint, fanotify_reader, inotify_reader, journal_reader, log,
+                     tftpd_parser)
+from tftpmon.alert_channel import AlertPublisher, DEFAULT_SOCKET_PATH
+from tftpmon.correlation import CorrelationEngine
+from tftpmon.db import Database
+from tftpmon.db_writer import TransferWriter
+from tftpmon.file_index import FileIndex
+from tftpmon.metrics import Registry, serve as serve_metrics
+from tftpmon.syslog_forwarder import SyslogForwarder
+
+try:
+    from config import METRICS_CONFIG
+except ImportError:
+    METRICS_CONFIG = {}
+
+try:
+    from config import LOG_CONFIG
+except ImportError:
+    LOG_CONFIG = {}
 
 TFTP_ROOT = TFTP_CONFIG["root_directory"]
+# Chemins des fichiers ouverts tels que les montre /proc/<pid>/fd
+TFTP_ROOT_REAL = os.path.realpath(TFTP_ROOT)
 WAIT_AFTER_CLOSE = TFTP_CONFIG["wait_after_close"]
+INOTIFY_BACKEND = TFTP_CONFIG.get("inotify_backend", "native")
+JOURNAL_BACKEND = TFTP_CONFIG.get("journal_backend", "native")
+JOURNAL_UNIT = TFTP_CONFIG.get("journal_unit", "tftpd-hpa")
+FILE_HASH = TFTP_CONFIG.get("file_hash")
+ORPHAN_TTL = TFTP_CONFIG.get("orphan_ttl_seconds", 300)
+MAX_ORPHANS = TFTP_CONFIG.get("max_orphans", 50000)
+STATS_INTERVAL = TFTP_CONFIG.get("stats_interval_seconds", 60)
+DB_BATCH_SIZE = TFTP_CONFIG.get("db_batch_size", 200)
+DB_FLUSH_INTERVAL = TFTP_CONFIG.get("db_flush_interval", 1.0)
+DB_SPOOL_FILE = TFTP_CONFIG.get("db_spool_file", "/var/lib/tftp-monitor/spool.jsonl")
+DB_DEAD_LETTER_FILE = TFTP_CONFIG.get("db_dead_letter_file", "/var/lib/tftp-monitor/rejected.jsonl")
+CHECKPOINT_FILE = TFTP_CONFIG.get("checkpoint_file", "/var/lib/tftp-monitor/checkpoint.json")
+CHECKPOINT_INTERVAL = TFTP_CONFIG.get("checkpoint_interval_seconds", 5)
+SESSION_TRACKING = TFTP_CONFIG.get("session_tracking", "fanotify")
+BACKFILL_MATCH_SECONDS = TFTP_CONFIG.get("backfill_match_seconds", 60)
 
 SYSLOG_HOST = SYSLOG_CONFIG["host"]
 SYSLOG_PORT = SYSLOG_CONFIG["port"]
-
-inotify_events = []
-log_requests = []
-log_errors = []
-pending_transfers = []
-
-lock = threading.Lock()
-
-def connecter_db():
-
-    try:
-        conn = mysql.connector.connect(**DB_CONFIG)
-        return conn
-    except Exception as e:
-        print(f"[DB CONNECTION ERROR]  {e}")
-        return None
+SYSLOG_PROTOCOL = SYSLOG_CONFIG.get("protocol", "udp")
+SYSLOG_FORMAT = SYSLOG_CONFIG.get("format", "legacy")
+SYSLOG_BUFFER_SIZE = SYSLOG_CONFIG.get("buffer_size", 10000)
+
+ALERT_SOCKET = ALERT_CONFIG.get("socket_path", DEFAULT_SOCKET_PATH)
+
+METRICS_BIND = METRICS_CONFIG.get("bind", "127.0.0.1")
+METRICS_PORT = METRICS_CONFIG.get("tftp_monitor_port", 9310)
+
+def fichier_ouvert(pid, fname):
+    """Le fils tftpd pid a-t-il encore fname ouvert ? (départage des fermetures sans PID)"""
+    return fanotify_reader.holds_open(pid, os.path.join(TFTP_ROOT_REAL, fname))
+
+engine = CorrelationEngine(WAIT_AFTER_CLOSE, ORPHAN_TTL, MAX_ORPHANS,
+                           holds_open=fichier_ouvert if SESSION_TRACKING != "off" else None)
+file_index = FileIndex(TFTP_ROOT, FILE_HASH)
+# Une seule connexion : seul le thread d'écriture accède à la base
+db = Database(DB_CONFIG, pool_size=1)
+writer = TransferWriter(db, DB_BATCH_SIZE, DB_FLUSH_INTERVAL, DB_SPOOL_FILE,
+                        dead_letter_file=DB_DEAD_LETTER_FILE)
+syslog = SyslogForwarder(SYSLOG_HOST, SYSLOG_PORT, SYSLOG_PROTOCOL, SYSLOG_FORMAT,
+                         buffer_size=SYSLOG_BUFFER_SIZE)
+alerts = AlertPublisher(ALERT_SOCKET)
+
+# Lignes par événement en DEBUG : à activer par composant (LOG_CONFIG["levels"])
+inotify_log = log.get("inotify")
+journal_log = log.get("journal")
+transfer_log = log.get("transfert")
+orphan_log = log.get("orphelin")
+syslog_log = log.get("syslog")
+checkpoint_log = log.get("checkpoint")
+
+# Événements lus par source et par nature (/metrics)
+event_counts = {
+    ("journal", "request"): 0, ("journal", "error"): 0, ("journal", "ignored"): 0,
+    ("inotify", "close"): 0, ("inotify", "other"): 0, ("inotify", "overflow"): 0,
+}
+# Posé une fois l'arriéré du journal rejoué : les latences ne sont mesurées qu'en direct
+live_mode = threading.Event()
 
 def envoyer_syslog(message, is_error=False):
-    try:
-        priority = 11 if is_error else 13
-        syslog_message = f"<{priority}> script_tracabilite: {message}"
-        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        sock.sendto(syslog_message.encode(), (SYSLOG_HOST, SYSLOG_PORT))
-        sock.close()
-        print(f"[SYSLOG]  Message envoyé : {message}")
-    except Exception as e:
-        print(f"[SYSLOG ERROR]  {e}")
-
-def insert_transfer_db(filename, transfer_type, status, client_ip, file_size):
-    conn = connecter_db()
-    if not conn:
-        return
-
-    try:
-        cursor = conn.cursor()
-        sql = """
-            INSERT INTO file_transfers
-            (filename, client_ip, file_size, transfer_type, status)
-            VALUES (%s, %s, %s, %s, %s)
-        """
-        cursor.execute(sql, (
-            filename,
-            client_ip,
-            file_size,
-            transfer_type,
-            status
-        ))
-        conn.commit()
-        cursor.close()
-        conn.close()
-        print(f"[DB] ✅ {filename} | {client_ip} | {file_size} bytes | {status}")
-    except Exception as e:
-        print(f"[DB ERROR] ❌ {e}")
-
-def watch_inotify():
-    cmd = [
-        "inotifywait",
-        "-m",
-        "-e", "close_write,close_nowrite",
-        "--format", "%T %f %e",
-        "--timefmt", "%H:%M:%S",
-        TFTP_ROOT,
-    ]
-    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, text=True)
-
-    for line in proc.stdout:
-        parts = line.strip().split(" ", 2)
-        if len(parts) == 3:
-            _, fname, event_type = parts
-            with lock:
-                inotify_events.append({
-                    "file": fname,
-                    "event": event_type
-                })
-            print(f"[INOTIFY] {fname} {event_type}")
-
-def watch_logs():
-    cmd = ["journalctl", "-u", "tftpd-hpa", "-f", "-n", "0", "-o", "short"]
-    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, text=True)
-
-    for line in proc.stdout:
-        m = re.search(
-            r"in\.tftpd\[(\d+)\]:\s+"
-            r"(WRQ|RRQ)\s+from\s+([\d\.]+).*filename\s+(\S+)",
-            line
-        )
-        if m:
-            pid, typ, client_ip, fname = m.groups()
-            with lock:
-                log_requests.append({
-                    "file": fname,
-                    "pid": pid,
-                    "type": typ,
-                    "client_ip": client_ip,
-                    "pending_used": False
-                })
-            print(f"[LOG] {typ} {fname} FROM {client_ip} PID={pid}")
+    syslog.send(message, is_error)
+    syslog_log.debug("Message en file : %s", message)
+
+def watch_inotify(events):
+    last_rebuild = 0
+    for fname, event_type, ts, pid in events:
+        if event_type == "Q_OVERFLOW":
+            event_counts["inotify", "overflow"] += 1
+            # Réindexation au plus une fois par minute : le parcours génère lui-même
+            # des événements et pourrait à nouveau saturer la file
+            if ts - last_rebuild >= 60:
+                last_rebuild = ts
+                inotify_log.warning("File inotify saturée : réindexation (%s fichiers)",
+                                    file_index.build())
             continue
 
-        m_refused = re.search(
-            r"in\.tftpd\[(\d+)\].*read:\s+Connection refused",
-            line
+        # Index mis à jour hors verrou du moteur ; la taille est figée à la fermeture
+        if file_index.own_close(fname, event_type):
+            continue
+        file_index.apply(fname, event_type)
+        if "CLOSE" not in event_type or "ISDIR" in event_type:
+            event_counts["inotify", "other"] += 1
+            continue
+        event_counts["inotify", "close"] += 1
+
+        meta = file_index.get(fname)
+        engine.add_close(
+            fname, event_type, ts,
+            meta["size"] if meta else None,
+            meta["hash"] if meta else None,
+            pid
         )
-        if m_refused:
-            pid = m_refused.group(1)
-            with lock:
-                log_errors.append({"pid": pid, "reason": "Connection refused"})
-            print(f"[LOG] ERROR - Connection refused PID={pid}")
+        inotify_log.debug("%s %s PID=%s", fname, event_type, pid,
+                          extra={"file": fname, "event": event_type, "pid": pid})
+
+def watch_logs(cursor=None):
+    """
+    Lit le journal de tftpd-hpa. Au redémarrage, l'arriéré depuis le curseur du
+    point de contrôle est d'abord rejoué d'un trait, l'horloge de corrélation
+    étant alors celle du journal ; le thread de corrélation (horloge murale)
+    n'est lancé qu'une fois l'arriéré épuisé.
+    """
+    replayed = 0
+    started = time.time()
+    live = cursor is None
+
+    def fin_rattrapage():
+        nonlocal live
+        if not live:
+            checkpoint_log.info("✅ Rattrapage terminé : %s ligne(s) tftpd rejouée(s) en %.1f s",
+                                replayed, time.time() - started)
+        live = True
+        live_mode.set()
+        threading.Thread(target=correlate, daemon=True).start()
+
+    entries = journal_reader.follow(JOURNAL_UNIT, JOURNAL_BACKEND, cursor, fin_rattrapage)
+    for pid, message, ts, cur in entries:
+        parsed = tftpd_parser.parse_message(message)
+        if parsed is None:
+            event_counts["journal", "ignored"] += 1
             continue
+        event_counts["journal", parsed[0]] += 1
+
+        if parsed[0] == "request":
+            _, typ, client_ip, fname, _ = parsed
+            fname = tftpd_parser.relative_path(fname, TFTP_ROOT)
+            engine.add_request(pid, typ, client_ip, fname, ts, cur)
+            if live:
+                journal_log.debug("%s %s FROM %s PID=%s", typ, fname, client_ip, pid,
+                                  extra={"type": typ, "file": fname, "client_ip": client_ip,
+                                         "pid": pid})
+        else:
+            engine.add_error(pid, parsed[1], ts, cur)
+            if live:
+                journal_log.debug("ERROR - %s PID=%s", parsed[1], pid,
+                                  extra={"error": parsed[1], "pid": pid})
+
+        if not live:
+            replayed += 1
+            engine.process_due(traiter_transfert, ts)
+
+def traiter_transfert(tr):
+    """Enregistre un transfert validé (ou expiré) par le moteur de corrélation"""
+    status = tr["status"]
+
+    if status == "unmatched":
+        # Fermeture sans requête ou erreur d'un PID inconnu : pas de ligne en base
+        if tr["file"]:
+            detail = f"fichier={tr['file']} | événement={tr['event']}"
+            if tr["pid"]:
+                detail += f" | PID={tr['pid']}"
+        else:
+            detail = f"PID={tr['pid']} | Raison: {tr['error']}"
+        orphan_log.info("⏱️ %s", detail)
+        envoyer_syslog(f"Evenement non correle expire | {detail}", is_error=True)
+        return
 
-        m_nak = re.search(
-            r"in\.tftpd\[(\d+)\].*NAK",
-            line
+    db_type = "upload" if tr["type"] == "WRQ" else "download"
+
+    transfer_log.info(
+        "➡️ %s | FILE=%s | IP=%s | SIZE=%s | STATUS=%s",
+        tr["type"], tr["file"], tr["client_ip"], tr["file_size"], status.upper(),
+        extra={"type": tr["type"], "file": tr["file"], "client_ip": tr["client_ip"],
+               "size": tr["file_size"], "status": status, "pid": tr["pid"]}
+    )
+
+    writer.submit(
+        filename=tr["file"],
+        transfer_type=db_type,
+        status=status,
+        client_ip=tr["client_ip"],
+        file_size=tr["file_size"],
+        timestamp=tr["timestamp"],
+        origin=tr.get("requested_at") if live_mode.is_set() else None
+    )
+
+    # Analyse d'anomalies immédiate, sans attendre l'insertion en base
+    alerts.publish(tr["file"], tr["client_ip"], db_type, status, tr["timestamp"])
+
+    envoyer_syslog(
+        f"Transfert {db_type} | fichier={tr['file']} | "
+        f"IP={tr['client_ip']} | taille={tr['file_size']} bytes | "
+        f"statut={status.upper()}"
+        + (f" | {FILE_HASH}={tr['file_hash']}" if tr.get("file_hash") else ""),
+        is_error=(status != "success")
+    )
+
+    if tr["error"]:
+        envoyer_syslog(
+            f"ERREUR sur le transfert {db_type} | fichier={tr['file']} | "
+            f"IP={tr['client_ip']} | PID={tr['pid']} | "
+            f"Raison: {tr['error']}",
+            is_error=True
         )
-        if m_nak:
-            pid = m_nak.group(1)
-            with lock:
-                log_errors.append({"pid": pid, "reason": "NAK reçu"})
-            print(f"[LOG] ERROR - NAK PID={pid}")
-            continue
 
 def correlate():
-    while True:
-        time.sleep(0.2)
-        now = time.time()
-
-        with lock:
-            for ino in list(inotify_events):
-                reqs = [
-                    r for r in log_requests
-                    if r["file"] == ino["file"] and not r["pending_used"]
-                ]
-                if not reqs:
-                    continue
-
-                req = reqs[-1]
-
-                if (req["type"] == "WRQ" and "CLOSE_WRITE" in ino["event"]) or \
-                   (req["type"] == "RRQ" and "CLOSE_NOWRITE" in ino["event"]):
-
-                    req["pending_used"] = True
-
-                    file_path = os.path.join(TFTP_ROOT, ino["file"])
-                    file_size = os.path.getsize(file_path) if os.path.exists(file_path) else None
-
-                    pending_transfers.append({
-                        "file": ino["file"],
-                        "pid": req["pid"],
-                        "type": req["type"],
-                        "client_ip": req["client_ip"],
-                        "file_size": file_size,
-                        "check_at": now + WAIT_AFTER_CLOSE
-                    })
-
-                    inotify_events.remove(ino)
-
-            for tr in list(pending_transfers):
-                if now >= tr["check_at"]:
-                    error = next((e for e in log_errors if e["pid"] == tr["pid"]), None)
-                    status = "failed" if error else "success"
-                    db_type = "upload" if tr["type"] == "WRQ" else "download"
-
-                    print(
-                        f"\n➡️ {tr['type']} | FILE={tr['file']} | "
-                        f"IP={tr['client_ip']} | SIZE={tr['file_size']} | "
-                        f"STATUS={status.upper()}\n"
-                    )
-
-                    insert_transfer_db(
-                        filename=tr["file"],
-                        transfer_type=db_type,
-                        status=status,
-                        client_ip=tr["client_ip"],
-                        file_size=tr["file_size"]
-                    )
-
-                    envoyer_syslog(
-                        f"Transfert {db_type} | fichier={tr['file']} | "
-                        f"IP={tr['client_ip']} | taille={tr['file_size']} bytes | "
-                        f"statut={status.upper()}",
-                        is_error=(status == "failed")
-                    )
-
-                    if error:
-                        envoyer_syslog(
-                            f"ERREUR sur le transfert {db_type} | fichier={tr['file']} | "
-                            f"IP={tr['client_ip']} | PID={tr['pid']} | "
-                            f"Raison: {error['reason']}",
-                            is_error=True
-                        )
-
-                    pending_transfers.remove(tr)
-                    if error:
-                        log_errors.remove(error)
-
-                    req = next((r for r in log_requests if r["pid"] == tr["pid"]), None)
-                    if req:
-                        log_requests.remove(req)
+    engine.run(traiter_transfert)
+
+def exposer_metriques():
+    """Sert /metrics : compteurs et files lus à la collecte, histogrammes de latence"""
+    registry = Registry()
+    registry.counter("tftpmon_events_total", "Événements lus (journal tftpd, inotify)",
+                     lambda: dict(event_counts), ("source", "kind"))
+
+    def correlation_entries():
+        stats = engine.stats()
+        return {key: stats[key] for key in ("requests", "closes", "errors", "pending", "orphans")}
+
+    registry.gauge("tftpmon_correlation_entries",
+                   "Requêtes, fermetures et erreurs en attente de corrélation, "
+                   "transferts en stabilisation",
+                   correlation_entries, ("structure",))
+    registry.counter("tftpmon_correlation_evictions_total",
+                     "Orphelins expirés (TTL) ou évincés (plafond)",
+                     lambda: dict(engine.counters), ("reason",))
+    registry.histogram("tftpmon_correlation_lock_wait_seconds",
+                       "Attente du verrou du moteur de corrélation (acquisitions contendues)",
+                       engine.lock_wait)
+    registry.histogram("tftpmon_transfer_latency_seconds",
+                       "Ligne de journal RRQ/WRQ -> ligne validée en base",
+                       writer.latency)
+    registry.gauge("tftpmon_queue_depth", "Éléments en file d'envoi",
+                   lambda: {"db_writer": writer.queue_depth(), "syslog": syslog.queue_depth()},
+                   ("queue",))
+    registry.counter("tftpmon_db_writer_rows_total",
+                     "Lignes insérées, mises en tampon disque, réinjectées, rejetées",
+                     lambda: {k: v for k, v in writer.counters.items() if k != "batches"},
+                     ("outcome",))
+    registry.database(db)
+    registry.counter("tftpmon_syslog_messages_total", "Messages syslog envoyés, abandonnés",
+                     lambda: {"sent": syslog.counters["sent"],
+                              "dropped": syslog.counters["dropped"]}, ("outcome",))
+    registry.counter("tftpmon_syslog_errors_total", "Erreurs d'envoi syslog",
+                     lambda: syslog.counters["errors"])
+    registry.histogram("tftpmon_syslog_send_seconds", "Envoi d'un lot syslog", syslog.latency)
+    registry.counter("tftpmon_alert_channel_messages_total",
+                     "Transferts publiés vers alert-monitor, non remis",
+                     lambda: dict(alerts.counters), ("outcome",))
+    registry.counter("tftpmon_log_records_total",
+                     "Lignes de journal écrites, omises (limitation de débit), perdues (file pleine)",
+                     lambda: dict(log.counters), ("outcome",))
+
+    serve_metrics(registry, METRICS_PORT, METRICS_BIND)
+    log.get("metrics").info("✅ http://%s:%s/metrics", METRICS_BIND, METRICS_PORT)
+
+def sauvegarder_checkpoint():
+    """
+    Curseur, corrélations en cours et lignes pas encore en base : un transfert
+    sorti du moteur est dans l'instantané (traitement en cours) ou déjà déposé
+    auprès du thread d'écriture, d'où l'ordre moteur puis écriture
+    """
+    if not CHECKPOINT_FILE:
+        return
+    try:
+        state = engine.snapshot()
+        state["db_rows"] = writer.unsaved_records()
+        checkpoint.save(CHECKPOINT_FILE, state)
+    except Exception as e:
+        checkpoint_log.error("%s", e)
+
+def arreter(signum, frame):
+    """
+    Arrêt propre (systemd stop/restart) : fin du lot DB en cours, file DB vidée
+    dans le tampon disque, puis point de contrôle
+    """
+    writer.shutdown()
+    sauvegarder_checkpoint()
+    sys.exit(0)
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Supervision des transferts TFTP")
+    parser.add_argument(
+        "--backfill", nargs="+", metavar="FICHIER",
+        help="reconstruit file_transfers depuis des journaux historiques "
+             "(archives rsyslog, exports journalctl, .gz acceptés) puis quitte"
+    )
+    parser.add_argument("--workers", type=int, default=None,
+                        help="nombre de processus de backfill (défaut : nb de CPU)")
+    parser.add_argument("--since", help="ignore les lignes antérieures (AAAA-MM-JJ[ HH:MM:SS])")
+    parser.add_argument("--until", help="ignore les lignes postérieures (AAAA-MM-JJ[ HH:MM:SS])")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="compte les transferts reconstruits sans écrire en base")
+    return parser.parse_args()
+
+def lancer_backfill(args):
+    since = datetime.fromisoformat(args.since).timestamp() if args.since else None
+    until = datetime.fromisoformat(args.until).timestamp() if args.until else None
+    backfill.run(args.backfill, DB_CONFIG, WAIT_AFTER_CLOSE, args.workers,
+                 since, until, args.dry_run, LOG_CONFIG, BACKFILL_MATCH_SECONDS)
 
 if __name__ == "__main__":
-    threading.Thread(target=watch_inotify, daemon=True).start()
-    threading.Thread(target=watch_logs, daemon=True).start()
-    threading.Thread(target=correlate, daemon=True).start()
-
+    args = parse_args()
+    log.setup(LOG_CONFIG)
+    if args.backfill:
+        lancer_backfill(args)
+        sys.exit(0)
+
+    cursor = None
+    state = checkpoint.load(CHECKPOINT_FILE) if CHECKPOINT_FILE else None
+    if state:
+        engine.restore(state)
+        # Lignes non validées en base lors de la sauvegarde : réinjectées par le tampon
+        writer.spool_records(state.get("db_rows"))
+        cursor = state.get("cursor")
+        checkpoint_log.info("Reprise depuis le point de contrôle : %s", engine.stats())
+
+    signal.signal(signal.SIGTERM, arreter)
+
+    # Index construit avant la pose des watches : son parcours ouvre chaque
+    # répertoire et saturerait la file inotify sur une grande arborescence
+    started = time.time()
+    log.get("index").info("%s fichier(s) indexé(s) dans %s en %.2f s",
+                          file_index.build(), TFTP_ROOT, time.time() - started)
+    inotify_events = inotify_reader.watch_events(TFTP_ROOT, INOTIFY_BACKEND,
+                                                 close_pids=SESSION_TRACKING == "fanotify")
+    file_index.watching = True
+
+    writer.start()
+    syslog.start()
+    if METRICS_PORT:
+        try:
+            exposer_metriques()
+        except OSError as e:
+            log.get("metrics").error("%s", e)
+    threading.Thread(target=watch_inotify, args=(inotify_events,), daemon=True).start()
+    threading.Thread(target=watch_logs, args=(cursor,), daemon=True).start()
+
+    last_stats = time.time()
     while True:
-        time.sleep(1)
\ No newline at end of file
+        time.sleep(CHECKPOINT_INTERVAL)
+        sauvegarder_checkpoint()
+
+        if time.time() - last_stats < STATS_INTERVAL:
+            continue
+        last_stats = time.time()
+        log.get("stats").info(
+            "%s | db_queue=%s %s %s | syslog_queue=%s %s | alerts=%s | log=%s",
+            engine.stats(), writer.queue_depth(), dict(writer.counters), db.summary(),
+            syslog.queue_depth(), dict(syslog.counters), dict(alerts.counters), dict(log.counters)
+        )
\ No newline at end of file
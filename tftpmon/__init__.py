@@ -0,0 +1,3 @@
+"""
+Composants partagés de la supervision TFTP.
+"""
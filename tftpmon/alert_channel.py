@@ -0,0 +1,231 @@
+"""
+Canal local de publication des transferts corrélés vers le moteur d'alertes.
+
+Le moniteur TFTP envoie chaque transfert, dès sa corrélation, sous forme d'un
+datagramme JSON sur une socket Unix (SOCK_DGRAM) ouverte par alert-monitor :
+l'analyse des anomalies ne dépend plus de l'insertion en base ni d'un
+intervalle de scrutation.
+
+L'envoi est non bloquant : si alert-monitor est arrêté ou saturé, le message
+est abandonné. Chaque message porte un numéro de séquence et l'identifiant de
+l'instance émettrice ; un trou dans la séquence (ou un redémarrage de l'une
+des deux parties) signale au récepteur qu'il doit se resynchroniser sur la
+table file_transfers, qui reste la référence.
+
+Les transferts reçus sont retenus `retention` secondes (au plus `remember`
+clés) : la resynchronisation ne réanalyse pas ceux qui ont déjà été vus. La
+durée, et non un nombre de clés, couvre l'intervalle entre deux
+resynchronisations quel que soit le débit ; une clé oubliée plus tôt, au
+plafond, est comptée (`forgotten`).
+
+La file d'un socket Unix datagramme est courte (net.unix.max_dgram_qlen, 10
+par défaut) : côté récepteur, un thread dédié la vide en continu dans une file
+mémoire, pour qu'une analyse lente (envoi d'e-mail) ne fasse pas perdre de messages.
+
+Dans l'autre sens, alert-monitor diffuse les alertes levées sur une seconde
+socket (`DEFAULT_EVENTS_PATH`) écoutée par le tableau de bord, avec le même
+envoi non bloquant : sans tableau de bord, les alertes partent seulement par e-mail.
+"""
+
+import errno
+import itertools
+import json
+import os
+import queue
+import socket
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+DEFAULT_SOCKET_PATH = "/run/tftp-monitor/alerts.sock"
+DEFAULT_EVENTS_PATH = "/run/tftp-monitor/dashboard.sock"
+
+
+def transfer_key(filename, client_ip, timestamp):
+    """Clé d'un transfert, commune au canal et à la base (seconde entière)"""
+    return filename, client_ip, int(timestamp)
+
+
+def bind_datagram(socket_path):
+    """Socket Unix datagramme liée à socket_path (remplace une socket orpheline)"""
+    directory = os.path.dirname(socket_path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    try:
+        os.unlink(socket_path)
+    except OSError as e:
+        if e.errno != errno.ENOENT:
+            raise
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+    sock.bind(socket_path)
+    os.chmod(socket_path, 0o660)
+    return sock
+
+
+class AlertPublisher:
+    """Côté moniteur TFTP : envoi fire-and-forget des transferts corrélés"""
+
+    def __init__(self, socket_path=DEFAULT_SOCKET_PATH):
+        self.socket_path = socket_path
+        self.instance = uuid.uuid4().hex
+        self._seq = itertools.count(1)
+        self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self._sock.setblocking(False)
+
+        self.counters = {"published": 0, "dropped": 0}
+
+    def publish(self, filename, client_ip, transfer_type, status, timestamp):
+        message = json.dumps({
+            "instance": self.instance,
+            "seq": next(self._seq),
+            "filename": filename,
+            "client_ip": client_ip,
+            "transfer_type": transfer_type,
+            "status": status,
+            "timestamp": timestamp,
+        }).encode()
+        try:
+            self._sock.sendto(message, self.socket_path)
+            self.counters["published"] += 1
+        except OSError:
+            # Récepteur absent (ENOENT / ECONNREFUSED) ou file pleine (EAGAIN) :
+            # le trou de séquence déclenchera une resynchronisation sur la base
+            self.counters["dropped"] += 1
+
+
+class AlertSubscriber:
+    """Côté alert-monitor : réception et détection des messages perdus"""
+
+    def __init__(self, socket_path=DEFAULT_SOCKET_PATH, retention=600, remember=500000):
+        self.socket_path = socket_path
+        self.retention = retention
+        self.remember = remember
+        # Resynchronisation nécessaire au démarrage
+        self.gap = True
+        self._instance = None
+        self._last_seq = 0
+        # Clé des transferts reçus -> heure de réception (monotone), par ordre de
+        # réception, pour ne pas les réanalyser à la resynchronisation
+        self._recent = OrderedDict()
+
+        self._sock = bind_datagram(socket_path)
+
+        self._queue = queue.Queue()
+        threading.Thread(target=self._drain, daemon=True, name="alert-channel").start()
+
+        self.counters = {"received": 0, "gaps": 0, "forgotten": 0}
+
+    def _drain(self):
+        while True:
+            try:
+                data = self._sock.recv(65536)
+            except OSError:
+                return
+            self._queue.put(data)
+
+    def receive(self, timeout):
+        """
+        Attend au plus `timeout` secondes ; renvoie la liste des transferts reçus
+        (dictionnaires) en vidant ce qui est déjà disponible sans attendre
+        """
+        transfers = []
+        try:
+            data = self._queue.get(timeout=timeout)
+            while True:
+                try:
+                    transfer = json.loads(data)
+                except ValueError:
+                    transfer = None
+                if transfer is not None:
+                    self.counters["received"] += 1
+                    self._sequence(transfer)
+                    self._remember(transfer)
+                    transfers.append(transfer)
+                data = self._queue.get_nowait()
+        except queue.Empty:
+            pass
+        return transfers
+
+    def queue_depth(self):
+        return self._queue.qsize()
+
+    def _sequence(self, transfer):
+        instance, seq = transfer.get("instance"), transfer.get("seq", 0)
+        if instance != self._instance or seq != self._last_seq + 1:
+            self.gap = True
+            self.counters["gaps"] += 1
+        self._instance, self._last_seq = instance, seq
+
+    def _remember(self, transfer):
+        key = transfer_key(transfer["filename"], transfer["client_ip"], transfer["timestamp"])
+        now = time.monotonic()
+        recent = self._recent
+        recent[key] = now
+        recent.move_to_end(key)
+        horizon = now - self.retention
+        while recent:
+            received_at = next(iter(recent.values()))
+            if received_at >= horizon:
+                if len(recent) <= self.remember:
+                    break
+                # Plafond atteint avant la fin de la rétention : doublon possible
+                self.counters["forgotten"] += 1
+            recent.popitem(last=False)
+
+    def already_seen(self, filename, client_ip, timestamp):
+        """
+        Vrai si un transfert lu en base a déjà été reçu par le canal. MySQL
+        arrondit les fractions de seconde : la seconde précédente est aussi testée.
+        """
+        ts = int(timestamp)
+        return (transfer_key(filename, client_ip, ts) in self._recent
+                or transfer_key(filename, client_ip, ts - 1) in self._recent)
+
+    def close(self):
+        self._sock.close()
+        try:
+            os.unlink(self.socket_path)
+        except OSError:
+            pass
+
+
+class EventPublisher:
+    """Côté alert-monitor : diffusion fire-and-forget des alertes vers le tableau de bord"""
+
+    def __init__(self, socket_path=DEFAULT_EVENTS_PATH):
+        self.socket_path = socket_path
+        self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self._sock.setblocking(False)
+
+        self.counters = {"published": 0, "dropped": 0}
+
+    def publish(self, event):
+        try:
+            self._sock.sendto(json.dumps(event, default=str).encode(), self.socket_path)
+            self.counters["published"] += 1
+        except OSError:
+            # Tableau de bord arrêté ou saturé : l'alerte reste envoyée par e-mail
+            self.counters["dropped"] += 1
+
+
+class EventListener:
+    """Côté tableau de bord : appelle callback(événement) pour chaque alerte reçue"""
+
+    def __init__(self, socket_path, callback):
+        self.socket_path = socket_path
+        self.callback = callback
+        self._sock = bind_datagram(socket_path)
+        threading.Thread(target=self._run, daemon=True, name="alert-events").start()
+
+    def _run(self):
+        while True:
+            try:
+                data = self._sock.recv(65536)
+            except OSError:
+                return
+            try:
+                event = json.loads(data)
+            except ValueError:
+                continue
+            self.callback(event)
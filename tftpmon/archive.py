@@ -0,0 +1,290 @@
+"""
+Archives mensuelles de `file_transfers` hors de la base.
+
+Avant d'être supprimée, une partition expirée est exportée dans
+`<archive_dir>/file_transfers-AAAA-MM.csv.gz` (format de l'export CSV de
+/api/history), écrit dans un fichier temporaire puis renommé. Un manifeste
+(`manifest.json`) décrit chaque archive : nombre de lignes, ID et dates
+extrêmes. L'API d'historique s'en sert pour n'ouvrir que les archives qui
+peuvent contenir des résultats (période demandée, plage d'ID de la page).
+
+L'archive est une suite de membres gzip de `BLOCK_ROWS` lignes (ID croissant),
+lisible d'un trait par gunzip / zcat. Son index (`<archive>.index.json`) donne
+pour chaque bloc la position dans le fichier, les ID et les dates extrêmes :
+une page de l'API ne décompresse que les blocs qui recoupent sa plage d'ID et
+sa période, pas l'archive entière.
+
+Une archive est enregistrée dans le manifeste avant la suppression de sa
+partition (`partition_dropped` faux jusqu'à mark_dropped()) : un arrêt entre
+les deux ne la rend pas invisible. Tant que la partition peut exister, l'API
+écarte les lignes archivées déjà lues en base.
+"""
+
+import csv
+import gzip
+import heapq
+import io
+import json
+import os
+from datetime import datetime
+
+from tftpmon import history
+
+MANIFEST = "manifest.json"
+# Lignes par membre gzip (unité de lecture de l'API)
+BLOCK_ROWS = 5000
+
+
+def _parse_row(record):
+    return {
+        "id": int(record["id"]),
+        "filename": record["filename"],
+        "client_ip": record["client_ip"],
+        "file_size": int(record["file_size"]) if record["file_size"] else None,
+        "transfer_type": record["transfer_type"],
+        "status": record["status"],
+        "timestamp": datetime.fromisoformat(record["timestamp"]),
+    }
+
+
+def _encode_block(rows, header):
+    """Membre gzip d'un bloc de lignes et son entrée d'index (ID et dates extrêmes)"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if header:
+        writer.writerow(history.COLUMNS)
+    block = {"rows": len(rows), "min_id": None, "max_id": None, "min_ts": None, "max_ts": None}
+    for row in rows:
+        record = history.as_json(row)
+        writer.writerow(record[column] for column in history.COLUMNS)
+        if block["min_id"] is None:
+            block["min_id"] = block["max_id"] = row["id"]
+            block["min_ts"] = block["max_ts"] = record["timestamp"]
+        else:
+            block["min_id"] = min(block["min_id"], row["id"])
+            block["max_id"] = max(block["max_id"], row["id"])
+            block["min_ts"] = min(block["min_ts"], record["timestamp"])
+            block["max_ts"] = max(block["max_ts"], record["timestamp"])
+    return gzip.compress(buffer.getvalue().encode("utf-8")), block
+
+
+def _overlaps(unit, filters):
+    """Archive ou bloc dont la période recoupe [since, until["""
+    since = filters.get("since")
+    until = filters.get("until")
+    if since is not None and datetime.fromisoformat(unit["max_ts"]) < since:
+        return False
+    if until is not None and datetime.fromisoformat(unit["min_ts"]) >= until:
+        return False
+    return True
+
+
+class TransferArchive:
+    """Répertoire d'archives CSV.gz, leur index par bloc et le manifeste"""
+
+    def __init__(self, directory):
+        self.directory = directory
+        self._manifest = None
+        self._manifest_mtime = None
+        # fichier d'index -> (mtime, blocs)
+        self._indexes = {}
+
+    # ==============================
+    # MANIFESTE
+    # ==============================
+    def _manifest_path(self):
+        return os.path.join(self.directory, MANIFEST)
+
+    def manifest(self):
+        """{"AAAA-MM": entrée} ; relu quand le fichier change (rotation par un autre processus)"""
+        path = self._manifest_path()
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except OSError:
+            return {}
+        if mtime != self._manifest_mtime:
+            with open(path, encoding="utf-8") as f:
+                self._manifest = json.load(f)
+            self._manifest_mtime = mtime
+        return self._manifest
+
+    def _save_json(self, path, data, indent=None):
+        tmp = path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=indent, sort_keys=True)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+
+    def _save_manifest(self, manifest):
+        self._save_json(self._manifest_path(), manifest, indent=2)
+
+    def _blocks(self, entry):
+        """
+        Blocs de l'archive (ID croissant) ; un seul bloc couvrant tout le fichier
+        sans index, ou si l'index ne correspond pas à l'archive (export refait)
+        """
+        whole = [dict(entry, offset=None)]
+        name = entry.get("index")
+        if not name:
+            return whole
+        path = os.path.join(self.directory, name)
+        try:
+            mtime = os.stat(path).st_mtime_ns
+            size = os.path.getsize(os.path.join(self.directory, entry["file"]))
+        except OSError:
+            return whole
+        cached = self._indexes.get(name)
+        if cached is None or cached[0] != mtime:
+            with open(path, encoding="utf-8") as f:
+                cached = self._indexes[name] = (mtime, json.load(f))
+        index = cached[1]
+        return index["blocks"] if index.get("size") == size else whole
+
+    # ==============================
+    # ÉCRITURE
+    # ==============================
+    def write_partition(self, db, partition, month):
+        """
+        Exporte une partition dans une archive et son index ; renvoie l'entrée
+        à enregistrer par register() (rows, min_id, max_id, ...)
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        label = month.strftime("%Y-%m")
+        filename = f"file_transfers-{label}.csv.gz"
+        index_name = f"file_transfers-{label}.index.json"
+        path = os.path.join(self.directory, filename)
+        tmp = path + ".tmp"
+        entry = {"month": label, "file": filename, "index": index_name, "partition": partition,
+                 "rows": 0, "min_id": None, "max_id": None, "min_ts": None, "max_ts": None}
+        blocks = []
+
+        def write_block(f, rows):
+            data, block = _encode_block(rows, header=not blocks)
+            block["offset"] = f.tell()
+            block["length"] = len(data)
+            f.write(data)
+            blocks.append(block)
+
+        # Lecture en flux (curseur non tamponné) dans un instantané cohérent
+        with db.cursor("archive_export", dictionary=True) as cursor:
+            cursor.execute("START TRANSACTION WITH CONSISTENT SNAPSHOT")
+            cursor.execute(
+                f"SELECT {', '.join(history.COLUMNS)} FROM file_transfers "
+                f"PARTITION ({partition}) ORDER BY id")
+            with open(tmp, "wb") as f:
+                rows = []
+                for row in iter(cursor.fetchone, None):
+                    rows.append(row)
+                    if len(rows) >= BLOCK_ROWS:
+                        write_block(f, rows)
+                        rows = []
+                if rows or not blocks:
+                    write_block(f, rows)
+                f.flush()
+                os.fsync(f.fileno())
+
+        # Bloc vide (en-tête seul) d'une partition sans ligne : absent de l'index
+        blocks = [block for block in blocks if block["rows"]]
+        for block in blocks:
+            entry["rows"] += block["rows"]
+        if blocks:
+            entry["min_id"], entry["max_id"] = blocks[0]["min_id"], blocks[-1]["max_id"]
+            entry["min_ts"] = min(block["min_ts"] for block in blocks)
+            entry["max_ts"] = max(block["max_ts"] for block in blocks)
+        # Taille de l'archive dans l'index : un index et une archive d'exports
+        # différents (remplacement en cours) ne sont pas associés
+        self._save_json(os.path.join(self.directory, index_name),
+                        {"size": os.path.getsize(tmp), "blocks": blocks})
+        os.replace(tmp, path)
+        return entry
+
+    def register(self, entry):
+        """
+        Rend une archive visible pour l'API, avant la suppression de sa partition :
+        ses lignes encore en base sont écartées jusqu'à mark_dropped()
+        """
+        manifest = dict(self.manifest())
+        manifest[entry["month"]] = dict(entry, partition_dropped=False)
+        self._save_manifest(manifest)
+
+    def mark_dropped(self, month):
+        """Partition de l'archive `month` (AAAA-MM) supprimée : ses lignes ne sont plus qu'ici"""
+        manifest = dict(self.manifest())
+        if month in manifest and not manifest[month].get("partition_dropped", True):
+            manifest[month] = dict(manifest[month], partition_dropped=True)
+            self._save_manifest(manifest)
+
+    # ==============================
+    # LECTURE
+    # ==============================
+    def _read(self, entry, block):
+        """Lignes d'un bloc (membre gzip lu à sa position), ou de toute une archive sans index"""
+        path = os.path.join(self.directory, entry["file"])
+        if block["offset"] is None:
+            with gzip.open(path, "rt", encoding="utf-8", newline="") as f:
+                text = f.read()
+        else:
+            with open(path, "rb") as f:
+                f.seek(block["offset"])
+                text = gzip.decompress(f.read(block["length"])).decode("utf-8")
+        reader = csv.reader(io.StringIO(text, newline=""))
+        for values in reader:
+            if values == list(history.COLUMNS):
+                continue
+            yield _parse_row(dict(zip(history.COLUMNS, values)))
+
+    def _entries(self, filters):
+        """Archives non vides dont la période recoupe [since, until["""
+        for entry in self.manifest().values():
+            if entry["rows"] and _overlaps(entry, filters):
+                yield entry
+
+    def _units(self, filters, skip_entry=None):
+        """(archive, bloc) dont la période recoupe le filtre, par ID maximal décroissant"""
+        units = []
+        for entry in self._entries(filters):
+            if skip_entry is not None and skip_entry(entry):
+                continue
+            for block in self._blocks(entry):
+                if block["rows"] and _overlaps(block, filters):
+                    units.append((entry, block))
+        units.sort(key=lambda unit: unit[1]["max_id"], reverse=True)
+        return units
+
+    def search(self, filters, before_id=None, limit=history.DEFAULT_LIMIT, min_id=None):
+        """
+        Les `limit` lignes archivées d'ID le plus élevé, dans ]min_id, before_id[,
+        qui satisfont les filtres (ID décroissant)
+        """
+        best = []
+        # Blocs d'ID maximal décroissant : on s'arrête dès qu'aucun ne peut améliorer le résultat
+        for entry, block in self._units(filters):
+            if before_id is not None and block["min_id"] >= before_id:
+                continue
+            if min_id is not None and block["max_id"] <= min_id:
+                break
+            if len(best) >= limit and block["max_id"] <= best[0][0]:
+                break
+            for row in self._read(entry, block):
+                if before_id is not None and row["id"] >= before_id:
+                    continue
+                if min_id is not None and row["id"] <= min_id:
+                    continue
+                if not history.row_matches(filters, row):
+                    continue
+                if len(best) < limit:
+                    heapq.heappush(best, (row["id"], row))
+                elif row["id"] > best[0][0]:
+                    heapq.heapreplace(best, (row["id"], row))
+        return [row for _, row in sorted(best, key=lambda item: item[0], reverse=True)]
+
+    def iter_rows(self, filters, skip_entry=None):
+        """
+        Toutes les lignes archivées du filtre, bloc par bloc (ID décroissant) ;
+        skip_entry(entrée) écarte une archive (lignes encore en base)
+        """
+        for entry, block in self._units(filters, skip_entry):
+            for row in self._read(entry, block):
+                if history.row_matches(filters, row):
+                    yield row
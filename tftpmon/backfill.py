@@ -0,0 +1,299 @@
+"""
+Reconstruction de `file_transfers` à partir de journaux historiques.
+
+Deux types de lignes sont reconnus, éventuellement mélangés, dans des fichiers
+texte ou compressés (.gz) :
+
+  - lignes tftpd-hpa (export `journalctl -o short` / `short-iso`, syslog local) :
+    elles passent par le moteur de corrélation, dont l'horloge est celle des
+    horodatages du journal. inotify n'ayant pas d'historique, chaque requête est
+    considérée comme fermée à son horodatage ; une erreur du même PID dans la
+    fenêtre WAIT_AFTER_CLOSE la marque en échec.
+  - messages "Transfert ..." du moniteur archivés par rsyslog
+    (/var/log/tftp/AAAA-MM-JJ.log), au format syslog "legacy" ou "rfc5424" :
+    déjà corrélés, ils sont rechargés tels quels. Le journal local du moniteur
+    ("➡️ RRQ | FILE=..."), dont le format dépend de LOG_CONFIG, n'est pas lu.
+
+Chaque fichier est traité par un processus distinct (ProcessPoolExecutor) qui
+insère ses résultats par lots avec `executemany`. La journalisation est
+réinstallée dans chaque processus (initializer) : celle du parent n'y survit
+pas au fork.
+
+Le rejeu est idempotent, y compris sur une période déjà couverte par le
+moniteur en service : avant chaque lot, une ligne reconstruite est écartée si
+une ligne de même IP et fichier existe en base entre `window + MATCH_SLACK`
+secondes avant et `match_after` secondes après. Le moniteur date un transfert
+réussi à sa fermeture et le backfill à la requête tftpd (la durée du transfert
+les sépare) ; un message syslog est daté à son émission, après la fermeture.
+Chaque ligne en base n'est associée qu'à une ligne reconstruite, et les lignes
+insérées par le rejeu lui-même ne comptent pas : N transferts identiques dans
+les journaux pour M en base donnent N - M insertions.
+"""
+
+import gzip
+import os
+import re
+import time
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime, timedelta
+
+from tftpmon import log, rollups, tftpd_parser
+from tftpmon.correlation import CorrelationEngine
+from tftpmon.db import Database
+from tftpmon.db_writer import INSERT_SQL
+
+logger = log.get("backfill")
+
+TRADITIONAL_TS = re.compile(r"([A-Z][a-z]{2})\s+(\d{1,2}) (\d{2}):(\d{2}):(\d{2})")
+ISO_TS = re.compile(r"(?:<\d+>1 )?(\d{4}-\d{2}-\d{2}[T ]\d{2}:\d{2}:\d{2}(?:\.\d+)?(?:[+-]\d{2}:?\d{2}|Z)?)")
+FILE_DATE = re.compile(r"(\d{4})-(\d{2})-(\d{2})")
+# "script_tracabilite: Transfert ..." (legacy) ou "script_tracabilite - - - Transfert ..."
+# (rfc5424), selon le format d'envoi et le gabarit d'écriture de rsyslog
+TRANSFER_MSG = re.compile(
+    r"script_tracabilite\S*\s+(?:-\s+)*Transfert (upload|download) \| fichier=(.+?) \| "
+    r"IP=(\S+) \| taille=(\S+) bytes \| statut=(\w+)"
+)
+
+EXISTING_SQL = """
+    SELECT id, timestamp, client_ip, filename FROM file_transfers
+    WHERE timestamp BETWEEN %s AND %s
+    ORDER BY timestamp, id
+"""
+# Avance (s) d'une ligne en base sur la ligne reconstruite, au-delà de la fenêtre
+# de corrélation : arrondi à la seconde, délai d'acheminement syslog
+MATCH_SLACK = 2
+
+MONTHS = {m: i for i, m in enumerate(
+    ("Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"), 1)}
+
+
+def open_log(path):
+    if path.endswith(".gz"):
+        return gzip.open(path, "rt", encoding="utf-8", errors="replace")
+    return open(path, encoding="utf-8", errors="replace")
+
+
+def default_year(path):
+    """Année des horodatages syslog sans année : nom AAAA-MM-JJ, sinon date du fichier"""
+    m = FILE_DATE.search(os.path.basename(path))
+    if m:
+        return int(m.group(1))
+    return datetime.fromtimestamp(os.path.getmtime(path)).year
+
+
+def parse_timestamp(line, year):
+    """Horodatage en tête de ligne (ISO 8601 / RFC 5424 ou syslog traditionnel)"""
+    m = ISO_TS.match(line)
+    if m:
+        text = m.group(1).replace("Z", "+00:00")
+        if len(text) > 5 and text[-5] in "+-" and text[-3] != ":":
+            text = f"{text[:-2]}:{text[-2:]}"
+        return datetime.fromisoformat(text).timestamp()
+    m = TRADITIONAL_TS.match(line)
+    if m:
+        month, day, hh, mm, ss = m.groups()
+        return datetime(year, MONTHS[month], int(day), int(hh), int(mm), int(ss)).timestamp()
+    return None
+
+
+def _row(tr):
+    return (
+        tr["file"],
+        tr["client_ip"],
+        tr["file_size"],
+        "upload" if tr["type"] == "WRQ" else "download",
+        tr["status"],
+        datetime.fromtimestamp(tr["timestamp"]),
+    )
+
+
+def extract_rows(path, window, since=None, until=None):
+    """Générateur des lignes file_transfers reconstruites à partir d'un fichier"""
+    year = default_year(path)
+    engine = CorrelationEngine(window, orphan_ttl=max(window * 10, 60))
+
+    with open_log(path) as f:
+        for line in f:
+            ts = parse_timestamp(line, year)
+            if ts is None:
+                continue
+            if (since is not None and ts < since) or (until is not None and ts >= until):
+                continue
+
+            parsed = tftpd_parser.parse_line(line)
+            if parsed is not None:
+                pid, result = parsed
+                if result[0] == "request":
+                    _, typ, client_ip, fname, _ = result
+                    engine.add_request(pid, typ, client_ip, fname, ts)
+                    engine.add_close(fname, "CLOSE_WRITE,CLOSE" if typ == "WRQ"
+                                     else "CLOSE_NOWRITE,CLOSE", ts, pid=pid)
+                else:
+                    engine.add_error(pid, result[1], ts)
+            else:
+                m = TRANSFER_MSG.search(line)
+                if m:
+                    db_type, fname, client_ip, size, status = m.groups()
+                    yield (fname, client_ip, int(size) if size.isdigit() else None,
+                           db_type, status.lower(), datetime.fromtimestamp(ts))
+
+            for tr in engine.collect_due(ts):
+                if tr["status"] != "unmatched":
+                    yield _row(tr)
+
+    for tr in engine.collect_due(float("inf")):
+        if tr["status"] != "unmatched":
+            yield _row(tr)
+
+
+def backfill_file(path, db_config, window, since=None, until=None,
+                  batch_size=5000, dry_run=False, match_after=60):
+    """
+    Traite un fichier (exécuté dans un processus du pool) ; renvoie (chemin,
+    lignes insérées, lignes déjà en base)
+    """
+    # Une connexion par processus du pool
+    db = None if dry_run else Database(db_config, pool_size=1)
+    existing = ExistingRows(window + MATCH_SLACK, match_after)
+    count = skipped = 0
+    batch = []
+    try:
+        for row in extract_rows(path, window, since, until):
+            batch.append(row)
+            if len(batch) >= batch_size:
+                count, skipped = _add(_flush(db, batch, existing), count, skipped)
+        count, skipped = _add(_flush(db, batch, existing), count, skipped)
+    finally:
+        if db is not None:
+            db.close()
+    return path, count, skipped
+
+
+def _add(result, count, skipped):
+    return count + result[0], skipped + result[1]
+
+
+def _second(ts):
+    """Horodatage arrondi à la seconde, comme à l'écriture dans une colonne DATETIME"""
+    return (ts + timedelta(microseconds=500000)).replace(microsecond=0)
+
+
+class ExistingRows:
+    """
+    Lignes déjà en base d'un rejeu (d'un fichier) : une ligne reconstruite
+    correspond à une ligne de même IP et fichier horodatée entre `before` s
+    avant et `after` s après, chaque ligne en base ne servant qu'une fois
+    """
+
+    def __init__(self, before, after):
+        self.before = timedelta(seconds=before)
+        self.after = timedelta(seconds=after)
+        # ID en base -> horodatage, déjà associés à une ligne reconstruite
+        self._matched = {}
+        # (seconde, IP, fichier) des lignes insérées par ce rejeu
+        self._inserted = Counter()
+
+    def _prune(self, horizon):
+        """Oublie ce qu'aucune requête ultérieure ne relira (lots dans l'ordre du journal)"""
+        self._matched = {id_: ts for id_, ts in self._matched.items() if ts >= horizon}
+        self._inserted = Counter({key: n for key, n in self._inserted.items()
+                                  if key[0] >= horizon})
+
+    def skip(self, cursor, batch):
+        """Lignes du lot absentes de la base, par horodatage croissant"""
+        batch = sorted(batch, key=lambda row: row[5])
+        low = batch[0][5] - self.before
+        self._prune(low - self.after)
+        cursor.execute(EXISTING_SQL, (low, batch[-1][5] + self.after))
+        own = Counter(self._inserted)
+        # (IP, fichier) -> [(horodatage, ID)] croissants
+        candidates = {}
+        for id_, ts, ip, fname in cursor.fetchall():
+            if id_ in self._matched:
+                continue
+            key = (ts, ip, fname)
+            if own[key]:
+                own[key] -= 1
+                continue
+            candidates.setdefault((ip, fname), deque()).append((ts, id_))
+        if not candidates:
+            return batch
+
+        rows = []
+        for row in batch:
+            queue = candidates.get((row[1], row[0]))
+            # Lignes en base trop anciennes pour celle-ci, donc pour les suivantes
+            while queue and queue[0][0] < row[5] - self.before:
+                queue.popleft()
+            if queue and queue[0][0] <= row[5] + self.after:
+                ts, id_ = queue.popleft()
+                self._matched[id_] = ts
+            else:
+                rows.append(row)
+        return rows
+
+    def inserted(self, rows):
+        self._inserted.update((_second(row[5]), row[1], row[0]) for row in rows)
+
+
+def _flush(db, batch, existing):
+    """Insère un lot ; renvoie (lignes insérées, lignes déjà en base)"""
+    n = len(batch)
+    rows = batch
+    if db is not None and batch:
+        with db.cursor("backfill_batch") as cursor:
+            rows = existing.skip(cursor, batch)
+            if rows:
+                cursor.executemany(INSERT_SQL, rows)
+                rollups.update(cursor, rows)
+        existing.inserted(rows)
+    inserted = len(rows)
+    batch.clear()
+    return inserted, n - inserted
+
+
+def expand_paths(paths):
+    """Fichiers donnés tels quels ; répertoires développés en *.log / *.log.gz"""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(sorted(
+                os.path.join(path, name) for name in os.listdir(path)
+                if name.endswith((".log", ".log.gz", ".gz"))
+            ))
+        else:
+            files.append(path)
+    return files
+
+
+def run(paths, db_config, window, workers=None, since=None, until=None, dry_run=False,
+        log_config=None, match_after=60):
+    """Traite les fichiers en parallèle et affiche la progression"""
+    paths = expand_paths(paths)
+    started = time.time()
+    total = 0
+    skipped = 0
+    failed = 0
+    with ProcessPoolExecutor(max_workers=workers, initializer=log.setup,
+                             initargs=(log_config,)) as pool:
+        futures = {
+            pool.submit(backfill_file, path, db_config, window, since, until,
+                        dry_run=dry_run, match_after=match_after): path
+            for path in paths
+        }
+        for future in as_completed(futures):
+            try:
+                path, count, existing = future.result()
+            except Exception as e:
+                failed += 1
+                logger.error("%s : %s", futures[future], e)
+                continue
+            total += count
+            skipped += existing
+            logger.info("%s : %s transfert(s), %s déjà en base", path, count, existing)
+
+    action = "reconstruits" if dry_run else "insérés"
+    logger.info("✅ %s transfert(s) %s (%s déjà en base) depuis %s fichier(s) en %.1f s",
+                total, action, skipped, len(paths) - failed, time.time() - started)
+    return total
@@ -0,0 +1,40 @@
+"""
+Point de contrôle du moniteur : curseur du journal et corrélations en cours.
+
+L'état est écrit dans un fichier temporaire puis renommé (os.replace) : un
+arrêt brutal pendant l'écriture laisse toujours le point de contrôle précédent
+intact.
+"""
+
+import json
+import os
+import time
+
+from tftpmon import log
+
+logger = log.get("checkpoint")
+
+
+def save(path, state):
+    state = dict(state, saved_at=time.time())
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(state, f, separators=(",", ":"))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def load(path):
+    """Renvoie l'état sauvegardé, ou None s'il est absent ou illisible"""
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        logger.error("Point de contrôle illisible (%s) : %s", path, e)
+        return None
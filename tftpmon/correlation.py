@@ -0,0 +1,510 @@
+"""
+Moteur de corrélation requêtes TFTP (journal) / fermetures de fichiers (inotify).
+
+Une session tftpd est identifiée par le PID du fils qui la sert. Quand la
+fermeture porte ce PID (fanotify), elle est associée à la requête du même PID,
+quel que soit le nombre de sessions simultanées sur le même fichier. Sans PID
+(inotify seul), la requête la plus ancienne du fichier est retenue, en
+écartant d'abord les sessions dont le processus a encore le fichier ouvert
+(`holds_open`, /proc/<pid>/fd).
+
+Les requêtes, erreurs et fermetures sont indexées par PID et par nom de
+fichier, les transferts en attente de validation sont rangés dans un tas trié
+sur leur échéance : chaque événement coûte O(1) (ou O(log n) pour le tas) quel
+que soit le nombre de transferts simultanés.
+
+Les événements restés sans correspondance (RRQ sans fermeture, fermeture sans
+requête, NAK d'un PID inconnu) expirent après `orphan_ttl` secondes et le nombre
+d'orphelins vivants est plafonné à `max_orphans` : la mémoire reste bornée quelle
+que soit la durée de fonctionnement du démon.
+"""
+
+import heapq
+import itertools
+import threading
+import time
+from collections import defaultdict, deque
+
+from tftpmon.metrics import Histogram
+
+# Bornes (s) de l'histogramme des attentes du verrou
+LOCK_WAIT_BUCKETS = (0.00001, 0.0001, 0.001, 0.01, 0.1, 1)
+
+
+def compatible(req_type, close_event):
+    """WRQ ↔ CLOSE_WRITE, RRQ ↔ CLOSE_NOWRITE"""
+    if req_type == "WRQ":
+        return "CLOSE_WRITE" in close_event
+    return "CLOSE_NOWRITE" in close_event
+
+
+class _TimedLock:
+    """
+    Verrou du moteur : l'attente n'est mesurée que s'il est déjà pris, une
+    acquisition libre ne coûte qu'un essai non bloquant
+    """
+
+    __slots__ = ("_lock", "wait")
+
+    def __init__(self, lock, wait):
+        self._lock = lock
+        self.wait = wait
+
+    def __enter__(self):
+        if not self._lock.acquire(False):
+            started = time.perf_counter()
+            self._lock.acquire()
+            self.wait.observe(time.perf_counter() - started)
+
+    def __exit__(self, *exc):
+        self._lock.release()
+
+
+class CorrelationEngine:
+    """Associe requêtes, fermetures et erreurs puis produit les transferts validés"""
+
+    def __init__(self, wait_after_close, orphan_ttl=300, max_orphans=50000, holds_open=None):
+        self.wait_after_close = wait_after_close
+        self.orphan_ttl = orphan_ttl
+        self.max_orphans = max_orphans
+        # holds_open(pid, fichier) -> True / False / None (inconnu) : départage des
+        # fermetures sans PID entre plusieurs sessions du même fichier
+        self.holds_open = holds_open
+
+        lock = threading.RLock()
+        self._cond = threading.Condition(lock)
+        # Attentes des lecteurs et du thread de corrélation sur le verrou (supervision)
+        self.lock_wait = Histogram(LOCK_WAIT_BUCKETS)
+        self._lock = _TimedLock(lock, self.lock_wait)
+        self._seq = itertools.count()
+
+        # Requêtes non encore associées, par fichier puis par PID (ordre d'arrivée)
+        self._requests_by_file = defaultdict(dict)
+        # Toutes les requêtes vivantes, par PID
+        self._requests_by_pid = {}
+        # Première erreur connue par PID
+        self._errors_by_pid = {}
+        # Fermetures arrivées avant leur requête : par PID (fanotify), par fichier sinon
+        self._closes_by_pid = defaultdict(deque)
+        self._closes_by_file = defaultdict(deque)
+        # Tas (check_at, seq, transfert)
+        self._pending = []
+
+        # File d'expiration (expire_at, type, objet) dans l'ordre d'arrivée ;
+        # les objets déjà associés y restent jusqu'à leur tour (suppression paresseuse)
+        self._expiry = deque()
+        self._live_orphans = 0
+        # Résultats prêts, remis au prochain _pop_due : orphelins évincés au
+        # dépassement du plafond, résultats rechargés d'un point de contrôle
+        self._ready = []
+        # Résultats retirés du moteur dont le traitement (DB, syslog) est en cours :
+        # conservés dans le point de contrôle jusqu'à la fin de process_due
+        self._emitting = []
+
+        # Curseur du journal correspondant au dernier événement intégré
+        self.cursor = None
+
+        self.counters = {
+            "evicted_requests": 0,
+            "evicted_closes": 0,
+            "evicted_errors": 0,
+            "overflow": 0,
+        }
+
+    # ==============================
+    # ENTRÉES
+    # ==============================
+    def add_request(self, pid, req_type, client_ip, filename, now=None, cursor=None):
+        """Enregistre une requête RRQ/WRQ lue dans le journal"""
+        now = time.time() if now is None else now
+        req = {
+            "file": filename,
+            "pid": pid,
+            "type": req_type,
+            "client_ip": client_ip,
+            "at": now,
+            "live": False,
+        }
+        with self._lock:
+            if cursor is not None:
+                self.cursor = cursor
+            known = self._requests_by_pid.get(pid)
+            if known is not None and known["file"] == filename and known["at"] == now:
+                # Ligne déjà intégrée (rejeu après reprise sur point de contrôle)
+                return
+            self._requests_by_pid[pid] = req
+
+            # Fermeture du même PID lue avant la ligne du journal, sinon fermeture
+            # sans PID du même fichier
+            for index, waiting in ((self._closes_by_pid, pid), (self._closes_by_file, filename)):
+                closes = index.get(waiting)
+                if not closes:
+                    continue
+                for close in closes:
+                    if compatible(req_type, close["event"]):
+                        closes.remove(close)
+                        if not closes:
+                            del index[waiting]
+                        self._untrack(close)
+                        self._schedule(req, now, close["size"], close["hash"])
+                        return
+            self._requests_by_file[filename][pid] = req
+            self._track("request", req, now)
+
+    def add_error(self, pid, reason, now=None, cursor=None):
+        """Enregistre une erreur (NAK, Connection refused) pour un PID"""
+        now = time.time() if now is None else now
+        with self._lock:
+            if cursor is not None:
+                self.cursor = cursor
+            if pid not in self._errors_by_pid:
+                error = {"pid": pid, "reason": reason, "at": now, "live": False}
+                self._errors_by_pid[pid] = error
+                self._track("error", error, now)
+
+    def add_close(self, filename, event, now=None, file_size=None, file_hash=None, pid=None):
+        """
+        Enregistre une fermeture de fichier remontée par inotify / fanotify, avec
+        la taille (et l'empreinte) relevées au moment de la fermeture et, si connu,
+        le PID du processus qui l'a faite
+        """
+        now = time.time() if now is None else now
+        closer = pid
+        if closer is None and self.holds_open is not None:
+            closer = self._probe_closer(filename, event)
+
+        with self._lock:
+            if closer is not None:
+                # PID remonté : la session est celle de ce PID, même si le nom diffère
+                # (lien symbolique, fichier réécrit par --map-file)
+                req = self._requests_by_pid.get(closer)
+                if req is not None and req["live"] and compatible(req["type"], event) \
+                        and (pid is not None or req["file"] == filename):
+                    self._match(req, now, file_size, file_hash)
+                    return
+            if pid is None:
+                # Sans PID : la plus ancienne requête compatible du fichier
+                reqs = self._requests_by_file.get(filename)
+                if reqs:
+                    for req in reqs.values():
+                        if compatible(req["type"], event):
+                            self._match(req, now, file_size, file_hash)
+                            return
+
+            # Fermeture sans requête (ligne du journal encore à venir, ou autre processus)
+            close = {"file": filename, "event": event, "at": now, "size": file_size,
+                     "hash": file_hash, "pid": pid, "live": False}
+            if pid is None:
+                self._closes_by_file[filename].append(close)
+            else:
+                self._closes_by_pid[pid].append(close)
+            self._track("close", close, now)
+
+    def _probe_closer(self, filename, event):
+        """
+        Fermeture sans PID et plusieurs sessions candidates : PID de la plus
+        ancienne dont le processus n'a plus le fichier ouvert (sondage de /proc
+        hors verrou), None s'il n'y a pas à départager
+        """
+        with self._lock:
+            reqs = self._requests_by_file.get(filename)
+            if not reqs or len(reqs) < 2:
+                return None
+            pids = [pid for pid, req in reqs.items() if compatible(req["type"], event)]
+        if len(pids) < 2:
+            return None
+        for pid in pids:
+            if self.holds_open(pid, filename) is False:
+                return pid
+        return None
+
+    def _match(self, req, now, file_size, file_hash):
+        """Associe une requête en attente à sa fermeture (verrou tenu)"""
+        reqs = self._requests_by_file[req["file"]]
+        del reqs[req["pid"]]
+        if not reqs:
+            del self._requests_by_file[req["file"]]
+        self._untrack(req)
+        self._schedule(req, now, file_size, file_hash)
+
+    # ==============================
+    # POINT DE CONTRÔLE
+    # ==============================
+    def snapshot(self):
+        """État compact (curseur + corrélations en cours) pour reprise après redémarrage"""
+        with self._cond:
+            return {
+                "cursor": self.cursor,
+                "requests": [
+                    [r["pid"], r["type"], r["client_ip"], r["file"], r["at"]]
+                    for reqs in self._requests_by_file.values() for r in reqs.values()
+                ],
+                "closes": [
+                    [c["file"], c["event"], c["at"], c["size"], c["hash"], c["pid"]]
+                    for index in (self._closes_by_file, self._closes_by_pid)
+                    for closes in index.values() for c in closes
+                ],
+                "errors": [
+                    [e["pid"], e["reason"], e["at"]]
+                    for e in self._errors_by_pid.values()
+                ],
+                "pending": [
+                    [t["pid"], t["type"], t["client_ip"], t["file"], t["file_size"],
+                     t["timestamp"], t["check_at"], t["file_hash"]]
+                    for _, _, t in self._pending
+                ],
+                # Résultats déjà sortis du moteur mais pas encore remis au gestionnaire
+                "results": [dict(r) for r in self._emitting + self._ready],
+            }
+
+    def restore(self, state):
+        """Recharge un état produit par snapshot() (moteur vide, avant démarrage)"""
+        with self._cond:
+            self.cursor = state.get("cursor")
+
+            tracked = []
+            for pid, typ, ip, fname, at in state.get("requests", []):
+                req = {"file": fname, "pid": pid, "type": typ, "client_ip": ip,
+                       "at": at, "live": False}
+                self._requests_by_pid[pid] = req
+                self._requests_by_file[fname][pid] = req
+                tracked.append((at, "request", req))
+            for fname, event, at, *meta in state.get("closes", []):
+                # Les points de contrôle antérieurs ne portaient pas taille/empreinte/PID
+                size, digest, pid = (meta + [None, None, None])[:3]
+                close = {"file": fname, "event": event, "at": at, "size": size,
+                         "hash": digest, "pid": pid, "live": False}
+                if pid is None:
+                    self._closes_by_file[fname].append(close)
+                else:
+                    self._closes_by_pid[pid].append(close)
+                tracked.append((at, "close", close))
+            for pid, reason, at in state.get("errors", []):
+                error = {"pid": pid, "reason": reason, "at": at, "live": False}
+                self._errors_by_pid[pid] = error
+                tracked.append((at, "error", error))
+
+            tracked.sort(key=lambda item: item[0])
+            for at, kind, obj in tracked:
+                self._track(kind, obj, at)
+
+            for pid, typ, ip, fname, size, ts, check_at, *meta in state.get("pending", []):
+                self._requests_by_pid[pid] = {"file": fname, "pid": pid, "type": typ,
+                                              "client_ip": ip, "at": ts, "live": False}
+                transfer = {"file": fname, "pid": pid, "type": typ, "client_ip": ip,
+                            "file_size": size, "file_hash": meta[0] if meta else None,
+                            "timestamp": ts, "check_at": check_at}
+                heapq.heappush(self._pending, (check_at, next(self._seq), transfer))
+
+            self._ready.extend(state.get("results", []))
+
+    # ==============================
+    # ORPHELINS (TTL + PLAFOND)
+    # ==============================
+    def _track(self, kind, obj, now):
+        obj["live"] = True
+        self._live_orphans += 1
+        was_empty = not self._expiry
+        self._expiry.append((now + self.orphan_ttl, kind, obj))
+        if self._live_orphans > self.max_orphans:
+            # Plafond tenu dès l'insertion : une rafale d'orphelins n'attend pas le
+            # prochain réveil du thread de corrélation (jusqu'à orphan_ttl secondes)
+            self._evict_oldest()
+            self._cond.notify()
+        elif was_empty:
+            self._cond.notify()
+
+    def _untrack(self, obj):
+        if obj["live"]:
+            obj["live"] = False
+            self._live_orphans -= 1
+
+    def _evict(self, kind, obj):
+        """Retire un orphelin de ses index et construit le résultat à remonter"""
+        self._untrack(obj)
+
+        if kind == "request":
+            reqs = self._requests_by_file.get(obj["file"])
+            if reqs and reqs.get(obj["pid"]) is obj:
+                del reqs[obj["pid"]]
+                if not reqs:
+                    del self._requests_by_file[obj["file"]]
+            # PID déjà réutilisé par une requête plus récente : on ne l'oublie pas
+            if self._requests_by_pid.get(obj["pid"]) is obj:
+                del self._requests_by_pid[obj["pid"]]
+            self.counters["evicted_requests"] += 1
+
+            # RRQ/WRQ sans fermeture : échec si une erreur a été vue, sinon timeout
+            error = self._errors_by_pid.pop(obj["pid"], None)
+            if error:
+                self._untrack(error)
+            return {
+                "file": obj["file"],
+                "pid": obj["pid"],
+                "type": obj["type"],
+                "client_ip": obj["client_ip"],
+                "file_size": None,
+                "file_hash": None,
+                "status": "failed" if error else "timeout",
+                "error": error["reason"] if error else None,
+                "timestamp": obj["at"],
+                "requested_at": obj["at"],
+            }
+
+        if kind == "close":
+            index, key = (self._closes_by_file, obj["file"]) if obj["pid"] is None \
+                else (self._closes_by_pid, obj["pid"])
+            closes = index.get(key)
+            if closes:
+                closes.remove(obj)
+                if not closes:
+                    del index[key]
+            self.counters["evicted_closes"] += 1
+            return {
+                "file": obj["file"],
+                "pid": obj["pid"],
+                "type": None,
+                "client_ip": None,
+                "file_size": None,
+                "file_hash": None,
+                "status": "unmatched",
+                "error": None,
+                "event": obj["event"],
+                "timestamp": obj["at"],
+            }
+
+        self._errors_by_pid.pop(obj["pid"], None)
+        self.counters["evicted_errors"] += 1
+        return {
+            "file": None,
+            "pid": obj["pid"],
+            "type": None,
+            "client_ip": None,
+            "file_size": None,
+            "file_hash": None,
+            "status": "unmatched",
+            "error": obj["reason"],
+            "timestamp": obj["at"],
+        }
+
+    def _evict_oldest(self):
+        """Évince l'orphelin vivant le plus ancien (plafond max_orphans atteint)"""
+        while self._expiry:
+            _, kind, obj = self._expiry.popleft()
+            if obj["live"]:
+                self.counters["overflow"] += 1
+                self._ready.append(self._evict(kind, obj))
+                return
+
+    def _pop_expired(self, now):
+        results, self._ready = self._ready, []
+        while self._expiry:
+            expire_at, kind, obj = self._expiry[0]
+            if not obj["live"]:
+                self._expiry.popleft()
+                continue
+            if expire_at > now:
+                break
+            self._expiry.popleft()
+            results.append(self._evict(kind, obj))
+        return results
+
+    # ==============================
+    # CORRÉLATION
+    # ==============================
+    def _schedule(self, req, now, file_size, file_hash):
+        """Place un transfert associé dans le tas des validations (verrou tenu)"""
+        transfer = {
+            "file": req["file"],
+            "pid": req["pid"],
+            "type": req["type"],
+            "client_ip": req["client_ip"],
+            "file_size": file_size,
+            "file_hash": file_hash,
+            "timestamp": now,
+            # Heure de la ligne RRQ/WRQ (latence de bout en bout)
+            "requested_at": req["at"],
+            "check_at": now + self.wait_after_close,
+        }
+        req["live"] = False
+        heapq.heappush(self._pending, (transfer["check_at"], next(self._seq), transfer))
+        if self._pending[0][2] is transfer:
+            self._cond.notify()
+
+    def collect_due(self, now=None):
+        """Retire et renvoie les transferts dont le délai de stabilisation est écoulé"""
+        now = time.time() if now is None else now
+        with self._lock:
+            return self._pop_due(now)
+
+    def _pop_due(self, now):
+        results = self._pop_expired(now)
+        while self._pending and self._pending[0][0] <= now:
+            _, _, tr = heapq.heappop(self._pending)
+            error = self._errors_by_pid.pop(tr["pid"], None)
+            if error:
+                self._untrack(error)
+            self._requests_by_pid.pop(tr["pid"], None)
+
+            tr["status"] = "failed" if error else "success"
+            tr["error"] = error["reason"] if error else None
+            results.append(tr)
+        return results
+
+    def _next_deadline(self):
+        deadlines = []
+        if self._pending:
+            deadlines.append(self._pending[0][0])
+        if self._expiry:
+            deadlines.append(self._expiry[0][0])
+        if self._ready:
+            deadlines.append(0)
+        return min(deadlines) if deadlines else None
+
+    def process_due(self, handler, now=None):
+        """
+        Remet à handler les transferts dus ; ils restent dans snapshot() jusqu'au
+        retour de handler (rattrapage du journal, horloge du journal)
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            due = self._emitting = self._pop_due(now)
+        self._emit(handler, due)
+
+    def _emit(self, handler, due):
+        # Traitement hors verrou : les lecteurs ne sont jamais bloqués par la DB/syslog
+        try:
+            for tr in due:
+                handler(tr)
+        finally:
+            with self._lock:
+                self._emitting = []
+
+    def run(self, handler):
+        """Boucle du thread de corrélation, réveillée par les échéances du tas"""
+        while True:
+            with self._lock:
+                while True:
+                    now = time.time()
+                    due = self._pop_due(now)
+                    if due:
+                        self._emitting = due
+                        break
+                    deadline = self._next_deadline()
+                    self._cond.wait(None if deadline is None else deadline - now)
+
+            self._emit(handler, due)
+
+    def stats(self):
+        """Profondeur des structures et compteurs d'éviction (supervision)"""
+        with self._cond:
+            stats = {
+                "requests": len(self._requests_by_pid),
+                "closes": sum(len(d) for index in (self._closes_by_file, self._closes_by_pid)
+                              for d in index.values()),
+                "errors": len(self._errors_by_pid),
+                "pending": len(self._pending),
+                "orphans": self._live_orphans,
+            }
+            stats.update(self.counters)
+            return stats
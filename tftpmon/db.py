@@ -0,0 +1,266 @@
+"""
+Accès MySQL partagé par tftp-monitor, alert-monitor et le tableau de bord.
+
+  - pool de connexions réutilisées (les plus récemment rendues d'abord),
+    bloquant quand toutes sont prêtées ; une connexion inactive depuis plus de
+    `health_check_interval` secondes est vérifiée (ping) avant d'être prêtée,
+    une connexion en erreur est fermée et remplacée ;
+  - après un échec de connexion, les demandes échouent aussitôt
+    (DatabaseUnavailable) pendant `retry_interval` secondes au lieu de
+    retenter une connexion à chaque appel ;
+  - curseurs en gestionnaire de contexte : validation (commit) en sortie
+    normale, annulation sur exception, connexion toujours rendue au pool. Une
+    transaction ne dure jamais plus d'un emprunt : une connexion réutilisée ne
+    lit pas un instantané périmé ;
+  - requêtes préparées (prepared=True) : le curseur préparé est conservé par
+    connexion et par nom d'opération ; passer la même chaîne SQL (constante
+    de module) évite une nouvelle analyse par le serveur ;
+  - latence par opération nommée (emprunt complet, lecture des lignes
+    comprise) : nombre, erreurs, cumul, maximum et histogramme.
+
+Les écritures par lots gardent un curseur classique : son executemany()
+regroupe les lignes en un seul INSERT multi-valeurs, là où un curseur
+préparé exécuterait une requête par ligne.
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+
+import mysql.connector
+from mysql.connector import errors
+
+from tftpmon import log
+
+logger = log.get("db")
+
+# Bornes (s) de l'histogramme des latences
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5)
+
+
+class DatabaseUnavailable(Exception):
+    """Base injoignable, ou pool saturé au-delà du délai d'attente"""
+
+
+# Erreurs passagères (base injoignable, connexion perdue, verrou) : l'opération
+# peut être retentée telle quelle. Les autres (valeur trop longue, ENUM
+# inconnu, contrainte) échoueront de nouveau à l'identique.
+TRANSIENT_ERRORS = (DatabaseUnavailable, errors.OperationalError, errors.InterfaceError)
+
+
+class _PooledConnection:
+    """Connexion du pool et ses curseurs préparés"""
+
+    __slots__ = ("conn", "last_used", "prepared")
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.last_used = time.monotonic()
+        # (nom d'opération, dictionary) -> curseur préparé
+        self.prepared = {}
+
+
+class Database:
+    """Pool de connexions MySQL avec vérification, reconnexion et mesures de latence"""
+
+    def __init__(self, db_config, pool_size=5, health_check_interval=30,
+                 retry_interval=5, acquire_timeout=10):
+        self.db_config = dict(db_config)
+        self.pool_size = pool_size
+        self.health_check_interval = health_check_interval
+        self.retry_interval = retry_interval
+        self.acquire_timeout = acquire_timeout
+
+        self._cond = threading.Condition()
+        # Connexions libres (pile : la plus récemment rendue sort en premier)
+        self._idle = []
+        # Connexions ouvertes, libres ou prêtées
+        self._open = 0
+        self._retry_at = 0
+
+        self._metrics = {}
+        self._metrics_lock = threading.Lock()
+        self.counters = {"connections": 0, "replaced": 0, "failures": 0, "waits": 0}
+
+    # ==============================
+    # POOL
+    # ==============================
+    def _connect(self):
+        if time.monotonic() < self._retry_at:
+            raise DatabaseUnavailable("base injoignable, nouvel essai en attente")
+        try:
+            conn = mysql.connector.connect(**self.db_config)
+        except Exception as e:
+            self.counters["failures"] += 1
+            self._retry_at = time.monotonic() + self.retry_interval
+            logger.error("Connexion impossible : %s", e)
+            raise DatabaseUnavailable(str(e)) from e
+        self.counters["connections"] += 1
+        return _PooledConnection(conn)
+
+    def _acquire(self):
+        deadline = time.monotonic() + self.acquire_timeout
+        with self._cond:
+            while True:
+                if self._idle:
+                    pooled = self._idle.pop()
+                    break
+                if self._open < self.pool_size:
+                    # Place réservée, connexion ouverte hors verrou
+                    self._open += 1
+                    pooled = None
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise DatabaseUnavailable(f"pool saturé ({self.pool_size} connexions prêtées)")
+                self.counters["waits"] += 1
+                self._cond.wait(remaining)
+
+        try:
+            if pooled is not None and \
+                    time.monotonic() - pooled.last_used > self.health_check_interval:
+                try:
+                    pooled.conn.ping()
+                except Exception:
+                    # Coupée par le serveur (wait_timeout, redémarrage) : remplacée
+                    self._discard(pooled)
+                    self.counters["replaced"] += 1
+                    pooled = None
+            if pooled is None:
+                pooled = self._connect()
+        except BaseException:
+            with self._cond:
+                self._open -= 1
+                self._cond.notify()
+            raise
+        return pooled
+
+    def _discard(self, pooled):
+        try:
+            pooled.conn.close()
+        except Exception:
+            pass
+
+    def _release(self, pooled, broken):
+        if broken:
+            self._discard(pooled)
+        else:
+            pooled.last_used = time.monotonic()
+        with self._cond:
+            if broken:
+                self._open -= 1
+            else:
+                self._idle.append(pooled)
+            self._cond.notify()
+
+    def available(self):
+        """Vrai si une connexion peut être obtenue (sans attendre la fin d'un délai de reprise)"""
+        try:
+            pooled = self._acquire()
+        except DatabaseUnavailable:
+            return False
+        self._release(pooled, False)
+        return True
+
+    def close(self):
+        """Ferme les connexions libres (les connexions prêtées le seront à leur retour)"""
+        with self._cond:
+            idle, self._idle = self._idle, []
+            self._open -= len(idle)
+        for pooled in idle:
+            self._discard(pooled)
+
+    # ==============================
+    # CURSEURS
+    # ==============================
+    @contextmanager
+    def cursor(self, name="query", dictionary=False, prepared=False):
+        """
+        Curseur sur une connexion du pool, validé en sortie ; name identifie
+        l'opération dans les mesures de latence (et le curseur préparé)
+        """
+        pooled = self._acquire()
+        started = time.perf_counter()
+        cursor = None
+        ok = broken = False
+        try:
+            if prepared:
+                key = (name, dictionary)
+                cursor = pooled.prepared.get(key)
+                if cursor is None:
+                    cursor = pooled.prepared[key] = pooled.conn.cursor(
+                        prepared=True, dictionary=dictionary)
+            else:
+                cursor = pooled.conn.cursor(dictionary=dictionary)
+            yield cursor
+            pooled.conn.commit()
+            ok = True
+        except (errors.OperationalError, errors.InterfaceError):
+            # Connexion perdue en cours de route : elle n'est pas rendue au pool
+            broken = True
+            raise
+        finally:
+            if not ok and not broken:
+                try:
+                    pooled.conn.rollback()
+                except Exception:
+                    broken = True
+            if cursor is not None and not prepared:
+                try:
+                    cursor.close()
+                except Exception:
+                    broken = True
+            self._record(name, time.perf_counter() - started, ok)
+            self._release(pooled, broken)
+
+    def fetch_all(self, name, sql, params=None, dictionary=True, prepared=False):
+        with self.cursor(name, dictionary, prepared) as cursor:
+            cursor.execute(sql, params)
+            return cursor.fetchall()
+
+    def fetch_one(self, name, sql, params=None, dictionary=True, prepared=False):
+        with self.cursor(name, dictionary, prepared) as cursor:
+            cursor.execute(sql, params)
+            rows = cursor.fetchall()
+            return rows[0] if rows else None
+
+    # ==============================
+    # MESURES
+    # ==============================
+    def _record(self, name, seconds, ok):
+        with self._metrics_lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = {
+                    "count": 0, "errors": 0, "total": 0.0, "max": 0.0,
+                    "buckets": [0] * (len(LATENCY_BUCKETS) + 1),
+                }
+            metric["count"] += 1
+            if not ok:
+                metric["errors"] += 1
+            metric["total"] += seconds
+            metric["max"] = max(metric["max"], seconds)
+            for i, bound in enumerate(LATENCY_BUCKETS):
+                if seconds <= bound:
+                    break
+            else:
+                i = len(LATENCY_BUCKETS)
+            metric["buckets"][i] += 1
+
+    def metrics(self):
+        """Copie des mesures : {opération: {count, errors, total, max, buckets}}"""
+        with self._metrics_lock:
+            return {name: dict(metric, buckets=list(metric["buckets"]))
+                    for name, metric in self._metrics.items()}
+
+    def pool_status(self):
+        with self._cond:
+            return {"size": self.pool_size, "open": self._open, "idle": len(self._idle)}
+
+    def summary(self):
+        """Résumé d'une ligne pour les journaux : pool et latence moyenne par opération"""
+        pool = self.pool_status()
+        latencies = " ".join(
+            f"{name}={metric['total'] / metric['count'] * 1000:.1f}ms/{metric['count']}"
+            for name, metric in sorted(self.metrics().items()) if metric["count"])
+        return f"pool={pool['open'] - pool['idle']}/{pool['open']}/{pool['size']} {latencies}"
@@ -0,0 +1,318 @@
+"""
+Écriture asynchrone des transferts dans MySQL.
+
+Le corrélateur dépose les lignes dans une file ; un thread dédié les insère par
+lots (`executemany`) sur une connexion du pool partagé (tftpmon.db), à chaque
+remplissage du lot ou après `flush_interval` secondes. Si la base est injoignable, les lignes sont
+écrites dans un fichier tampon local (JSON lines) puis réinjectées dès que la
+connexion revient : aucun transfert n'est perdu et le chemin critique ne fait
+jamais d'I/O réseau.
+
+Seules les erreurs passagères (tftpmon.db.TRANSIENT_ERRORS) renvoient un lot
+vers le tampon. Sur toute autre erreur (nom trop long, statut inconnu de
+l'ENUM...), le lot est réessayé ligne par ligne et les lignes encore refusées
+sont écartées dans un fichier de rejets (`dead_letter_file`), avec l'erreur :
+une ligne invalide ne bloque jamais le tampon ni les lignes qui la suivent.
+
+Les tables d'agrégats (tftpmon.rollups) sont mises à jour dans la transaction
+de chaque lot.
+
+`latency` mesure, pour chaque ligne validée, le délai entre la ligne de
+journal RRQ/WRQ d'origine et la validation de son lot (corrélation, attente
+de stabilisation, file et insertion comprises), par statut.
+"""
+
+import itertools
+import json
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+
+from tftpmon import log, rollups
+from tftpmon.db import TRANSIENT_ERRORS
+from tftpmon.metrics import Histogram
+
+logger = log.get("db")
+spool_logger = log.get("db.spool")
+
+INSERT_SQL = """
+    INSERT INTO file_transfers
+    (filename, client_ip, file_size, transfer_type, status, timestamp)
+    VALUES (%s, %s, %s, %s, %s, %s)
+"""
+
+COLUMNS = ("filename", "client_ip", "file_size", "transfer_type", "status", "timestamp")
+
+# Bornes (s) de l'histogramme journal -> base
+LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300, 600)
+
+
+class TransferWriter:
+    """Thread d'écriture par lots avec tampon disque ; db : tftpmon.db.Database"""
+
+    def __init__(self, db, batch_size=200, flush_interval=1.0,
+                 spool_file="/var/lib/tftp-monitor/spool.jsonl",
+                 max_queue=100000, retry_interval=5,
+                 dead_letter_file="/var/lib/tftp-monitor/rejected.jsonl"):
+        self.db = db
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.spool_file = spool_file
+        self.dead_letter_file = dead_letter_file
+        self.retry_interval = retry_interval
+
+        self._queue = queue.Queue(maxsize=max_queue)
+        # Lignes déposées ni insérées ni écrites sur disque (en file ou en cours
+        # d'insertion), par numéro de dépôt : reprises à l'arrêt du service
+        self._unsaved = {}
+        self._unsaved_lock = threading.Lock()
+        self._seq = itertools.count()
+        self._stop = threading.Event()
+        self._thread = None
+        # Après une erreur d'insertion, pas de réinjection du tampon avant cette date
+        self._retry_at = 0
+        self._spool_lock = threading.Lock()
+
+        self.counters = {"inserted": 0, "batches": 0, "spooled": 0, "replayed": 0,
+                         "rejected": 0}
+        self.latency = Histogram(LATENCY_BUCKETS, ("status",))
+
+    # ==============================
+    # API CORRÉLATEUR
+    # ==============================
+    def submit(self, filename, transfer_type, status, client_ip, file_size, timestamp,
+               origin=None):
+        """
+        Dépose un transfert à écrire (non bloquant) ; origin : heure de la ligne
+        de journal d'origine, pour la mesure de latence (None : non mesuré)
+        """
+        row = (filename, client_ip, file_size, transfer_type, status,
+               datetime.fromtimestamp(timestamp))
+        seq = next(self._seq)
+        with self._unsaved_lock:
+            self._unsaved[seq] = row
+        try:
+            self._queue.put_nowait((seq, row, origin))
+        except queue.Full:
+            # File saturée (base lente) : on bascule directement sur le tampon disque
+            self._spool([row])
+            self._saved([seq])
+
+    def start(self):
+        self._thread = threading.Thread(target=self.run, daemon=True, name="db-writer")
+        self._thread.start()
+        return self
+
+    def queue_depth(self):
+        return self._queue.qsize()
+
+    def _saved(self, seqs):
+        with self._unsaved_lock:
+            for seq in seqs:
+                self._unsaved.pop(seq, None)
+
+    def unsaved_records(self):
+        """
+        Lignes déposées ni en base ni sur disque (file, lot en cours), au format
+        du tampon disque : conservées dans le point de contrôle du moniteur
+        """
+        with self._unsaved_lock:
+            return [_record(row) for row in self._unsaved.values()]
+
+    def spool_records(self, records):
+        """Ajoute au tampon disque des lignes au format unsaved_records() (reprise)"""
+        if not records:
+            return
+        with self._spool_lock:
+            try:
+                _append_lines(self.spool_file, records)
+                self.counters["spooled"] += len(records)
+                spool_logger.info("💾 %s transfert(s) du point de contrôle mis en attente sur disque",
+                                  len(records))
+            except Exception as e:
+                spool_logger.error("%s", e)
+
+    def shutdown(self, timeout=10):
+        """
+        Arrêt du service : le lot en cours d'insertion est terminé (au plus
+        `timeout` secondes), puis tout ce qui n'est pas en base part dans le
+        tampon disque
+        """
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            if self._thread.is_alive():
+                logger.warning("Insertion toujours en cours après %s s : lot mis en tampon "
+                               "(possible doublon s'il est finalement validé)", timeout)
+        with self._unsaved_lock:
+            rows = list(self._unsaved.values())
+            self._unsaved.clear()
+        if rows:
+            self._spool(rows)
+
+    # ==============================
+    # INSERTION
+    # ==============================
+    def _insert(self, rows):
+        """
+        Insère un lot ; renvoie (lignes insérées, lignes à retenter). Les lignes
+        refusées pour une erreur non passagère sont écartées dans les rejets
+        """
+        try:
+            with self.db.cursor("insert_batch") as cursor:
+                cursor.executemany(INSERT_SQL, rows)
+                # Agrégats du tableau de bord, dans la même transaction
+                rollups.update(cursor, rows)
+        except TRANSIENT_ERRORS as e:
+            logger.error("%s", e)
+            self._retry_at = time.time() + self.retry_interval
+            return [], rows
+        except Exception as e:
+            logger.error("Lot refusé (%s) : insertion ligne par ligne", e)
+            return self._insert_rows(rows)
+
+        self.counters["inserted"] += len(rows)
+        self.counters["batches"] += 1
+        return rows, []
+
+    def _insert_rows(self, rows):
+        """Insère ligne par ligne un lot refusé, pour n'écarter que les lignes invalides"""
+        inserted = []
+        for i, row in enumerate(rows):
+            try:
+                with self.db.cursor("insert_row") as cursor:
+                    cursor.execute(INSERT_SQL, row)
+                    rollups.update(cursor, [row])
+            except TRANSIENT_ERRORS as e:
+                logger.error("%s", e)
+                self._retry_at = time.time() + self.retry_interval
+                return inserted, rows[i:]
+            except Exception as e:
+                self._reject(row, e)
+                continue
+            inserted.append(row)
+            self.counters["inserted"] += 1
+        return inserted, []
+
+    def _reject(self, row, error):
+        self.counters["rejected"] += 1
+        logger.error("Ligne rejetée (%s) : %s", error, row)
+        if not self.dead_letter_file:
+            return
+        try:
+            record = _record(row)
+            record["error"] = str(error)
+            # Seul le thread d'écriture insère : pas de verrou (_spool_lock est
+            # déjà tenu pendant la réinjection du tampon)
+            _append_lines(self.dead_letter_file, [record])
+        except Exception as e:
+            logger.error("Fichier de rejets : %s", e)
+
+    # ==============================
+    # TAMPON DISQUE
+    # ==============================
+    def _write_spool(self, rows, mode):
+        _append_lines(self.spool_file, [_record(row) for row in rows], mode)
+
+    def _spool(self, rows):
+        with self._spool_lock:
+            try:
+                self._write_spool(rows, "a")
+                self.counters["spooled"] += len(rows)
+                spool_logger.info("💾 %s transfert(s) mis en attente sur disque", len(rows))
+            except Exception as e:
+                spool_logger.error("%s", e)
+
+    def _replay_spool(self):
+        """Réinjecte le tampon disque une fois la base revenue"""
+        with self._spool_lock:
+            if not os.path.exists(self.spool_file) or os.path.getsize(self.spool_file) == 0:
+                return
+            rows = []
+            with open(self.spool_file, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue
+                    record["timestamp"] = datetime.fromisoformat(record["timestamp"])
+                    rows.append(tuple(record[c] for c in COLUMNS))
+
+            replayed = 0
+            for i in range(0, len(rows), self.batch_size):
+                inserted, rest = self._insert(rows[i:i + self.batch_size])
+                replayed += len(inserted)
+                if rest:
+                    # Réécrit uniquement ce qui n'a pas pu être inséré
+                    self._write_spool(rest + rows[i + self.batch_size:], "w")
+                    self.counters["replayed"] += replayed
+                    return
+
+            os.truncate(self.spool_file, 0)
+            self.counters["replayed"] += replayed
+            spool_logger.info("✅ %s transfert(s) réinjecté(s) depuis le disque", replayed)
+
+    # ==============================
+    # BOUCLE D'ÉCRITURE
+    # ==============================
+    def _next_batch(self):
+        try:
+            batch = [self._queue.get(timeout=self.flush_interval)]
+        except queue.Empty:
+            return []
+        deadline = time.time() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def run(self):
+        spool_pending = True
+        while not self._stop.is_set():
+            batch = self._next_batch()
+
+            if spool_pending and not self._stop.is_set() and time.time() >= self._retry_at \
+                    and self.db.available():
+                self._replay_spool()
+                spool_pending = os.path.exists(self.spool_file) and \
+                    os.path.getsize(self.spool_file) > 0
+
+            if not batch:
+                continue
+
+            inserted, rest = self._insert([row for _, row, _ in batch])
+            if rest:
+                self._spool(rest)
+                spool_pending = True
+            # Lignes en base, écartées ou sur disque : plus rien à reprendre à l'arrêt
+            self._saved([seq for seq, _, _ in batch])
+            if inserted:
+                now = time.time()
+                written = set(map(id, inserted))
+                for _, row, origin in batch:
+                    if origin is not None and id(row) in written:
+                        self.latency.observe(now - origin, row[4])
+                logger.info("✅ %s transfert(s) insérés", len(inserted))
+
+
+def _record(row):
+    record = dict(zip(COLUMNS, row))
+    record["timestamp"] = record["timestamp"].isoformat()
+    return record
+
+
+def _append_lines(path, records, mode="a"):
+    """Écrit des enregistrements JSON lines (tampon disque, rejets)"""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, mode, encoding="utf-8") as f:
+        for record in records:
+            f.write(json.dumps(record) + "\n")
@@ -0,0 +1,249 @@
+"""
+Envoi asynchrone des alertes par e-mail.
+
+La boucle de détection ne fait que déposer une alerte ; un thread dédié la
+transmet sur une session SMTP réutilisée (connexion + STARTTLS + login une
+seule fois, fermée après `idle_timeout` secondes sans envoi).
+
+  - regroupement : la première alerte d'une clé (règle, IP) part aussitôt, les
+    suivantes de la même clé pendant `coalesce_window` secondes sont réunies
+    dans un seul message récapitulatif envoyé en fin de fenêtre (les
+    `max_digest_bodies` premières en détail, les autres seulement comptées) ;
+  - limitation : au plus `max_per_minute` messages par minute, les autres
+    attendent (et continuent d'être regroupés) dans une file bornée à
+    `max_queue` messages ;
+  - reprise : en cas d'échec SMTP la session est refermée et l'envoi retenté
+    avec un délai exponentiel, le message étant abandonné après `max_attempts`.
+"""
+
+import heapq
+import smtplib
+import threading
+import time
+from collections import deque
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+
+from tftpmon import log
+from tftpmon.metrics import Histogram
+
+logger = log.get("email")
+
+# Bornes (s) de l'histogramme des envois SMTP
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+DIGEST_SEPARATOR = "\n\n" + "-" * 40 + "\n\n"
+
+
+class EmailDispatcher:
+    """Thread d'envoi SMTP à session persistante, avec regroupement et reprise"""
+
+    def __init__(self, email_config, coalesce_window=300, max_per_minute=10,
+                 max_attempts=5, retry_base=5, retry_max=300, idle_timeout=60,
+                 max_queue=1000, max_digest_bodies=50):
+        self.config = email_config
+        self.coalesce_window = coalesce_window
+        self.max_per_minute = max_per_minute
+        self.max_attempts = max_attempts
+        self.retry_base = retry_base
+        self.retry_max = retry_max
+        self.idle_timeout = idle_timeout
+        self.max_queue = max_queue
+        self.max_digest_bodies = max_digest_bodies
+
+        self._cond = threading.Condition()
+        # Messages prêts : [sujet, corps, tentatives]
+        self._outbox = deque()
+        # clé -> {"subject", "bodies", "count", "flush_at"} pendant la fenêtre de
+        # regroupement ; bodies est borné, count compte toutes les alertes
+        self._digests = {}
+        # Échéances des fenêtres : tas de (flush_at, clé)
+        self._deadlines = []
+        # Horodatages des derniers envois (limitation par minute)
+        self._sent_times = deque()
+        self._retry_at = 0
+        self._smtp = None
+        self._last_used = 0
+
+        self.counters = {"sent": 0, "coalesced": 0, "retries": 0, "failed": 0,
+                         "dropped": 0, "sessions": 0}
+        # Durée d'un envoi (ouverture de session comprise), par résultat
+        self.latency = Histogram(LATENCY_BUCKETS, ("outcome",))
+
+    # ==============================
+    # API DÉTECTION
+    # ==============================
+    def send(self, subject, body, key=None):
+        """Dépose une alerte (non bloquant) ; key regroupe les alertes répétées"""
+        now = time.time()
+        with self._cond:
+            digest = self._digests.get(key) if key is not None else None
+            if digest is not None:
+                # Rafale : mémoire et taille du récapitulatif bornées
+                if len(digest["bodies"]) < self.max_digest_bodies:
+                    digest["bodies"].append(body)
+                digest["count"] += 1
+                digest["subject"] = subject
+                self.counters["coalesced"] += 1
+                return
+            self._enqueue(subject, body)
+            if key is not None:
+                flush_at = now + self.coalesce_window
+                self._digests[key] = {"subject": subject, "bodies": [], "count": 0,
+                                     "flush_at": flush_at}
+                heapq.heappush(self._deadlines, (flush_at, key))
+            self._cond.notify()
+
+    def start(self):
+        threading.Thread(target=self.run, daemon=True, name="email-dispatcher").start()
+        return self
+
+    def queue_depth(self):
+        return len(self._outbox)
+
+    # ==============================
+    # REGROUPEMENT / LIMITATION
+    # ==============================
+    def _enqueue(self, subject, body):
+        if len(self._outbox) >= self.max_queue:
+            self.counters["dropped"] += 1
+            return
+        self._outbox.append([subject, body, 0])
+
+    def _flush_digests(self, now):
+        """Transforme les fenêtres échues en messages récapitulatifs ; renvoie la prochaine échéance"""
+        deadlines = self._deadlines
+        while deadlines and deadlines[0][0] <= now:
+            flush_at, key = heapq.heappop(deadlines)
+            digest = self._digests.get(key)
+            if digest is None or digest["flush_at"] != flush_at:
+                continue
+            bodies, count = digest["bodies"], digest["count"]
+            if not count:
+                # Plus d'alerte pour cette clé : la suivante repartira immédiatement
+                del self._digests[key]
+                continue
+            body = DIGEST_SEPARATOR.join(bodies)
+            if count > len(bodies):
+                body += f"{DIGEST_SEPARATOR}… et {count - len(bodies)} autre(s)"
+            self._enqueue(f"[{count} alerte(s) regroupée(s)] {digest['subject']}", body)
+            # Flux continu : une nouvelle fenêtre s'ouvre
+            digest["bodies"] = []
+            digest["count"] = 0
+            digest["flush_at"] = now + self.coalesce_window
+            heapq.heappush(deadlines, (digest["flush_at"], key))
+        return deadlines[0][0] if deadlines else None
+
+    def _throttle_delay(self, now):
+        while self._sent_times and self._sent_times[0] <= now - 60:
+            self._sent_times.popleft()
+        if len(self._sent_times) < self.max_per_minute:
+            return 0
+        return self._sent_times[0] + 60 - now
+
+    def _next_message(self):
+        """
+        Attend qu'un message puisse partir ; le retire de la file et le renvoie.
+        Renvoie None quand la session SMTP inactive doit être fermée.
+        """
+        with self._cond:
+            while True:
+                now = time.time()
+                next_flush = self._flush_digests(now)
+                delay = None
+                if self._outbox:
+                    delay = max(self._retry_at - now, self._throttle_delay(now))
+                    if delay <= 0:
+                        return self._outbox.popleft()
+                if next_flush is not None:
+                    delay = min(delay, next_flush - now) if delay is not None else next_flush - now
+                if self._smtp is not None:
+                    idle = self._last_used + self.idle_timeout - now
+                    if idle <= 0:
+                        return None
+                    delay = min(delay, idle) if delay is not None else idle
+                self._cond.wait(delay)
+
+    # ==============================
+    # SESSION SMTP
+    # ==============================
+    def _connect(self):
+        smtp = smtplib.SMTP(self.config["smtp_server"], self.config["smtp_port"], timeout=30)
+        try:
+            if self.config.get("use_tls", True):
+                smtp.starttls()
+            if self.config.get("sender_password"):
+                smtp.login(self.config["sender_email"], self.config["sender_password"])
+        except (smtplib.SMTPException, OSError):
+            # Échec après connexion (TLS, authentification) : socket refermée
+            smtp.close()
+            raise
+        self.counters["sessions"] += 1
+        return smtp
+
+    def _close(self):
+        if self._smtp is not None:
+            try:
+                self._smtp.quit()
+            except (smtplib.SMTPException, OSError):
+                # quit() impossible (session rompue) : la socket est fermée quand même
+                self._smtp.close()
+            self._smtp = None
+
+    def _transmit(self, subject, body):
+        msg = MIMEMultipart()
+        msg['From'] = self.config["sender_email"]
+        msg['To'] = self.config["recipient_email"]
+        msg['Subject'] = subject
+        msg.attach(MIMEText(body, 'plain'))
+
+        if self._smtp is not None:
+            try:
+                self._smtp.send_message(msg)
+                self._last_used = time.time()
+                return
+            except smtplib.SMTPServerDisconnected:
+                # Session fermée par le serveur pendant l'inactivité : reconnexion immédiate
+                self._close()
+        self._smtp = self._connect()
+        self._smtp.send_message(msg)
+        self._last_used = time.time()
+
+    # ==============================
+    # BOUCLE D'ENVOI
+    # ==============================
+    def run(self):
+        failures = 0
+        while True:
+            message = self._next_message()
+            if message is None:
+                self._close()
+                continue
+            subject, body, attempts = message
+            started = time.perf_counter()
+            try:
+                self._transmit(subject, body)
+            except (smtplib.SMTPException, OSError) as e:
+                self.latency.observe(time.perf_counter() - started, "error")
+                # Session refermée (et non simplement oubliée) avant la reconnexion
+                self._close()
+                failures += 1
+                message[2] = attempts + 1
+                delay = min(self.retry_base * 2 ** (failures - 1), self.retry_max)
+                with self._cond:
+                    if message[2] >= self.max_attempts:
+                        self.counters["failed"] += 1
+                        logger.error("%s - alerte abandonnée : %s", e, subject)
+                    else:
+                        self.counters["retries"] += 1
+                        self._outbox.appendleft(message)
+                        logger.error("%s - nouvel essai dans %s s", e, delay)
+                    self._retry_at = time.time() + delay
+                continue
+
+            self.latency.observe(time.perf_counter() - started, "sent")
+            failures = 0
+            with self._cond:
+                self._sent_times.append(time.time())
+                self.counters["sent"] += 1
+            logger.info("✅ Alerte envoyée : %s", subject)
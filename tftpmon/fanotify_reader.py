@@ -0,0 +1,160 @@
+"""
+PID des processus qui ferment les fichiers de la racine TFTP.
+
+inotify signale les fermetures sans dire qui les a faites. fanotify (fanotify_init
+/ fanotify_mark via ctypes, CAP_SYS_ADMIN requis) remonte pour chaque fermeture
+le PID du processus : celui du fils tftpd qui sert la session, le même que dans
+la ligne RRQ/WRQ du journal. Le moteur de corrélation associe alors fermeture et
+requête par PID, exactement, même quand des dizaines de sessions lisent le
+même fichier.
+
+Les marques sont posées sur chaque répertoire de l'arborescence (fermetures
+des fichiers enfants), tenues à jour par le RecursiveWatcher d'inotify_reader
+qui continue de remonter créations, suppressions et renommages.
+
+Sans fanotify, holds_open() sert de repli : parmi les sessions candidates, un
+processus qui a encore le fichier ouvert (/proc/<pid>/fd) n'est pas celui qui
+vient de le fermer.
+"""
+
+import ctypes
+import ctypes.util
+import os
+import struct
+
+from tftpmon import log
+
+logger = log.get("fanotify")
+
+FAN_CLOSE_WRITE = 0x00000008
+FAN_CLOSE_NOWRITE = 0x00000010
+FAN_Q_OVERFLOW = 0x00004000
+FAN_EVENT_ON_CHILD = 0x08000000
+
+FAN_CLOEXEC = 0x00000001
+FAN_CLASS_NOTIF = 0x00000000
+FAN_UNLIMITED_MARKS = 0x00000020
+FAN_MARK_ADD = 0x00000001
+FAN_MARK_REMOVE = 0x00000002
+FAN_NOFD = -1
+
+AT_FDCWD = -100
+
+# Mêmes bits qu'inotify (IN_CLOSE_WRITE, IN_CLOSE_NOWRITE, IN_Q_OVERFLOW) :
+# les masques se traduisent avec inotify_reader.mask_to_str
+CLOSE_MASK = FAN_CLOSE_WRITE | FAN_CLOSE_NOWRITE
+
+# struct fanotify_event_metadata
+_METADATA = struct.Struct("=IBBHQii")
+_READ_SIZE = 64 * 1024
+
+_libc = None
+
+
+def _load_libc():
+    global _libc
+    if _libc is None:
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        libc.fanotify_init.argtypes = [ctypes.c_uint, ctypes.c_uint]
+        libc.fanotify_mark.argtypes = [ctypes.c_int, ctypes.c_uint, ctypes.c_uint64,
+                                       ctypes.c_int, ctypes.c_char_p]
+        _libc = libc
+    return _libc
+
+
+def available():
+    try:
+        return hasattr(_load_libc(), "fanotify_init")
+    except OSError:
+        return False
+
+
+class CloseWatcher:
+    """Descripteur fanotify : fermetures des fichiers, avec le PID de leur auteur"""
+
+    def __init__(self, root):
+        self._libc = _load_libc()
+        # Une marque par répertoire : pas de plafond (8192 par défaut), comme
+        # fs.inotify.max_user_watches relevé pour les grandes arborescences
+        self.fd = self._libc.fanotify_init(FAN_CLOEXEC | FAN_CLASS_NOTIF | FAN_UNLIMITED_MARKS,
+                                           os.O_RDONLY | os.O_LARGEFILE | os.O_CLOEXEC)
+        if self.fd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err))
+        self.root = root
+        # Chemins remontés par le noyau : absolus et résolus
+        self._prefix = os.path.join(os.path.realpath(root), "")
+        self.mark_failures = 0
+
+    def add(self, relpath):
+        """Marque un répertoire (relatif à la racine) ; False en cas d'échec"""
+        path = os.path.join(self.root, relpath) if relpath else self.root
+        if self._libc.fanotify_mark(self.fd, FAN_MARK_ADD, CLOSE_MASK | FAN_EVENT_ON_CHILD,
+                                    AT_FDCWD, os.fsencode(path)) < 0:
+            self.mark_failures += 1
+            return False
+        return True
+
+    def remove(self, relpath):
+        # Marque déjà retirée par le noyau si le répertoire a été supprimé ; un
+        # répertoire déplacé hors de la racine est écarté à la lecture (préfixe)
+        self._libc.fanotify_mark(self.fd, FAN_MARK_REMOVE, CLOSE_MASK | FAN_EVENT_ON_CHILD,
+                                 AT_FDCWD, os.fsencode(os.path.join(self.root, relpath)))
+
+    def events(self):
+        """Lit un bloc et renvoie (chemin relatif, masque, pid) ; pid en chaîne comme le journal"""
+        data = os.read(self.fd, _READ_SIZE)
+        result = []
+        offset = 0
+        end = len(data)
+        while offset + _METADATA.size <= end:
+            event_len, _, _, _, mask, fd, pid = _METADATA.unpack_from(data, offset)
+            offset += event_len
+            if fd == FAN_NOFD:
+                if mask & FAN_Q_OVERFLOW:
+                    result.append(("", mask, None))
+                continue
+            try:
+                path = os.readlink(f"/proc/self/fd/{fd}")
+            except OSError:
+                continue
+            finally:
+                os.close(fd)
+            if path.startswith(self._prefix):
+                result.append((path[len(self._prefix):], mask, str(pid)))
+        return result
+
+    def close(self):
+        os.close(self.fd)
+
+
+def open_watcher(root):
+    """CloseWatcher sur root, ou None si fanotify est indisponible (noyau, droits)"""
+    if not available():
+        return None
+    try:
+        return CloseWatcher(root)
+    except OSError as e:
+        logger.warning("fanotify indisponible (%s) : fermetures associées sans PID", e)
+        return None
+
+
+def holds_open(pid, path):
+    """
+    Vrai si le processus pid a encore path (absolu) ouvert, False s'il ne l'a
+    pas (ou s'est terminé), None si /proc/<pid>/fd est illisible
+    """
+    fd_dir = f"/proc/{pid}/fd"
+    try:
+        fds = os.listdir(fd_dir)
+    except FileNotFoundError:
+        return False
+    except OSError:
+        return None
+    for fd in fds:
+        try:
+            if os.readlink(f"{fd_dir}/{fd}") == path:
+                return True
+        except OSError:
+            continue
+    return False
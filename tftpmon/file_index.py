@@ -0,0 +1,114 @@
+"""
+Index en mémoire des fichiers de la racine TFTP (taille, mtime, empreinte).
+
+Construit une fois au démarrage avec os.scandir (récursivement, les clés sont
+les chemins relatifs à la racine), puis tenu à jour par les événements inotify : la taille d'un fichier transféré est une simple lecture de
+dictionnaire au lieu d'un os.path.getsize (coûteux sur une racine NFS) fait au
+moment de la corrélation, alors que le fichier a pu être réécrit entre-temps.
+"""
+
+import hashlib
+import os
+from collections import Counter
+
+# Événements qui (re)définissent le contenu d'un fichier
+_UPDATE_EVENTS = ("CLOSE_WRITE", "MOVED_TO", "CREATE")
+# Événements qui le font disparaître
+_REMOVE_EVENTS = ("DELETE", "MOVED_FROM")
+
+
+class FileIndex:
+    """Métadonnées des fichiers servis, indexées par nom relatif"""
+
+    def __init__(self, root_directory, hash_algorithm=None):
+        self.root_directory = root_directory
+        self.hash_algorithm = hash_algorithm
+        self.files = {}
+        # Le calcul d'empreinte ouvre le fichier et provoque un CLOSE_NOWRITE
+        # qu'il ne faut pas prendre pour un RRQ : on compte ces fermetures
+        # tant que le répertoire est surveillé
+        self.watching = False
+        self._own_closes = Counter()
+
+    def build(self):
+        """
+        Parcours initial de la racine, à faire avant la pose des watches (le
+        parcours ouvre chaque répertoire). Refait après un débordement de file inotify.
+        """
+        files = {}
+        self._scan("", files)
+        self.files = files
+        return len(files)
+
+    def _scan(self, relpath, files):
+        stack = [relpath]
+        while stack:
+            current = stack.pop()
+            path = os.path.join(self.root_directory, current) if current else self.root_directory
+            try:
+                with os.scandir(path) as it:
+                    for entry in it:
+                        name = f"{current}/{entry.name}" if current else entry.name
+                        if entry.is_dir(follow_symlinks=False):
+                            stack.append(name)
+                        elif entry.is_file(follow_symlinks=False):
+                            files[name] = self._metadata(entry.path,
+                                                         entry.stat(follow_symlinks=False))
+            except OSError:
+                continue
+
+    def _metadata(self, path, st):
+        meta = {"size": st.st_size, "mtime": st.st_mtime, "hash": None}
+        if self.hash_algorithm:
+            meta["hash"] = self._digest(path)
+        return meta
+
+    def _digest(self, path):
+        try:
+            f = open(path, "rb")
+        except OSError:
+            return None
+        if self.watching:
+            self._own_closes[os.path.relpath(path, self.root_directory)] += 1
+
+        h = hashlib.new(self.hash_algorithm)
+        with f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                h.update(chunk)
+        return h.hexdigest()
+
+    def apply(self, name, event):
+        """Met à jour l'index à partir d'un événement inotify (notation inotifywait)"""
+        if "ISDIR" in event:
+            if any(e in event for e in _REMOVE_EVENTS):
+                prefix = name + "/"
+                for path in [p for p in self.files if p.startswith(prefix)]:
+                    del self.files[path]
+            elif "MOVED_TO" in event or "CREATE" in event:
+                # Répertoire arrivé avec son contenu (mv, ou fichiers créés avant le watch)
+                self._scan(name, self.files)
+            return
+        if any(e in event for e in _REMOVE_EVENTS):
+            self.files.pop(name, None)
+        elif any(e in event for e in _UPDATE_EVENTS):
+            path = os.path.join(self.root_directory, name)
+            try:
+                self.files[name] = self._metadata(path, os.stat(path))
+            except OSError:
+                self.files.pop(name, None)
+
+    def own_close(self, name, event):
+        """Vrai si cette fermeture provient de notre propre lecture (empreinte)"""
+        if "CLOSE_NOWRITE" in event and self._own_closes.get(name):
+            self._own_closes[name] -= 1
+            if not self._own_closes[name]:
+                del self._own_closes[name]
+            return True
+        return False
+
+    def get(self, name):
+        return self.files.get(name)
+
+    def size(self, name):
+        meta = self.files.get(name)
+        return meta["size"] if meta else None
@@ -0,0 +1,233 @@
+"""
+Recherche dans l'historique des transferts (API /api/history du tableau de bord).
+
+Filtres : période [since, until[, IP exacte ou sous-réseau CIDR, nom de fichier
+exact ou préfixe, type et statut (plusieurs valeurs séparées par des virgules).
+
+Pagination par curseur (keyset) : les résultats sont triés par ID décroissant
+et la page suivante reprend à `id < cursor`. Chaque page est une requête
+bornée servie par un index composite (filename, id), (client_ip_bin, id) ou
+(status, timestamp), quelle que soit la profondeur dans l'historique, là où
+un OFFSET relirait toutes les lignes sautées.
+
+L'export (CSV / NDJSON) parcourt le résultat par lots successifs de la même
+façon : la mémoire utilisée ne dépend pas du nombre de lignes exportées. Chaque
+lot est lu sur son propre curseur, rendu au pool avant l'envoi des lignes : un
+client lent ne garde pas de connexion pendant tout le téléchargement.
+
+Les mois archivés hors de la base (tftpmon.archive) restent interrogeables :
+les pages sont complétées par les lignes des archives (mêmes filtres, appliqués
+en Python par row_matches), l'export les ajoute après les lignes en base. Les
+noms de fichier y sont comparés sans tenir compte de la casse, comme le fait
+la collation par défaut de MySQL pour `=` et `LIKE`.
+"""
+
+import csv
+import io
+import ipaddress
+import json
+from datetime import datetime
+
+COLUMNS = ("id", "filename", "client_ip", "file_size", "transfer_type", "status", "timestamp")
+TRANSFER_TYPES = ("upload", "download")
+STATUSES = ("success", "failed", "timeout")
+
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 1000
+EXPORT_BATCH = 1000
+
+
+def _parse_time(value, name):
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f"{name} : date invalide '{value}' (AAAA-MM-JJ[THH:MM:SS])")
+
+
+def _parse_choices(value, allowed, name):
+    values = [v.strip() for v in value.split(",") if v.strip()]
+    unknown = [v for v in values if v not in allowed]
+    if unknown or not values:
+        raise ValueError(f"{name} : valeur(s) inconnue(s) {unknown} (attendu : {', '.join(allowed)})")
+    return values
+
+
+def parse_filters(args):
+    """Filtres validés à partir des paramètres de requête ; ValueError si un paramètre est invalide"""
+    filters = {}
+    if args.get("since"):
+        filters["since"] = _parse_time(args["since"], "since")
+    if args.get("until"):
+        filters["until"] = _parse_time(args["until"], "until")
+    if args.get("ip"):
+        try:
+            filters["network"] = ipaddress.ip_network(args["ip"].strip(), strict=False)
+        except ValueError:
+            raise ValueError(f"ip : adresse ou sous-réseau invalide '{args['ip']}'")
+    if args.get("filename"):
+        filters["filename"] = args["filename"]
+    if args.get("filename_prefix"):
+        filters["filename_prefix"] = args["filename_prefix"]
+    if args.get("type"):
+        filters["types"] = _parse_choices(args["type"], TRANSFER_TYPES, "type")
+    if args.get("status"):
+        filters["statuses"] = _parse_choices(args["status"], STATUSES, "status")
+    return filters
+
+
+def parse_page(args):
+    """(curseur, taille de page) ; ValueError si invalides"""
+    try:
+        cursor = int(args["cursor"]) if args.get("cursor") else None
+        limit = int(args.get("limit", DEFAULT_LIMIT))
+    except ValueError:
+        raise ValueError("cursor et limit doivent être des entiers")
+    return cursor, max(1, min(limit, MAX_LIMIT))
+
+
+def _escape_like(value):
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def where_clause(filters, before_id=None):
+    """Clause WHERE paramétrée (chaîne vide sans filtre) et ses paramètres"""
+    conditions = []
+    params = []
+    if "since" in filters:
+        conditions.append("timestamp >= %s")
+        params.append(filters["since"])
+    if "until" in filters:
+        conditions.append("timestamp < %s")
+        params.append(filters["until"])
+    network = filters.get("network")
+    if network is not None:
+        if network.num_addresses == 1:
+            conditions.append("client_ip_bin = %s")
+            params.append(network.network_address.packed)
+        else:
+            # Plage d'adresses binaires ; la longueur écarte les adresses de l'autre famille
+            conditions.append("client_ip_bin BETWEEN %s AND %s AND LENGTH(client_ip_bin) = %s")
+            params += [network.network_address.packed, network.broadcast_address.packed,
+                       len(network.network_address.packed)]
+    if "filename" in filters:
+        conditions.append("filename = %s")
+        params.append(filters["filename"])
+    if "filename_prefix" in filters:
+        conditions.append("filename LIKE %s")
+        params.append(_escape_like(filters["filename_prefix"]) + "%")
+    for column, key in (("transfer_type", "types"), ("status", "statuses")):
+        if key in filters:
+            conditions.append(f"{column} IN ({', '.join(['%s'] * len(filters[key]))})")
+            params += filters[key]
+    if before_id is not None:
+        conditions.append("id < %s")
+        params.append(before_id)
+    return (" WHERE " + " AND ".join(conditions)) if conditions else "", params
+
+
+def row_matches(filters, row):
+    """Équivalent Python de where_clause (lignes lues dans les archives)"""
+    ts = row["timestamp"]
+    if "since" in filters and ts < filters["since"]:
+        return False
+    if "until" in filters and ts >= filters["until"]:
+        return False
+    network = filters.get("network")
+    if network is not None:
+        try:
+            address = ipaddress.ip_address(row["client_ip"])
+        except ValueError:
+            return False
+        if address.version != network.version or address not in network:
+            return False
+    if "filename" in filters and row["filename"].casefold() != filters["filename"].casefold():
+        return False
+    if "filename_prefix" in filters and \
+            not row["filename"].casefold().startswith(filters["filename_prefix"].casefold()):
+        return False
+    if "types" in filters and row["transfer_type"] not in filters["types"]:
+        return False
+    if "statuses" in filters and row["status"] not in filters["statuses"]:
+        return False
+    return True
+
+
+def search(cursor, filters, before_id=None, limit=DEFAULT_LIMIT, archive=None):
+    """
+    Une page de résultats (ID décroissant) ; renvoie (lignes, curseur suivant),
+    le curseur étant None sur la dernière page
+    """
+    where, params = where_clause(filters, before_id)
+    cursor.execute(
+        f"SELECT {', '.join(COLUMNS)} FROM file_transfers{where} ORDER BY id DESC LIMIT %s",
+        params + [limit + 1])
+    rows = cursor.fetchall()
+    if archive is not None:
+        # Page pleine en base : seules les lignes archivées d'ID supérieur au
+        # dernier candidat peuvent encore y figurer
+        min_id = rows[-1]["id"] if len(rows) > limit else None
+        # Archive enregistrée avant la suppression de sa partition : une ligne
+        # présente des deux côtés n'est comptée qu'une fois
+        merged = {row["id"]: row for row in archive.search(filters, before_id, limit + 1, min_id)}
+        merged.update((row["id"], row) for row in rows)
+        rows = sorted(merged.values(), key=lambda row: row["id"], reverse=True)[:limit + 1]
+    if len(rows) > limit:
+        rows = rows[:limit]
+        return rows, rows[-1]["id"]
+    return rows, None
+
+
+def iter_rows(open_cursor, filters, batch=EXPORT_BATCH, archive=None):
+    """
+    Toutes les lignes du filtre, lot par lot (mémoire bornée à `batch` lignes) ;
+    open_cursor() ouvre un curseur (gestionnaire de contexte) par requête
+    """
+    before_id = None
+    while True:
+        with open_cursor() as cursor:
+            rows, before_id = search(cursor, filters, before_id, batch)
+        yield from rows
+        if before_id is None:
+            break
+    if archive is not None:
+        def in_db(entry):
+            with open_cursor() as cursor:
+                return _partition_in_db(cursor, entry)
+
+        yield from archive.iter_rows(filters, in_db)
+
+
+def _partition_in_db(cursor, entry):
+    """Partition de l'archive peut-être pas encore supprimée et lignes encore en base"""
+    if entry.get("partition_dropped", True):
+        return False
+    cursor.execute("SELECT id FROM file_transfers WHERE id BETWEEN %s AND %s LIMIT 1",
+                   (entry["min_id"], entry["max_id"]))
+    return bool(cursor.fetchall())
+
+
+def as_json(row):
+    row = dict(row)
+    row["timestamp"] = row["timestamp"].isoformat() if row["timestamp"] else None
+    return row
+
+
+def ndjson_lines(rows):
+    for row in rows:
+        yield json.dumps(as_json(row), ensure_ascii=False) + "\n"
+
+
+def csv_lines(rows, batch=EXPORT_BATCH):
+    """Lignes CSV (en-tête compris), regroupées par blocs de `batch` lignes"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(COLUMNS)
+    count = 0
+    for row in rows:
+        writer.writerow(as_json(row)[column] for column in COLUMNS)
+        count += 1
+        if count % batch == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
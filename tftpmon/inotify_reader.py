@@ -0,0 +1,337 @@
+"""
+Lecture des événements inotify.
+
+Backend natif : appel direct à l'interface noyau via ctypes (inotify_init1 /
+inotify_add_watch) et lecture des événements binaires par blocs de 64 Kio.
+Backend de secours : processus `inotifywait -m` dont la sortie texte est analysée.
+
+La surveillance est récursive : chaque sous-répertoire reçoit son propre watch,
+ajouté ou retiré dynamiquement à la création / suppression / renommage du
+répertoire. Les deux backends produisent des tuples (chemin, événement,
+horodatage, pid) où `chemin` est relatif à la racine ("ios/c2960.bin") et
+`événement` reprend la notation d'inotifywait ("CLOSE_WRITE,CLOSE").
+
+`pid` n'est connu que pour les fermetures, quand le backend natif les lit par
+fanotify (tftpmon.fanotify_reader) au lieu d'inotify ; sinon il vaut None.
+"""
+
+import ctypes
+import ctypes.util
+import errno
+import os
+import select
+import struct
+import subprocess
+import time
+
+from tftpmon import fanotify_reader, log
+
+logger = log.get("inotify")
+
+IN_ACCESS = 0x00000001
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_CLOSE_NOWRITE = 0x00000010
+IN_OPEN = 0x00000020
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_UNMOUNT = 0x00002000
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+
+IN_CLOSE = IN_CLOSE_WRITE | IN_CLOSE_NOWRITE
+
+# Fermetures (corrélation) + créations/suppressions/renommages (index des fichiers)
+DEFAULT_MASK = IN_CLOSE | IN_CREATE | IN_DELETE | IN_MOVED_FROM | IN_MOVED_TO
+
+MAX_USER_WATCHES = "/proc/sys/fs/inotify/max_user_watches"
+
+IN_CLOEXEC = 0o2000000
+
+EVENT_NAMES = (
+    (IN_ACCESS, "ACCESS"),
+    (IN_MODIFY, "MODIFY"),
+    (IN_ATTRIB, "ATTRIB"),
+    (IN_CLOSE_WRITE, "CLOSE_WRITE"),
+    (IN_CLOSE_NOWRITE, "CLOSE_NOWRITE"),
+    (IN_OPEN, "OPEN"),
+    (IN_MOVED_FROM, "MOVED_FROM"),
+    (IN_MOVED_TO, "MOVED_TO"),
+    (IN_CREATE, "CREATE"),
+    (IN_DELETE, "DELETE"),
+    (IN_DELETE_SELF, "DELETE_SELF"),
+    (IN_MOVE_SELF, "MOVE_SELF"),
+    (IN_UNMOUNT, "UNMOUNT"),
+    (IN_Q_OVERFLOW, "Q_OVERFLOW"),
+    (IN_IGNORED, "IGNORED"),
+    (IN_ISDIR, "ISDIR"),
+)
+
+_EVENT_HEADER = struct.Struct("iIII")
+_READ_SIZE = 64 * 1024
+
+_libc = None
+_mask_names = {}
+
+
+def mask_to_str(mask):
+    """Traduit un masque en notation inotifywait (mémorisé par masque)"""
+    name = _mask_names.get(mask)
+    if name is None:
+        parts = [label for bit, label in EVENT_NAMES if mask & bit]
+        if mask & IN_CLOSE:
+            parts.append("CLOSE")
+        name = _mask_names[mask] = ",".join(parts)
+    return name
+
+
+def _load_libc():
+    global _libc
+    if _libc is None:
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        libc.inotify_init1.argtypes = [ctypes.c_int]
+        libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        libc.inotify_rm_watch.argtypes = [ctypes.c_int, ctypes.c_int]
+        _libc = libc
+    return _libc
+
+
+def native_available():
+    try:
+        return hasattr(_load_libc(), "inotify_init1")
+    except OSError:
+        return False
+
+
+class InotifyWatcher:
+    """Descripteur inotify natif"""
+
+    def __init__(self):
+        self._libc = _load_libc()
+        self.fd = self._libc.inotify_init1(IN_CLOEXEC)
+        if self.fd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err))
+        # wd -> chemin du répertoire surveillé
+        self.watches = {}
+
+    def add_watch(self, path, mask):
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(path), mask)
+        if wd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err), path)
+        self.watches[wd] = path
+        return wd
+
+    def rm_watch(self, wd):
+        self._libc.inotify_rm_watch(self.fd, wd)
+        self.watches.pop(wd, None)
+
+    def read_events(self):
+        """Lit un bloc d'événements bruts : liste de (wd, masque, cookie, nom)"""
+        data = os.read(self.fd, _READ_SIZE)
+        events = []
+        offset = 0
+        end = len(data)
+        header_size = _EVENT_HEADER.size
+        while offset < end:
+            wd, mask, cookie, length = _EVENT_HEADER.unpack_from(data, offset)
+            offset += header_size
+            name = data[offset:offset + length].rstrip(b"\0")
+            offset += length
+            events.append((wd, mask, cookie, os.fsdecode(name)))
+        return events
+
+    def close(self):
+        os.close(self.fd)
+
+
+class RecursiveWatcher(InotifyWatcher):
+    """
+    Watch sur chaque répertoire de l'arborescence, tenu à jour dynamiquement ;
+    closes : fanotify_reader.CloseWatcher qui remonte alors les fermetures
+    (avec leur PID) à la place d'inotify, marques tenues à jour ici
+    """
+
+    def __init__(self, root, mask=DEFAULT_MASK, closes=None):
+        super().__init__()
+        self.root = root
+        self.closes = closes
+        if closes is not None:
+            mask &= ~IN_CLOSE
+        # Les événements de répertoire sont nécessaires au suivi de l'arborescence
+        self.mask = mask | IN_CREATE | IN_MOVED_FROM | IN_MOVED_TO
+        # chemin relatif -> wd (les chemins relatifs sont dans self.watches)
+        self.wds = {}
+        self.watch_failures = 0
+        self._limit_reported = False
+
+    def _add(self, relpath):
+        path = os.path.join(self.root, relpath) if relpath else self.root
+        mask = self.mask
+        if self.closes is not None and not self.closes.add(relpath):
+            # Marque fanotify impossible : fermetures de ce répertoire par inotify, sans PID
+            mask |= IN_CLOSE
+        try:
+            wd = self._libc.inotify_add_watch(self.fd, os.fsencode(path), mask)
+            if wd < 0:
+                err = ctypes.get_errno()
+                raise OSError(err, os.strerror(err), path)
+        except OSError as e:
+            self.watch_failures += 1
+            if e.errno == errno.ENOSPC and not self._limit_reported:
+                self._limit_reported = True
+                logger.warning("Limite de watches atteinte (%s) : augmenter "
+                               "fs.inotify.max_user_watches ; les nouveaux répertoires "
+                               "ne sont plus surveillés", _max_user_watches())
+            return False
+        self.watches[wd] = relpath
+        self.wds[relpath] = wd
+        return True
+
+    def add_tree(self, relpath=""):
+        """
+        Ajoute un watch sur relpath et tous ses sous-répertoires ; renvoie le nombre ajouté.
+        L'arborescence est parcourue avant la pose des watches : le parcours ouvre
+        chaque répertoire, ce qui, sous surveillance, remplirait la file noyau
+        d'événements CLOSE_NOWRITE inutiles.
+        """
+        directories = []
+        stack = [relpath]
+        while stack:
+            current = stack.pop()
+            directories.append(current)
+            path = os.path.join(self.root, current) if current else self.root
+            try:
+                with os.scandir(path) as it:
+                    for entry in it:
+                        if entry.is_dir(follow_symlinks=False):
+                            stack.append(f"{current}/{entry.name}" if current else entry.name)
+            except OSError:
+                continue
+        return sum(1 for d in directories if self._add(d))
+
+    def remove_tree(self, relpath):
+        """Oublie relpath et ses sous-répertoires (répertoire supprimé ou déplacé)"""
+        prefix = relpath + "/"
+        for path in [p for p in self.wds if p == relpath or p.startswith(prefix)]:
+            wd = self.wds.pop(path)
+            self.watches.pop(wd, None)
+            self._libc.inotify_rm_watch(self.fd, wd)
+            if self.closes is not None:
+                self.closes.remove(path)
+
+    def events(self):
+        """Lit un bloc et renvoie (chemin relatif, masque) en suivant l'arborescence"""
+        result = []
+        for wd, mask, _, name in self.read_events():
+            if mask & IN_Q_OVERFLOW:
+                result.append(("", mask))
+                continue
+            parent = self.watches.get(wd)
+            if parent is None:
+                continue
+            if mask & IN_IGNORED:
+                # Watch retiré par le noyau (répertoire supprimé)
+                self.watches.pop(wd, None)
+                if self.wds.get(parent) == wd:
+                    del self.wds[parent]
+                continue
+            if not name or (mask & IN_ISDIR and mask & IN_CLOSE):
+                # Ouverture/fermeture de répertoire : sans intérêt pour la corrélation
+                continue
+
+            relpath = f"{parent}/{name}" if parent else name
+            if mask & IN_ISDIR:
+                if mask & (IN_CREATE | IN_MOVED_TO):
+                    self.add_tree(relpath)
+                elif mask & IN_MOVED_FROM:
+                    self.remove_tree(relpath)
+            result.append((relpath, mask))
+        return result
+
+
+def _max_user_watches():
+    try:
+        with open(MAX_USER_WATCHES) as f:
+            return int(f.read())
+    except (OSError, ValueError):
+        return None
+
+
+def native_events(root, mask=DEFAULT_MASK, watcher=None):
+    """
+    Générateur (chemin, événement, horodatage, pid) via l'interface noyau ; un
+    débordement de la file noyau est remonté comme ("", "Q_OVERFLOW", ts, None)
+    """
+    if watcher is None:
+        watcher = RecursiveWatcher(root, mask)
+        watcher.add_tree()
+    closes = watcher.closes
+    while True:
+        if closes is None:
+            events = watcher.events()
+            now = time.time()
+            for relpath, ev_mask in events:
+                yield relpath, mask_to_str(ev_mask), now, None
+            continue
+
+        ready, _, _ = select.select([watcher.fd, closes.fd], [], [])
+        # inotify d'abord : la création d'un fichier précède sa fermeture
+        events = [(relpath, ev_mask, None) for relpath, ev_mask in watcher.events()] \
+            if watcher.fd in ready else []
+        if closes.fd in ready:
+            events += closes.events()
+        now = time.time()
+        for relpath, ev_mask, pid in events:
+            yield relpath, mask_to_str(ev_mask), now, pid
+
+
+def inotifywait_events(root):
+    """Générateur (chemin, événement, horodatage, None) via le processus inotifywait -r"""
+    cmd = [
+        "inotifywait",
+        "-m",
+        "-r",
+        "-e", "close_write,close_nowrite,create,delete,moved_from,moved_to",
+        "--format", "%e %w%f",
+        root,
+    ]
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, text=True)
+    prefix = os.path.join(root, "")
+
+    for line in proc.stdout:
+        parts = line.rstrip("\n").split(" ", 1)
+        if len(parts) == 2:
+            event_type, path = parts
+            if path.startswith(prefix):
+                path = path[len(prefix):]
+            yield path, event_type, time.time(), None
+
+
+def watch_events(root, backend="native", close_pids=False):
+    """
+    Sélectionne le backend ; bascule sur inotifywait si l'interface native est absente.
+    Avec le backend natif, les watches sont posés avant le retour (aucun
+    événement perdu entre l'indexation initiale et le début de la lecture).
+    close_pids : fermetures lues par fanotify, avec le PID de leur auteur (si disponible)
+    """
+    if backend == "native" and native_available():
+        closes = fanotify_reader.open_watcher(root) if close_pids else None
+        watcher = RecursiveWatcher(root, closes=closes)
+        started = time.time()
+        count = watcher.add_tree()
+        logger.info("%s répertoire(s) surveillé(s) en %.2f s%s%s", count, time.time() - started,
+                    f" ({watcher.watch_failures} échec(s))" if watcher.watch_failures else "",
+                    " ; fermetures par fanotify (PID)" if closes is not None else "")
+        if closes is not None and closes.mark_failures:
+            logger.warning("%s marque(s) fanotify en échec : fermetures de ces répertoires "
+                           "lues par inotify, sans PID", closes.mark_failures)
+        return native_events(root, watcher=watcher)
+    return inotifywait_events(root)
@@ -0,0 +1,103 @@
+"""
+Lecture du journal systemd de tftpd-hpa.
+
+Backend natif : `systemd.journal.Reader` (paquet python3-systemd) filtré sur
+l'unité, avec reprise possible à partir d'un curseur. Les entrées portent déjà
+le PID (_PID) et l'horodatage précis (__REALTIME_TIMESTAMP) : aucune mise en
+forme texte n'est nécessaire.
+Backend de secours : `journalctl -f -o json`, qui fournit les mêmes champs
+(_PID, __REALTIME_TIMESTAMP, __CURSOR) au prix d'un processus externe.
+
+Les deux backends produisent des tuples (pid, message, horodatage, curseur).
+"""
+
+import json
+import subprocess
+
+try:
+    from systemd import journal
+except ImportError:
+    journal = None
+
+
+def native_available():
+    return journal is not None
+
+
+def native_entries(unit, cursor=None, on_caught_up=None):
+    """
+    Générateur (pid, message, horodatage, curseur) via l'API du journal.
+    Avec un curseur, les entrées manquées sont d'abord relues d'un trait ;
+    on_caught_up() est appelé une fois l'arriéré épuisé, avant le mode suivi.
+    """
+    reader = journal.Reader()
+    reader.add_match(_SYSTEMD_UNIT=f"{unit}.service")
+
+    if cursor:
+        reader.seek_cursor(cursor)
+        # seek_cursor se place SUR l'entrée déjà traitée : on la saute
+        reader.get_next()
+    else:
+        reader.seek_tail()
+        reader.get_previous()
+
+    while True:
+        for entry in reader:
+            message = entry.get("MESSAGE")
+            if not isinstance(message, str):
+                continue
+            yield (
+                str(entry.get("_PID", "")),
+                message,
+                entry["__REALTIME_TIMESTAMP"].timestamp(),
+                entry["__CURSOR"],
+            )
+        if on_caught_up is not None:
+            on_caught_up()
+            on_caught_up = None
+        reader.wait()
+
+
+def _journalctl_json(cmd):
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, text=True)
+    for line in proc.stdout:
+        try:
+            entry = json.loads(line)
+        except ValueError:
+            continue
+        message = entry.get("MESSAGE")
+        if not isinstance(message, str):
+            continue
+        yield (
+            entry.get("_PID", ""),
+            message,
+            int(entry["__REALTIME_TIMESTAMP"]) / 1e6,
+            entry["__CURSOR"],
+        )
+    proc.wait()
+
+
+def journalctl_entries(unit, cursor=None, on_caught_up=None):
+    """Générateur (pid, message, horodatage, curseur) via journalctl -o json"""
+    if cursor:
+        # Rattrapage : lecture sans -f, le processus se termine en fin d'arriéré
+        for entry in _journalctl_json(
+                ["journalctl", "-u", unit, "-o", "json", "--after-cursor", cursor]):
+            cursor = entry[3]
+            yield entry
+    if on_caught_up is not None:
+        on_caught_up()
+
+    cmd = ["journalctl", "-u", unit, "-f", "-o", "json"]
+    if cursor:
+        cmd += ["--after-cursor", cursor]
+    else:
+        cmd += ["-n", "0"]
+    yield from _journalctl_json(cmd)
+
+
+def follow(unit, backend="native", cursor=None, on_caught_up=None):
+    """Sélectionne le backend ; bascule sur journalctl si python3-systemd est absent"""
+    if backend == "native" and native_available():
+        return native_entries(unit, cursor, on_caught_up)
+    return journalctl_entries(unit, cursor, on_caught_up)
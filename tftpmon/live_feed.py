@@ -0,0 +1,87 @@
+"""
+Diffusion temps réel vers les navigateurs (Server-Sent Events).
+
+Une seule source (le thread producteur du tableau de bord) publie les
+événements ; chacun est encodé une fois au format SSE et rangé dans un tampon
+circulaire numéroté. Chaque client connecté ne garde qu'un curseur (dernier
+numéro envoyé) et attend sur une condition commune : le coût d'un événement
+ne dépend pas du nombre d'écrans ouverts.
+
+Un client trop lent, ou qui se reconnecte (en-tête Last-Event-ID) après que
+ses événements manquants sont sortis du tampon, reçoit un événement `resync`
+et recharge l'état complet par l'API REST.
+"""
+
+import itertools
+import json
+import threading
+from collections import deque
+
+
+def encode_event(event, data, event_id=None):
+    """Message SSE : "id", "event" et "data" (JSON sur une ligne)"""
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"event: {event}")
+    lines.append("data: " + json.dumps(data, default=str, separators=(",", ":")))
+    return ("\n".join(lines) + "\n\n").encode()
+
+
+class LiveFeed:
+    """Tampon d'événements partagé par tous les flux SSE"""
+
+    def __init__(self, backlog=1000, heartbeat=15, retry_ms=3000):
+        self.heartbeat = heartbeat
+        self.retry_ms = retry_ms
+        self._cond = threading.Condition()
+        # (numéro, message SSE encodé), numéros consécutifs
+        self._events = deque(maxlen=backlog)
+        self._seq = 0
+        self.listeners = 0
+
+        self.counters = {"published": 0, "resyncs": 0}
+
+    def publish(self, event, data):
+        with self._cond:
+            self._seq += 1
+            self._events.append((self._seq, encode_event(event, data, self._seq)))
+            self.counters["published"] += 1
+            self._cond.notify_all()
+
+    def _since(self, cursor):
+        """Messages après `cursor` ; None s'ils ne sont plus dans le tampon (appelé sous verrou)"""
+        missing = self._seq - cursor
+        if missing < 0 or missing > len(self._events):
+            # Curseur d'un ancien processus, ou événements déjà évincés
+            return None
+        return [payload for _, payload in
+                itertools.islice(self._events, len(self._events) - missing, None)]
+
+    def stream(self, last_id=None):
+        """Générateur des octets envoyés à un client ; last_id : reprise après reconnexion"""
+        with self._cond:
+            self.listeners += 1
+            cursor = self._seq if last_id is None else last_id
+        try:
+            # Délai de reconnexion automatique du navigateur
+            yield f"retry: {self.retry_ms}\n\n".encode()
+            while True:
+                with self._cond:
+                    if self._seq == cursor:
+                        self._cond.wait(self.heartbeat)
+                    pending = self._since(cursor)
+                    cursor = self._seq
+                    if pending is None:
+                        self.counters["resyncs"] += 1
+                if pending is None:
+                    yield encode_event("resync", {}, cursor)
+                elif pending:
+                    yield b"".join(pending)
+                else:
+                    # Commentaire SSE : garde la connexion ouverte (proxies) et
+                    # détecte les navigateurs partis
+                    yield b": ping\n\n"
+        finally:
+            with self._cond:
+                self.listeners -= 1
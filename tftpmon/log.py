@@ -0,0 +1,279 @@
+"""
+Journalisation des services (module logging), sans coût sur le chemin critique.
+
+Chaque module écrit dans un logger "tftpmon.<étiquette>" (log.get("db"),
+log.get("inotify")...). Le thread appelant ne fait que :
+  - le test de niveau : une ligne DEBUG désactivée ne coûte qu'un appel ;
+  - la limitation de débit des lignes sous WARNING, par message (même gabarit) :
+    au-delà de `rate_limit` lignes/s, après une rafale de `burst`, les lignes
+    sont omises et comptées ; la ligne suivante du même message en indique le nombre ;
+  - le dépôt de l'enregistrement dans une file bornée, sans attente : file
+    pleine (sortie bloquée), la ligne est perdue et comptée.
+
+Le formatage (%-arguments compris) est fait par un thread d'écriture, qui vide
+la file par lots en une écriture sur la sortie standard. Les arguments sont
+donc formatés après coup : passer des valeurs figées (copie d'un dictionnaire
+de compteurs, pas le dictionnaire lui-même).
+
+Après un fork (processus du backfill), la file et le thread d'écriture du
+parent n'existent plus dans le fils : le gestionnaire est retiré (les
+avertissements et erreurs passent alors par le dernier recours de logging,
+sur la sortie d'erreur) et setup() doit être rappelé dans le fils.
+
+Formats : "text", proche des anciens print() ("[DB] ✅ ...", "[DB ERROR] ❌ ...",
+préfixé de la priorité syslog "<3>" sous journald), ou "json", une ligne par
+enregistrement avec les champs passés en extra= (fichier, IP, PID...).
+"""
+
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+
+ROOT = "tftpmon"
+
+# Enregistrements écrits, omis par la limitation de débit, perdus (file pleine)
+counters = {"written": 0, "sampled": 0, "dropped": 0}
+
+# Priorités syslog comprises par journald en tête de ligne (SyslogLevelPrefix)
+_PRIORITIES = ((logging.CRITICAL, 2), (logging.ERROR, 3), (logging.WARNING, 4),
+               (logging.INFO, 6), (logging.DEBUG, 7))
+
+# Attributs standard d'un LogRecord : le reste vient d'extra= (format json)
+_RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+_STOP = object()
+_writer = None
+
+
+def get(name):
+    """Logger du composant `name` ; son étiquette est le nom en majuscules ("db.spool" -> DB SPOOL)"""
+    return logging.getLogger(f"{ROOT}.{name}")
+
+
+def _tag(record):
+    name = record.name
+    if name.startswith(ROOT + "."):
+        name = name[len(ROOT) + 1:]
+    return name.replace(".", " ").upper()
+
+
+def _under_journald(stream):
+    """Sortie standard reliée au journal (systemd exporte JOURNAL_STREAM=dev:inode)"""
+    try:
+        dev, ino = os.environ["JOURNAL_STREAM"].split(":")
+        st = os.fstat(stream.fileno())
+        return st.st_dev == int(dev) and st.st_ino == int(ino)
+    except (KeyError, ValueError, OSError, AttributeError):
+        return False
+
+
+# ==============================
+# FORMATS
+# ==============================
+class TextFormatter(logging.Formatter):
+    """[ÉTIQUETTE] message, marques d'erreur et d'avertissement selon le niveau"""
+
+    def __init__(self, priority_prefix=False):
+        super().__init__()
+        self.priority_prefix = priority_prefix
+
+    def format(self, record):
+        tag = _tag(record)
+        message = record.getMessage()
+        if record.levelno >= logging.ERROR:
+            line = f"[{tag} ERROR] ❌ {message}"
+        elif record.levelno >= logging.WARNING:
+            line = f"[{tag}] ⚠️ {message}"
+        else:
+            line = f"[{tag}] {message}"
+        suppressed = getattr(record, "suppressed", 0)
+        if suppressed:
+            line += f" (+{suppressed} ligne(s) semblable(s) omise(s))"
+        if record.exc_info:
+            line += "\n" + self.formatException(record.exc_info)
+        if self.priority_prefix:
+            priority = next((p for level, p in _PRIORITIES if record.levelno >= level), 7)
+            line = f"<{priority}>" + line.replace("\n", f"\n<{priority}>")
+        return line
+
+
+class JsonFormatter(logging.Formatter):
+    """Un objet JSON par ligne : ts, level, logger, msg et champs passés en extra="""
+
+    def format(self, record):
+        entry = {
+            "ts": round(record.created, 6),
+            "level": record.levelname.lower(),
+            "logger": _tag(record).lower().replace(" ", "."),
+            "msg": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS:
+                entry[key] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+# ==============================
+# LIMITATION DE DÉBIT
+# ==============================
+class RateLimitFilter(logging.Filter):
+    """
+    Seau à jetons par message (logger + gabarit) pour les niveaux sous WARNING ;
+    les avertissements et erreurs passent toujours
+    """
+
+    def __init__(self, rate, burst):
+        super().__init__()
+        self.rate = rate
+        self.burst = burst
+        # (logger, gabarit) -> [jetons, dernier passage, lignes omises]
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING or not self.rate:
+            return True
+        key = (record.name, record.msg)
+        now = record.created
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = [self.burst, now, 0]
+            else:
+                bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+                bucket[1] = now
+            if bucket[0] < 1:
+                bucket[2] += 1
+                counters["sampled"] += 1
+                return False
+            bucket[0] -= 1
+            if bucket[2]:
+                record.suppressed = bucket[2]
+                bucket[2] = 0
+        return True
+
+
+# ==============================
+# FILE ET THREAD D'ÉCRITURE
+# ==============================
+class _QueueHandler(logging.handlers.QueueHandler):
+    """Dépôt sans attente ni formatage : le thread d'écriture s'en charge"""
+
+    def prepare(self, record):
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            counters["dropped"] += 1
+
+
+class _Writer(threading.Thread):
+
+    def __init__(self, records, formatter, batch_size=512):
+        super().__init__(daemon=True, name="log-writer")
+        self.records = records
+        self.formatter = formatter
+        self.batch_size = batch_size
+        self._reported_drops = 0
+
+    def run(self):
+        while True:
+            batch = [self.records.get()]
+            try:
+                while len(batch) < self.batch_size:
+                    batch.append(self.records.get_nowait())
+            except queue.Empty:
+                pass
+
+            lines = []
+            stop = False
+            for record in batch:
+                if record is _STOP:
+                    stop = True
+                    continue
+                try:
+                    lines.append(self.formatter.format(record))
+                except Exception as e:
+                    lines.append(f"[LOG ERROR] ❌ Ligne non formatable ({record.msg!r}) : {e}")
+            dropped = counters["dropped"]
+            if dropped != self._reported_drops:
+                lines.append(f"[LOG] ⚠️ {dropped - self._reported_drops} ligne(s) perdue(s) "
+                             f"(file de journalisation pleine)")
+                self._reported_drops = dropped
+
+            if lines:
+                counters["written"] += len(lines)
+                # sys.stdout lu à chaque lot, comme print() (sortie redirigée en cours de route)
+                try:
+                    sys.stdout.write("\n".join(lines) + "\n")
+                    sys.stdout.flush()
+                except (OSError, ValueError):
+                    pass
+            if stop:
+                return
+
+    def stop(self, timeout=5):
+        try:
+            self.records.put(_STOP, timeout=timeout)
+        except queue.Full:
+            return
+        self.join(timeout)
+
+
+def _after_fork_in_child():
+    """
+    Fils d'un fork : la file du parent n'est plus lue (et son verrou a pu être
+    copié pris), le gestionnaire est retiré jusqu'au prochain setup()
+    """
+    global _writer
+    if _writer is None:
+        return
+    _writer = None
+    root = logging.getLogger(ROOT)
+    for handler in list(root.handlers):
+        if isinstance(handler, _QueueHandler):
+            root.removeHandler(handler)
+    root.propagate = True
+
+
+os.register_at_fork(after_in_child=_after_fork_in_child)
+
+
+def setup(config=None):
+    """
+    Configure la journalisation du processus (une seule fois). Clés de config :
+    level, levels (niveau par composant), format, queue_size, rate_limit, burst
+    """
+    global _writer
+    config = config or {}
+    root = logging.getLogger(ROOT)
+    root.setLevel(config.get("level", "INFO"))
+    for name, level in config.get("levels", {}).items():
+        get(name).setLevel(level)
+    if _writer is not None:
+        return
+
+    if config.get("format", "text") == "json":
+        formatter = JsonFormatter()
+    else:
+        formatter = TextFormatter(priority_prefix=_under_journald(sys.stdout))
+
+    records = queue.Queue(maxsize=config.get("queue_size", 10000))
+    handler = _QueueHandler(records)
+    handler.addFilter(RateLimitFilter(config.get("rate_limit", 20), config.get("burst", 100)))
+    root.addHandler(handler)
+    root.propagate = False
+
+    _writer = _Writer(records, formatter)
+    _writer.start()
+    # Lignes encore en file écrites à l'arrêt (sys.exit sur SIGTERM compris)
+    atexit.register(_writer.stop)
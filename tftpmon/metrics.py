@@ -0,0 +1,204 @@
+"""
+Métriques au format texte Prometheus (exposition 0.0.4, lue aussi par les
+collecteurs OpenMetrics), sans dépendance externe.
+
+Les compteurs déjà tenus par chaque composant (dictionnaires `counters`,
+profondeurs de file, mesures du pool MySQL) ne sont lus qu'au moment de la
+collecte, par des fonctions enregistrées dans un Registry : le chemin critique
+n'en paie rien. Seules les nouvelles mesures de latence passent par un
+Histogram, soit une recherche de seau (bisect) et trois additions sous
+verrou par observation.
+
+tftp-monitor et alert-monitor servent /metrics sur un petit serveur HTTP
+(serve(), thread dédié) ; le tableau de bord l'expose comme une route Flask.
+"""
+
+import bisect
+import math
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Bornes (s) par défaut : mêmes seaux que les latences MySQL (tftpmon.db)
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _number(value):
+    if isinstance(value, float):
+        if math.isinf(value):
+            return "+Inf" if value > 0 else "-Inf"
+        return repr(value)
+    return str(int(value))
+
+
+def _header(name, kind, help_text):
+    return [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+
+
+def histogram_lines(name, label_names, bounds, series):
+    """
+    Échantillons d'un histogramme ; series : {valeurs de labels: (seaux, somme, nombre)},
+    seaux non cumulés avec un dernier seau pour les valeurs au-delà de la plus grande borne
+    """
+    lines = []
+    for values, (buckets, total, count) in sorted(series.items()):
+        cumulative = 0
+        for bound, hits in zip(bounds + (math.inf,), buckets):
+            cumulative += hits
+            le = ("le", "+Inf" if math.isinf(bound) else repr(float(bound)))
+            lines.append(f"{name}_bucket{_labels(label_names, values, [le])} {cumulative}")
+        lines.append(f"{name}_sum{_labels(label_names, values)} {_number(float(total))}")
+        lines.append(f"{name}_count{_labels(label_names, values)} {count}")
+    return lines
+
+
+class Histogram:
+    """Distribution de valeurs (latences en secondes), par combinaison de labels"""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS, label_names=()):
+        self.bounds = tuple(sorted(buckets))
+        self.label_names = tuple(label_names)
+        # valeurs de labels -> [seau 0, ..., seau +Inf, somme, nombre]
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        index = bisect.bisect_left(self.bounds, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [0] * (len(self.bounds) + 3)
+            series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def snapshot(self):
+        """{valeurs de labels: (seaux, somme, nombre)}"""
+        with self._lock:
+            return {values: (series[:-2], series[-2], series[-1])
+                    for values, series in self._series.items()}
+
+
+class Registry:
+    """Ensemble des métriques d'un service, rendues au format texte à chaque collecte"""
+
+    def __init__(self):
+        self._collectors = []
+
+    def register(self, collect):
+        """collect() renvoie les lignes (HELP, TYPE et échantillons) d'une famille"""
+        self._collectors.append(collect)
+        return collect
+
+    def _simple(self, kind, name, help_text, read, label_names):
+        label_names = tuple(label_names)
+
+        def collect():
+            value = read()
+            lines = _header(name, kind, help_text)
+            if not isinstance(value, dict):
+                value = {(): value}
+            for values, sample in sorted(value.items(), key=lambda item: str(item[0])):
+                if not isinstance(values, tuple):
+                    values = (values,)
+                lines.append(f"{name}{_labels(label_names, values)} {_number(sample)}")
+            return lines
+
+        return self.register(collect)
+
+    def counter(self, name, help_text, read, label_names=()):
+        """
+        Compteur lu à la collecte ; read() renvoie un nombre ou {valeur(s) de labels: nombre}
+        (les noms de compteurs se terminent par _total)
+        """
+        return self._simple("counter", name, help_text, read, label_names)
+
+    def gauge(self, name, help_text, read, label_names=()):
+        """Valeur instantanée lue à la collecte (profondeur de file, connexions ouvertes...)"""
+        return self._simple("gauge", name, help_text, read, label_names)
+
+    def histogram(self, name, help_text, histogram):
+        def collect():
+            return _header(name, "histogram", help_text) + histogram_lines(
+                name, histogram.label_names, histogram.bounds, histogram.snapshot())
+
+        return self.register(collect)
+
+    def database(self, db, prefix="tftpmon"):
+        """Pool et latences par opération d'un tftpmon.db.Database"""
+        from tftpmon.db import LATENCY_BUCKETS
+
+        def collect():
+            metrics = db.metrics()
+            name = f"{prefix}_db_operation_seconds"
+            lines = _header(name, "histogram",
+                            "Durée des opérations MySQL (emprunt de connexion compris)")
+            lines += histogram_lines(name, ("operation",), LATENCY_BUCKETS, {
+                (op,): (m["buckets"], m["total"], m["count"]) for op, m in metrics.items()})
+            return lines
+
+        self.register(collect)
+        self.counter(f"{prefix}_db_operation_errors_total", "Opérations MySQL en erreur",
+                     lambda: {op: m["errors"] for op, m in db.metrics().items()}, ("operation",))
+        self.counter(f"{prefix}_db_pool_events_total",
+                     "Connexions ouvertes, remplacées, échecs de connexion, attentes de pool",
+                     lambda: dict(db.counters), ("event",))
+
+        def pool():
+            status = db.pool_status()
+            return {"busy": status["open"] - status["idle"], "idle": status["idle"],
+                    "max": status["size"]}
+
+        self.gauge(f"{prefix}_db_pool_connections", "Connexions du pool MySQL", pool, ("state",))
+
+    def render(self):
+        lines = []
+        for collect in self._collectors:
+            try:
+                lines += collect()
+            except Exception as e:
+                # Une famille en erreur ne doit pas priver la collecte des autres
+                lines.append(f"# collecte impossible : {_escape(e)}")
+        return "\n".join(lines) + "\n"
+
+
+# ==============================
+# SERVEUR HTTP (tftp-monitor, alert-monitor)
+# ==============================
+class _Handler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        if self.path.split("?", 1)[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = self.server.registry.render().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # Pas de ligne de journal à chaque collecte
+        pass
+
+
+def serve(registry, port, host="127.0.0.1"):
+    """Sert registry sur http://host:port/metrics depuis un thread dédié"""
+    server = ThreadingHTTPServer((host, port), _Handler)
+    server.daemon_threads = True
+    server.registry = registry
+    threading.Thread(target=server.serve_forever, daemon=True, name="metrics").start()
+    return server
@@ -0,0 +1,119 @@
+"""
+Partitionnement mensuel de `file_transfers` (RANGE COLUMNS sur timestamp).
+
+La partition pAAAAMM contient les lignes antérieures au 1er du mois suivant
+(et postérieures à la partition précédente) ; `pmax` reçoit tout le reste.
+La rotation, lancée chaque jour par scripts/partition-maintenance.py :
+
+  - découpe `pmax` pour que `premake_months` mois à venir aient leur
+    partition (une partition vide se découpe sans recopie de lignes) ;
+  - archive puis supprime (DROP PARTITION : instantané, sans verrou de
+    lignes ni DELETE massif) les partitions sorties de la rétention.
+
+Une requête filtrée sur timestamp ne lit que les partitions concernées.
+"""
+
+import re
+from datetime import date, datetime
+
+TABLE = "file_transfers"
+PARTITION_NAME = re.compile(r"^p(\d{4})(\d{2})$")
+
+
+def month_start(day):
+    return date(day.year, day.month, 1)
+
+
+def add_months(day, months):
+    index = day.year * 12 + day.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month):
+    return f"p{month.year:04d}{month.month:02d}"
+
+
+def partition_month(name):
+    """Premier jour du mois couvert par pAAAAMM (None pour pmax)"""
+    m = PARTITION_NAME.match(name)
+    return date(int(m.group(1)), int(m.group(2)), 1) if m else None
+
+
+def list_partitions(db):
+    """Partitions de la table, dans l'ordre : [(nom, borne supérieure ou None pour MAXVALUE)]"""
+    rows = db.fetch_all("partitions", """
+        SELECT PARTITION_NAME as name, PARTITION_DESCRIPTION as bound
+        FROM information_schema.PARTITIONS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND PARTITION_NAME IS NOT NULL
+        ORDER BY PARTITION_ORDINAL_POSITION
+    """, (TABLE,))
+    partitions = []
+    for row in rows:
+        bound = row["bound"].strip("'") if row["bound"] else "MAXVALUE"
+        partitions.append((row["name"], None if bound == "MAXVALUE"
+                           else datetime.fromisoformat(bound).date()))
+    return partitions
+
+
+def _definitions(months):
+    return ", ".join(
+        f"PARTITION {partition_name(month)} VALUES LESS THAN ('{add_months(month, 1).isoformat()}')"
+        for month in months)
+
+
+def ensure_future(db, months_ahead, today=None, dry_run=False):
+    """Crée les partitions du mois courant et des months_ahead suivants ; renvoie leurs noms"""
+    today = today or date.today()
+    partitions = list_partitions(db)
+    if not partitions or partitions[-1][1] is not None:
+        raise RuntimeError(f"{TABLE} n'est pas partitionnée avec une partition pmax (cf. --init)")
+    last_bound = max((bound for _, bound in partitions if bound is not None), default=None)
+
+    months = []
+    month = month_start(today)
+    for _ in range(months_ahead + 1):
+        if last_bound is None or add_months(month, 1) > last_bound:
+            months.append(month)
+        month = add_months(month, 1)
+    if not months:
+        return []
+
+    sql = (f"ALTER TABLE {TABLE} REORGANIZE PARTITION pmax INTO "
+           f"({_definitions(months)}, PARTITION pmax VALUES LESS THAN (MAXVALUE))")
+    if not dry_run:
+        with db.cursor("partition_ddl") as cursor:
+            cursor.execute(sql)
+    return [partition_name(month) for month in months]
+
+
+def expired(partitions, retention_months, today=None):
+    """Partitions pAAAAMM entièrement antérieures aux retention_months derniers mois"""
+    cutoff = add_months(month_start(today or date.today()), -(retention_months - 1))
+    return [name for name, bound in partitions
+            if bound is not None and PARTITION_NAME.match(name) and bound <= cutoff]
+
+
+def drop(db, name):
+    with db.cursor("partition_ddl") as cursor:
+        cursor.execute(f"ALTER TABLE {TABLE} DROP PARTITION {name}")
+
+
+def init_sql(first_month, months_ahead, today=None):
+    """
+    Conversion d'une table existante (non partitionnée) : la clé primaire doit
+    inclure la colonne de partitionnement
+    """
+    today = today or date.today()
+    months = []
+    month = month_start(first_month)
+    last = add_months(month_start(today), months_ahead)
+    while month <= last:
+        months.append(month)
+        month = add_months(month, 1)
+    return [
+        f"ALTER TABLE {TABLE} "
+        f"MODIFY timestamp DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP, "
+        f"DROP PRIMARY KEY, ADD PRIMARY KEY (id, timestamp)",
+        f"ALTER TABLE {TABLE} PARTITION BY RANGE COLUMNS(timestamp) "
+        f"({_definitions(months)}, PARTITION pmax VALUES LESS THAN (MAXVALUE))",
+    ]
@@ -0,0 +1,97 @@
+"""
+Limitation de débit à fenêtre glissante pour la détection d'anomalies.
+
+Chaque clé (IP source, ou sous-réseau) garde au plus `limit + 1` horodatages,
+triés, dans une petite liste : le seuil est dépassé dès qu'elle en contient
+`limit + 1` dans la fenêtre, et elle est alors vidée. Le coût par événement
+est borné par `limit`, quelle que soit la fréquence des requêtes (une liste
+courte coûte ici moins de mémoire qu'un deque, dont le bloc minimal fait 64
+cases).
+
+Les horodatages sont ceux des événements (heure du transfert) et non l'heure
+courante : le rattrapage d'un arriéré donne le même résultat qu'en temps réel,
+y compris si des transferts arrivent dans le désordre.
+
+Les clés sont rangées par dernière activité (OrderedDict) : les clés inactives
+depuis plus d'une fenêtre sont oubliées au fil de l'eau, et au-delà de
+`max_keys` les moins récentes sont évincées. Un balayage depuis des milliers
+d'adresses usurpées ne fait donc pas croître la mémoire indéfiniment.
+"""
+
+import ipaddress
+from bisect import bisect_right, insort
+from collections import OrderedDict
+
+
+class RateLimiter:
+    """Compteurs à fenêtre glissante par clé, à mémoire bornée"""
+
+    def __init__(self, window, limit, max_keys=100000):
+        self.window = window
+        self.limit = limit
+        self.max_keys = max_keys
+        self._keys = OrderedDict()
+
+        self.counters = {"expired": 0, "evicted": 0}
+
+    def __len__(self):
+        return len(self._keys)
+
+    def hit(self, key, timestamp):
+        """
+        Enregistre un événement ; renvoie le nombre d'événements dans la fenêtre
+        s'il dépasse la limite (compteur alors remis à zéro), sinon 0
+        """
+        keys = self._keys
+        events = keys.get(key)
+        if events is None:
+            self._expire(timestamp)
+            events = keys[key] = []
+        else:
+            keys.move_to_end(key)
+
+        insort(events, timestamp)
+        expired = bisect_right(events, events[-1] - self.window)
+        if expired:
+            del events[:expired]
+
+        if len(events) > self.limit:
+            count = len(events)
+            # Remise à zéro pour éviter la répétition d'alertes
+            events.clear()
+            return count
+        return 0
+
+    def count(self, key, timestamp):
+        """Nombre d'événements de la clé dans la fenêtre se terminant à timestamp"""
+        events = self._keys.get(key)
+        if not events:
+            return 0
+        return len(events) - bisect_right(events, timestamp - self.window)
+
+    def _expire(self, now):
+        keys = self._keys
+        horizon = now - self.window
+        # Clés les moins récemment actives en tête
+        while keys:
+            key, events = next(iter(keys.items()))
+            if events and events[-1] > horizon:
+                break
+            keys.popitem(last=False)
+            self.counters["expired"] += 1
+        while len(keys) >= self.max_keys:
+            keys.popitem(last=False)
+            self.counters["evicted"] += 1
+
+
+def subnet_of(ip, prefix_v4=24, prefix_v6=64):
+    """Sous-réseau d'agrégation d'une adresse ("10.0.0.0/24"), ou l'adresse si invalide"""
+    if prefix_v4 == 24 and ip.count(".") == 3 and ":" not in ip:
+        # Cas courant : pas de passage par ipaddress
+        return ip[:ip.rfind(".")] + ".0/24"
+    try:
+        addr = ipaddress.ip_address(ip)
+    except ValueError:
+        return ip
+    prefix = prefix_v4 if addr.version == 4 else prefix_v6
+    return str(ipaddress.ip_network(f"{addr}/{prefix}", strict=False))
@@ -0,0 +1,119 @@
+"""
+Tables d'agrégats de `file_transfers`, tenues à jour à l'insertion.
+
+Chaque lot inséré (écriture temps réel ou backfill) est agrégé en mémoire puis
+ajouté, dans la même transaction, aux compteurs :
+
+  transfer_stats_minute / _hourly / _daily   (période, type, statut)
+  client_stats_daily                         (jour, IP client)
+  file_stats_daily                           (jour, fichier)
+  file_stats_total                           (fichier)
+
+par des `INSERT ... ON DUPLICATE KEY UPDATE` qui incrémentent les compteurs.
+Les tableaux de bord lisent ces tables (quelques centaines de lignes) au lieu
+de parcourir l'historique complet. Les clés sont triées avant écriture pour
+que des écrivains concurrents (backfill multi-processus) verrouillent les
+lignes dans le même ordre.
+
+database/rollups_rebuild.sql recalcule ces tables à partir de l'historique.
+"""
+
+from collections import defaultdict
+
+_STATS_SQL = """
+    INSERT INTO {table} (bucket, transfer_type, status, transfers, bytes)
+    VALUES (%s, %s, %s, %s, %s)
+    ON DUPLICATE KEY UPDATE
+        transfers = transfers + VALUES(transfers),
+        bytes = bytes + VALUES(bytes)
+"""
+
+CLIENT_SQL = """
+    INSERT INTO client_stats_daily (day, client_ip, transfers, success, failed, last_seen)
+    VALUES (%s, %s, %s, %s, %s, %s)
+    ON DUPLICATE KEY UPDATE
+        transfers = transfers + VALUES(transfers),
+        success = success + VALUES(success),
+        failed = failed + VALUES(failed),
+        last_seen = GREATEST(last_seen, VALUES(last_seen))
+"""
+
+FILE_DAILY_SQL = """
+    INSERT INTO file_stats_daily (day, filename, transfers, bytes)
+    VALUES (%s, %s, %s, %s)
+    ON DUPLICATE KEY UPDATE
+        transfers = transfers + VALUES(transfers),
+        bytes = bytes + VALUES(bytes)
+"""
+
+FILE_TOTAL_SQL = """
+    INSERT INTO file_stats_total (filename, transfers, bytes, last_seen)
+    VALUES (%s, %s, %s, %s)
+    ON DUPLICATE KEY UPDATE
+        transfers = transfers + VALUES(transfers),
+        bytes = bytes + VALUES(bytes),
+        last_seen = GREATEST(last_seen, VALUES(last_seen))
+"""
+
+# Table -> fonction d'arrondi de l'horodatage à la période
+PERIODS = (
+    ("transfer_stats_minute", lambda ts: ts.replace(second=0, microsecond=0)),
+    ("transfer_stats_hourly", lambda ts: ts.replace(minute=0, second=0, microsecond=0)),
+    ("transfer_stats_daily", lambda ts: ts.date()),
+)
+
+
+def aggregate(rows):
+    """
+    Agrège des lignes au format INSERT_SQL (filename, client_ip, file_size,
+    transfer_type, status, timestamp) ; renvoie [(requête, paramètres triés)]
+    """
+    stats = {table: defaultdict(lambda: [0, 0]) for table, _ in PERIODS}
+    clients = defaultdict(lambda: [0, 0, 0, None])
+    files_daily = defaultdict(lambda: [0, 0])
+    files_total = defaultdict(lambda: [0, 0, None])
+
+    for filename, client_ip, file_size, transfer_type, status, timestamp in rows:
+        size = file_size or 0
+        for table, bucket in PERIODS:
+            counter = stats[table][(bucket(timestamp), transfer_type, status)]
+            counter[0] += 1
+            counter[1] += size
+
+        day = timestamp.date()
+        client = clients[(day, client_ip)]
+        client[0] += 1
+        if status == "success":
+            client[1] += 1
+        elif status == "failed":
+            client[2] += 1
+        if client[3] is None or timestamp > client[3]:
+            client[3] = timestamp
+
+        daily = files_daily[(day, filename)]
+        daily[0] += 1
+        daily[1] += size
+
+        total = files_total[filename]
+        total[0] += 1
+        total[1] += size
+        if total[2] is None or timestamp > total[2]:
+            total[2] = timestamp
+
+    statements = [
+        (_STATS_SQL.format(table=table),
+         [key + tuple(values) for key, values in sorted(stats[table].items())])
+        for table, _ in PERIODS
+    ]
+    statements.append((CLIENT_SQL, [key + tuple(v) for key, v in sorted(clients.items())]))
+    statements.append((FILE_DAILY_SQL, [key + tuple(v) for key, v in sorted(files_daily.items())]))
+    statements.append((FILE_TOTAL_SQL, [(key,) + tuple(v) for key, v in sorted(files_total.items())]))
+    return statements
+
+
+def update(cursor, rows):
+    """Ajoute un lot aux agrégats (à appeler dans la transaction de l'insertion)"""
+    if not rows:
+        return
+    for sql, params in aggregate(rows):
+        cursor.executemany(sql, params)
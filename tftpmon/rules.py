@@ -0,0 +1,299 @@
+"""
+Règles d'alerte compilées : liste blanche d'IP et fichiers critiques.
+
+Liste blanche : adresses et sous-réseaux CIDR (IPv4 / IPv6) rangés par
+longueur de préfixe, chaque longueur ayant un ensemble d'entiers réseau. Une
+recherche masque l'adresse une fois par longueur présente (au plus 33 / 129),
+quel que soit le nombre de sous-réseaux autorisés.
+
+Fichiers critiques, une entrée par règle :
+  - nom exact ("router-prod.cfg") ou chemin exact ("core/sw1.cfg")
+  - motif glob ("*.key", "backups/*/firewall-*.conf")
+  - expression régulière préfixée par "re:" ("re:^sw-core-\\d+\\.cfg$")
+Une règle sans "/" porte sur le nom du fichier, une règle avec "/" sur son
+chemin relatif à la racine TFTP. Les noms exacts vont dans un ensemble ; les
+globs et regex ancrées ("^...") sont rangés par préfixe littéral, de sorte
+qu'un transfert n'évalue que les règles dont le préfixe correspond. Les règles
+sans préfixe littéral ("*.key", regex non ancrée) sont fusionnées en une seule
+expression compilée, évaluée à chaque transfert : il vaut mieux qu'elles
+restent peu nombreuses. Une regex à groupes ("(?P<x>...)", "(a)\\1") ne peut
+pas être fusionnée (noms en double, numéros décalés) : elle est évaluée seule.
+
+Les règles peuvent aussi être lues dans des fichiers texte (une entrée par
+ligne, "#" pour les commentaires), rechargés à chaud lorsqu'ils changent.
+"""
+
+import fnmatch
+import ipaddress
+import os
+import re
+import time
+
+from tftpmon import log
+
+logger = log.get("rules")
+
+_GLOB_CHARS = re.compile(r"[*?\[]")
+_GLOBAL_FLAGS = re.compile(r"\(\?([aiLmsux]+)\)")
+
+
+class IPAllowlist:
+    """Adresses et sous-réseaux autorisés, indexés par longueur de préfixe"""
+
+    def __init__(self, entries):
+        # version -> {longueur de préfixe -> ensemble d'entiers réseau}
+        self._prefixes = {4: {}, 6: {}}
+        self.invalid = []
+        count = 0
+        for entry in entries:
+            try:
+                network = ipaddress.ip_network(entry.strip(), strict=False)
+            except ValueError:
+                self.invalid.append(entry)
+                continue
+            self._prefixes[network.version].setdefault(network.prefixlen, set()).add(
+                int(network.network_address))
+            count += 1
+        self.size = count
+        # (masque, ensemble) par version, préfixes les plus longs d'abord
+        self._tables = {
+            version: [(self._mask(version, length), networks)
+                      for length, networks in sorted(by_length.items(), reverse=True)]
+            for version, by_length in self._prefixes.items()
+        }
+
+    @staticmethod
+    def _mask(version, length):
+        bits = 32 if version == 4 else 128
+        return ((1 << bits) - 1) ^ ((1 << (bits - length)) - 1)
+
+    def __contains__(self, ip):
+        try:
+            addr = ipaddress.ip_address(ip)
+        except ValueError:
+            return False
+        if addr.version == 6 and addr.ipv4_mapped is not None:
+            addr = addr.ipv4_mapped
+        value = int(addr)
+        for mask, networks in self._tables[addr.version]:
+            if value & mask in networks:
+                return True
+        return False
+
+
+class FilePatterns:
+    """Noms exacts, globs et regex indexés par préfixe littéral, pour le nom et le chemin"""
+
+    def __init__(self, patterns):
+        self.size = 0
+        self.invalid = []
+        # cible ("name" / "path") -> ensemble de valeurs exactes
+        self._exact = {"name": set(), "path": set()}
+        # cible -> {longueur -> {préfixe littéral -> [(règle, fonction de test)]}}
+        self._prefixed = {"name": {}, "path": {}}
+        # cible -> règles sans préfixe littéral, fusionnées en une alternation
+        generic = {"name": [], "path": []}
+        self._labels = []
+        # cible -> [(règle, fonction de test)] sans préfixe ni fusion possible
+        self._standalone = {"name": [], "path": []}
+
+        for pattern in patterns:
+            pattern = pattern.strip()
+            if not pattern:
+                continue
+            if pattern.startswith("re:"):
+                regex = pattern[3:]
+                try:
+                    compiled = re.compile(regex)
+                except re.error:
+                    self.invalid.append(pattern)
+                    continue
+                # Une regex porte sur le chemin complet ; un "(?i)" initial devient
+                # local pour pouvoir être fusionné avec les autres règles
+                flags = _GLOBAL_FLAGS.match(regex)
+                if flags:
+                    regex = f"(?{flags.group(1)}:{regex[flags.end():]})"
+                target = "path"
+                prefix = _regex_prefix(regex)
+                test = compiled.search
+            elif _GLOB_CHARS.search(pattern):
+                target = "path" if "/" in pattern else "name"
+                # Un glob porte sur toute la cible : ancré au début et (translate) à la fin
+                regex = r"\A" + fnmatch.translate(pattern)
+                prefix = pattern[:_GLOB_CHARS.search(pattern).start()]
+                test = re.compile(regex).match
+            else:
+                self._exact["path" if "/" in pattern else "name"].add(pattern)
+                self.size += 1
+                continue
+
+            self.size += 1
+            if prefix:
+                self._prefixed[target].setdefault(len(prefix), {}).setdefault(
+                    prefix, []).append((pattern, test))
+            elif _mergeable(regex):
+                generic[target].append((pattern, f"(?P<r{len(self._labels)}>{regex})"))
+                self._labels.append(pattern)
+            else:
+                self._standalone[target].append((pattern, test))
+
+        self._lengths = {target: sorted(by_length.items())
+                         for target, by_length in self._prefixed.items()}
+        self._generic = {}
+        for target, rules in generic.items():
+            try:
+                self._generic[target] = (re.compile("|".join(regex for _, regex in rules))
+                                         if rules else None)
+            except re.error:
+                # Filet de sécurité : chaque règle, compilable seule, est évaluée seule
+                self._generic[target] = None
+                self._standalone[target] += [(rule, re.compile(regex).search)
+                                             for rule, regex in rules]
+
+    def _match(self, target, value):
+        if value in self._exact[target]:
+            return value
+        for length, buckets in self._lengths[target]:
+            if length > len(value):
+                break
+            for rule, test in buckets.get(value[:length], ()):
+                if test(value):
+                    return rule
+        regex = self._generic[target]
+        if regex is not None:
+            m = regex.search(value)
+            if m:
+                return self._labels[int(m.lastgroup[1:])]
+        for rule, test in self._standalone[target]:
+            if test(value):
+                return rule
+        return None
+
+    def match(self, path):
+        """Règle qui s'applique au chemin relatif, ou None"""
+        return self._match("name", path.rsplit("/", 1)[-1]) or self._match("path", path)
+
+
+def _mergeable(regex):
+    """
+    Regex fusionnable dans l'alternation : sans groupe capturant (nom redéfini,
+    référence arrière décalée par le groupe englobant) et compilable une fois englobée
+    """
+    try:
+        return re.compile(regex).groups == 0 and bool(re.compile(f"(?P<r0>{regex})"))
+    except re.error:
+        return False
+
+
+def _regex_prefix(regex):
+    """Préfixe littéral imposé par une regex ancrée ("^backup/sw-\\d+" -> "backup/sw-")"""
+    if not regex.startswith("^") or "|" in regex:
+        # Non ancrée, ou alternative qui pourrait contourner l'ancre
+        return ""
+    prefix = []
+    i = 1
+    while i < len(regex):
+        c = regex[i]
+        if c == "\\" and i + 1 < len(regex) and not regex[i + 1].isalnum():
+            literal, i = regex[i + 1], i + 2
+        elif c in ".^$*+?{}[]|()\\":
+            break
+        else:
+            literal, i = c, i + 1
+        if i < len(regex) and regex[i] in "*?{":
+            # Caractère optionnel : le préfixe s'arrête avant
+            break
+        prefix.append(literal)
+    return "".join(prefix)
+
+
+def read_entries(path):
+    """Entrées d'un fichier de règles (une par ligne, commentaires "#")"""
+    entries = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.split("#", 1)[0].strip()
+            if line:
+                entries.append(line)
+    return entries
+
+
+class RuleEngine:
+    """Règles compilées, rechargées à chaud quand les fichiers de règles changent"""
+
+    def __init__(self, authorized_ips=(), critical_files=(),
+                 authorized_ips_file=None, critical_files_file=None, check_interval=5):
+        self.inline_ips = list(authorized_ips)
+        self.inline_files = list(critical_files)
+        self.authorized_ips_file = authorized_ips_file
+        self.critical_files_file = critical_files_file
+        self.check_interval = check_interval
+
+        self.allowlist = None
+        self.critical = None
+        self._mtimes = None
+        # Dernier contenu lu de chaque fichier, conservé si une relecture échoue
+        self._file_entries = {}
+        self._checked_at = 0
+        self.reload()
+
+    def _file_mtimes(self):
+        mtimes = []
+        for path in (self.authorized_ips_file, self.critical_files_file):
+            try:
+                mtimes.append(os.stat(path).st_mtime_ns if path else None)
+            except OSError:
+                mtimes.append(None)
+        return mtimes
+
+    def reload(self):
+        """
+        Recompile les règles ; un fichier illisible garde son dernier contenu lu
+        (aucun au démarrage). Renvoie True.
+        """
+        mtimes = self._file_mtimes()
+        ips = self.inline_ips + self._read(self.authorized_ips_file)
+        files = self.inline_files + self._read(self.critical_files_file)
+
+        allowlist = IPAllowlist(ips)
+        try:
+            critical = FilePatterns(files)
+        except (re.error, RecursionError) as e:
+            # Jeu précédent conservé (aucune règle au démarrage) jusqu'au prochain
+            # changement de fichier : pas de nouvel essai à chaque vérification
+            logger.error("Règles de fichiers critiques non compilables, jeu précédent conservé : %s", e)
+            critical = self.critical or FilePatterns(())
+        for entry in allowlist.invalid + critical.invalid:
+            logger.warning("Règle invalide ignorée : %s", entry)
+
+        # Remplacement atomique : un transfert en cours d'analyse garde l'ancien jeu
+        self.allowlist, self.critical = allowlist, critical
+        self._mtimes = mtimes
+        logger.info("✅ %s réseau(x) autorisé(s), %s règle(s) de fichiers critiques",
+                    allowlist.size, critical.size)
+        return True
+
+    def _read(self, path):
+        if not path:
+            return []
+        try:
+            self._file_entries[path] = read_entries(path)
+        except OSError as e:
+            logger.error("Lecture des règles impossible : %s", e)
+        return self._file_entries.get(path, [])
+
+    def reload_if_changed(self, now=None):
+        """Vérifie (au plus toutes les check_interval s) si un fichier de règles a changé"""
+        now = time.time() if now is None else now
+        if now - self._checked_at < self.check_interval:
+            return False
+        self._checked_at = now
+        if self._file_mtimes() == self._mtimes:
+            return False
+        return self.reload()
+
+    def is_authorized(self, ip):
+        return ip in self.allowlist
+
+    def critical_match(self, path):
+        return self.critical.match(path)
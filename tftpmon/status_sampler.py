@@ -0,0 +1,116 @@
+"""
+Échantillonnage en arrière-plan de l'état du serveur et des services.
+
+Un thread relève toutes les `interval` secondes CPU / RAM / disque / uptime
+(psutil, sans attente : la charge CPU est mesurée depuis le relevé précédent,
+le premier relevé n'étant publié qu'après un intervalle complet)
+et l'état de tous les services en un seul appel `systemctl show`. Les
+endpoints du tableau de bord lisent le dernier instantané en mémoire ; un
+historique court (`history` relevés) alimente les mini-graphiques.
+"""
+
+import subprocess
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+import psutil
+
+from tftpmon import log
+
+logger = log.get("status")
+
+SHOW_PROPERTIES = ("Id", "ActiveState", "MainPID")
+
+
+def _gb(value):
+    return round(value / (1024**3), 2)
+
+
+def server_status():
+    """Relevé instantané de l'hôte (même format que l'ancien get_server_status)"""
+    memory = psutil.virtual_memory()
+    disk = psutil.disk_usage('/')
+    uptime = datetime.now() - datetime.fromtimestamp(psutil.boot_time())
+    return {
+        'cpu_percent': psutil.cpu_percent(interval=None),
+        'ram_percent': memory.percent,
+        'ram_used': _gb(memory.used),
+        'ram_total': _gb(memory.total),
+        'disk_percent': disk.percent,
+        'disk_used': _gb(disk.used),
+        'disk_total': _gb(disk.total),
+        'uptime': f"{uptime.days}j {uptime.seconds//3600}h {(uptime.seconds//60)%60}m"
+    }
+
+
+def services_status(services):
+    """État de tous les services en un appel : systemctl show -p ... unité1 unité2 ..."""
+    cmd = ["systemctl", "show"]
+    for prop in SHOW_PROPERTIES:
+        cmd += ["-p", prop]
+    try:
+        output = subprocess.run(cmd + list(services), capture_output=True,
+                                text=True, timeout=10).stdout
+    except (OSError, subprocess.SubprocessError) as e:
+        logger.error("Services : %s", e)
+        output = ""
+
+    # Un bloc "Clé=valeur" par unité, séparés par une ligne vide, dans l'ordre demandé
+    blocks = [dict(line.split("=", 1) for line in block.splitlines() if "=" in line)
+              for block in output.strip().split("\n\n")] if output.strip() else []
+
+    result = []
+    for i, name in enumerate(services):
+        props = blocks[i] if i < len(blocks) else {}
+        status = props.get("ActiveState", "unknown")
+        pid = props.get("MainPID")
+        result.append({
+            'name': name,
+            'status': status,
+            'active': status == 'active',
+            'pid': pid if pid and pid != "0" else None
+        })
+    return result
+
+
+class StatusSampler:
+    """Thread de relevé périodique ; server / services / history lus sans blocage"""
+
+    def __init__(self, services, interval=2, history=150):
+        self.services_names = list(services)
+        self.interval = interval
+        self.server = None
+        self.services = []
+        # (horodatage, cpu %, ram %, disque %)
+        self.history = deque(maxlen=history)
+
+    def sample(self):
+        try:
+            server = server_status()
+        except Exception as e:
+            logger.error("Serveur : %s", e)
+            server = None
+        services = services_status(self.services_names)
+
+        # Remplacement des références : un lecteur voit l'ancien ou le nouvel instantané
+        self.server, self.services = server, services
+        if server is not None:
+            self.history.append((time.time(), server['cpu_percent'],
+                                 server['ram_percent'], server['disk_percent']))
+
+    def start(self):
+        # État du serveur publié au premier relevé du thread (voir run())
+        self.services = services_status(self.services_names)
+        threading.Thread(target=self.run, daemon=True, name="status-sampler").start()
+        return self
+
+    def run(self):
+        # Premier appel : référence de la mesure CPU, prise dans ce thread (psutil
+        # la conserve par thread). Un relevé pris aussitôt couvrirait un intervalle
+        # quasi nul (~0 %) : le premier n'est publié qu'un intervalle plus tard
+        psutil.cpu_percent(interval=None)
+        while True:
+            time.sleep(self.interval)
+            self.sample()
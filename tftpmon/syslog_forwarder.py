@@ -0,0 +1,137 @@
+"""
+Transfert des messages vers le serveur rsyslog distant.
+
+Un thread unique possède la socket (UDP, ou TCP avec trames à comptage d'octets
+RFC 6587) et vide un tampon circulaire en mémoire : le corrélateur ne fait
+qu'ajouter un message au tampon. Si le tampon est plein (serveur injoignable
+trop longtemps), les messages les plus anciens sont abandonnés et comptés.
+"""
+
+import socket
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone
+
+from tftpmon import log
+from tftpmon.metrics import Histogram
+
+logger = log.get("syslog")
+
+PRIORITY_NOTICE = 13  # user.notice
+PRIORITY_ERROR = 11   # user.err
+
+
+class SyslogForwarder:
+    """Thread d'envoi syslog à socket persistante"""
+
+    def __init__(self, host, port, protocol="udp", message_format="legacy",
+                 app_name="script_tracabilite", buffer_size=10000,
+                 batch_size=100, reconnect_interval=5):
+        self.host = host
+        self.port = port
+        self.protocol = protocol.lower()
+        self.message_format = message_format.lower()
+        self.app_name = app_name
+        self.batch_size = batch_size
+        self.reconnect_interval = reconnect_interval
+
+        self._buffer = deque(maxlen=buffer_size)
+        self._cond = threading.Condition()
+        self._sock = None
+        self._hostname = socket.gethostname()
+
+        self.counters = {"sent": 0, "dropped": 0, "errors": 0, "connections": 0}
+        # Durée d'envoi d'un lot (connexion comprise), réussi ou non
+        self.latency = Histogram()
+
+    # ==============================
+    # API CORRÉLATEUR
+    # ==============================
+    def send(self, message, is_error=False):
+        """Ajoute un message au tampon (non bloquant)"""
+        priority = PRIORITY_ERROR if is_error else PRIORITY_NOTICE
+        line = self._format(priority, message)
+        with self._cond:
+            if len(self._buffer) == self._buffer.maxlen:
+                self.counters["dropped"] += 1
+            self._buffer.append(line)
+            self._cond.notify()
+
+    def start(self):
+        threading.Thread(target=self.run, daemon=True, name="syslog-forwarder").start()
+        return self
+
+    def queue_depth(self):
+        return len(self._buffer)
+
+    def _format(self, priority, message):
+        if self.message_format == "rfc5424":
+            timestamp = datetime.now(timezone.utc).isoformat(timespec="milliseconds")
+            return (
+                f"<{priority}>1 {timestamp} {self._hostname} {self.app_name} "
+                f"- - - {message}"
+            ).encode()
+        return f"<{priority}> {self.app_name}: {message}".encode()
+
+    # ==============================
+    # SOCKET
+    # ==============================
+    def _connect(self):
+        if self.protocol == "tcp":
+            sock = socket.create_connection((self.host, self.port), timeout=10)
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+        else:
+            sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        return sock
+
+    def _close(self):
+        if self._sock is not None:
+            try:
+                self._sock.close()
+            except OSError:
+                pass
+            self._sock = None
+
+    def _transmit(self, batch):
+        if self._sock is None:
+            self._sock = self._connect()
+            self.counters["connections"] += 1
+
+        if self.protocol == "tcp":
+            # RFC 6587 : "LONGUEUR ESPACE MESSAGE", un seul sendall pour tout le lot
+            payload = b"".join(str(len(m)).encode() + b" " + m for m in batch)
+            self._sock.sendall(payload)
+        else:
+            for m in batch:
+                self._sock.sendto(m, (self.host, self.port))
+
+    # ==============================
+    # BOUCLE D'ENVOI
+    # ==============================
+    def run(self):
+        while True:
+            with self._cond:
+                while not self._buffer:
+                    self._cond.wait()
+                batch = [self._buffer.popleft()
+                         for _ in range(min(self.batch_size, len(self._buffer)))]
+
+            started = time.perf_counter()
+            try:
+                self._transmit(batch)
+                self.latency.observe(time.perf_counter() - started)
+                self.counters["sent"] += len(batch)
+            except OSError as e:
+                self.latency.observe(time.perf_counter() - started)
+                logger.error("%s", e)
+                self.counters["errors"] += 1
+                self._close()
+
+                # Remet le lot en tête de tampon, dans l'ordre, puis attend avant de réessayer
+                with self._cond:
+                    free = self._buffer.maxlen - len(self._buffer)
+                    requeued = batch[-free:] if free else []
+                    self.counters["dropped"] += len(batch) - len(requeued)
+                    self._buffer.extendleft(reversed(requeued))
+                time.sleep(self.reconnect_interval)
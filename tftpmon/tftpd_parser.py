@@ -0,0 +1,102 @@
+"""
+Analyse des messages de tftpd-hpa.
+
+Une seule expression régulière compilée (alternation) classe chaque message et
+en extrait les champs en un passage :
+
+    RRQ from 192.168.1.10 filename router.cfg
+    WRQ from ::ffff:10.0.0.5 filename backup/sw1.cfg blksize 1468 tsize 0
+    sending NAK (1, File not found) to 10.0.0.5
+    tftpd: read: Connection refused
+
+Pour les lignes texte complètes (journalctl -o short, archives rsyslog), un test
+de préfixe `in.tftpd[` écarte les lignes des autres démons sans regex.
+"""
+
+import os
+import re
+
+PREFIX = "in.tftpd["
+
+_BODY = (
+    r"(RRQ|WRQ)\s+from\s+([0-9A-Fa-f:.]+)\s+filename\s+(\S+)(.*)"
+    r"|.*?(?:(read:\s+Connection refused)|NAK(?:\s*\((\d+),\s*([^)]*)\))?)"
+)
+
+# Message seul (journal natif) / ligne texte complète, ancrée sur le préfixe
+MESSAGE_RE = re.compile(_BODY)
+LINE_RE = re.compile(r"in\.tftpd\[(\d+)\]:\s+(?:" + _BODY + r")")
+
+_V4_MAPPED = "::ffff:"
+_V4_MAPPED_LEN = len(_V4_MAPPED)
+
+
+def normalize_ip(ip):
+    """Ramène une adresse IPv4 mappée (::ffff:a.b.c.d) à sa forme IPv4"""
+    if ip.startswith(_V4_MAPPED) and "." in ip:
+        return ip[_V4_MAPPED_LEN:]
+    return ip
+
+
+def relative_path(filename, root):
+    """
+    Chemin demandé par le client ramené à la forme des événements inotify :
+    relatif à la racine TFTP, sans "/" initial ni composants "." / ".."
+    """
+    if filename.startswith(root) and filename[len(root):len(root) + 1] == "/":
+        filename = filename[len(root) + 1:]
+    return os.path.normpath(filename).lstrip("/")
+
+
+def parse_options(text):
+    """Options TFTP (blksize, tsize, timeout...) en fin de ligne RRQ/WRQ"""
+    tokens = text.split()
+    return {tokens[i].lower(): tokens[i + 1] for i in range(0, len(tokens) - 1, 2)}
+
+
+def _classify(typ, ip, filename, opts, refused, code, nak):
+    if typ:
+        return ("request", typ, normalize_ip(ip), filename,
+                parse_options(opts) if opts else {})
+    if refused:
+        return ("error", "Connection refused")
+    if code:
+        return ("error", f"NAK reçu ({code}, {nak})")
+    return ("error", "NAK reçu")
+
+
+def parse_message(message):
+    """
+    Classe un message tftpd ; renvoie None si non pertinent, sinon un tuple :
+      ("request", type, client_ip, filename, options)
+      ("error", reason)
+    """
+    m = MESSAGE_RE.match(message)
+    if m is None:
+        return None
+    return _classify(*m.groups())
+
+
+def parse_line(line):
+    """Ligne texte complète -> (pid, résultat de parse_message) ou None"""
+    start = line.find(PREFIX)
+    if start < 0:
+        return None
+    m = LINE_RE.match(line, start)
+    if m is None:
+        return None
+    groups = m.groups()
+    return groups[0], _classify(*groups[1:])
+
+
+def split_line(line):
+    """Extrait (pid, message) d'une ligne syslog texte, ou None si ce n'est pas tftpd"""
+    start = line.find(PREFIX)
+    if start < 0:
+        return None
+    start += len(PREFIX)
+    end = line.find("]", start)
+    if end < 0:
+        return None
+    # "]: message"
+    return line[start:end], line[end + 2:].strip()